@@ -0,0 +1,273 @@
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+
+import pandas as pd
+from mysql.connector import Error
+
+from auth import hash_many, hash_password
+from cache import invalidate
+from db import get_connection
+from importer import read_chunks
+
+# Account registration. A signup writes the role's profile row (NGO, DRIVERS
+# or FOOD_SOURCES) and the USERS row that logs into it in one transaction, so
+# a failure leaves neither behind, and USERS.ENTITY_ID records which profile
+# the account belongs to (migration 14).
+#
+# onboard() registers many accounts from a CSV or Parquet file, one
+# transaction per chunk: passwords are hashed across the auth worker pool,
+# each role's profiles go in as one multi-row INSERT and the USERS rows as
+# another.
+#
+#   python accounts.py accounts.csv
+
+ONBOARD_CHUNK = int(os.environ.get('PMS_ONBOARD_CHUNK', '500'))
+
+# role -> (profile table, its id column, the columns a signup fills, in the
+# order the registration form passes them)
+PROFILES = {
+    'NGO': ('NGO', 'NGO_ID', ('NAME', 'CONTACT_NAME', 'CONTACT', 'EMAIL')),
+    'Driver': ('DRIVERS', 'DRIVER_ID', ('NAME', 'PHONE_NUMBER', 'EMAIL')),
+    'Food Source': ('FOOD_SOURCES', 'SOURCE_ID', ('NAME', 'CONTACT_NAME', 'CONTACT', 'EMAIL')),
+}
+ROLES = ('Admin',) + tuple(PROFILES)
+
+# Profile columns that must be filled, and those that are UNIQUE in the schema
+REQUIRED = {'NAME', 'CONTACT', 'PHONE_NUMBER'}
+UNIQUE_EMAIL = {'NGO', 'FOOD_SOURCES'}
+
+USERNAME_LENGTH = 50
+DUPLICATE_KEY = 1062
+
+INSERT_USER = "INSERT INTO USERS (USERNAME, PASSWORD, ROLE, ENTITY_ID) VALUES (%s, %s, %s, %s)"
+
+
+@dataclass
+class OnboardReport:
+    created: dict = field(default_factory=dict)    # role -> accounts created
+    rejects: list = field(default_factory=list)    # {'row', 'reason', ...original values}
+    chunks: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def total(self):
+        return sum(self.created.values())
+
+    @property
+    def accounts_per_second(self):
+        return self.total / self.elapsed if self.elapsed else 0.0
+
+
+def _placeholders(values):
+    return ', '.join(['%s'] * len(values))
+
+
+def _insert_profiles(cursor, role, profiles):
+    # One multi-row INSERT; its rows get consecutive ids from the first one
+    # (auto_increment_increment apart). Returns them in order.
+    table, _, columns = PROFILES[role]
+    cursor.executemany(
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({_placeholders(columns)})",
+        profiles
+    )
+    first_id = cursor.lastrowid
+    if len(profiles) == 1:
+        return [first_id]
+    cursor.execute("SELECT @@auto_increment_increment")
+    step = cursor.fetchone()[0]
+    return [first_id + i * step for i in range(len(profiles))]
+
+
+def register(username, password, role, profile=None):
+    # Create one account; returns the new profile's id (None for Admin).
+    # ValueError for a bad request or a taken username, Error otherwise.
+    if role not in ROLES:
+        raise ValueError(f"unknown role {role!r}")
+    if not username or len(username) > USERNAME_LENGTH:
+        raise ValueError(f"username must be 1-{USERNAME_LENGTH} characters")
+    if role != 'Admin':
+        columns = PROFILES[role][2]
+        profile = tuple(value.strip() if isinstance(value, str) else value for value in (profile or ()))
+        if len(profile) != len(columns):
+            raise ValueError(f"{role} registration needs {', '.join(columns)}")
+        missing = [column for column, value in zip(columns, profile) if column in REQUIRED and not value]
+        if missing:
+            raise ValueError(f"missing {', '.join(missing)}")
+        # An empty email is stored as NULL so it does not collide on UNIQUE
+        profile = tuple(value or None for value in profile)
+
+    hashed = hash_password(password)
+    entity_id = None
+    with get_connection() as conn:
+        conn.start_transaction()
+        cursor = conn.cursor()
+        try:
+            if role != 'Admin':
+                entity_id = _insert_profiles(cursor, role, [profile])[0]
+            cursor.execute(INSERT_USER, (username, hashed, role, entity_id))
+            conn.commit()
+        except Error as e:
+            conn.rollback()
+            if e.errno == DUPLICATE_KEY:
+                raise ValueError("that username or email is already registered") from None
+            raise
+    invalidate('USERS', *((PROFILES[role][0],) if role != 'Admin' else ()))
+    return entity_id
+
+
+def _existing(cursor, sql, values):
+    if not values:
+        return set()
+    cursor.execute(sql.format(values=_placeholders(values)), list(values))
+    return {row[0] for row in cursor.fetchall()}
+
+
+def validate_chunk(chunk, cursor, first_row, seen):
+    # Returns (valid rows as a DataFrame, list of rejects). seen carries the
+    # usernames and (table, email) pairs of earlier chunks in the same file.
+    chunk = chunk.rename(columns=lambda name: str(name).strip().upper()).reset_index(drop=True)
+    if 'USERNAME' not in chunk or 'ROLE' not in chunk:
+        raise ValueError("Missing column(s): USERNAME and ROLE are required")
+    if 'PASSWORD' not in chunk and 'PASSWORD_HASH' not in chunk:
+        raise ValueError("Missing column: PASSWORD (or PASSWORD_HASH)")
+    text = {
+        column: (chunk[column].astype(str).str.strip().replace({'nan': '', 'None': ''})
+                 if column in chunk else pd.Series('', index=chunk.index))
+        for column in ('USERNAME', 'PASSWORD', 'PASSWORD_HASH', 'ROLE', 'NAME', 'CONTACT_NAME', 'CONTACT',
+                       'PHONE_NUMBER', 'EMAIL')
+    }
+    usernames, roles, emails = text['USERNAME'], text['ROLE'], text['EMAIL'].str.lower()
+    tables = roles.map(lambda role: PROFILES[role][0] if role in PROFILES else '')
+
+    # Usernames and emails compare case-insensitively, like the columns' collation
+    user_keys = usernames.str.lower()
+    taken = {username.lower() for username in _existing(
+        cursor, "SELECT USERNAME FROM USERS WHERE USERNAME IN ({values})", set(usernames[usernames != '']))}
+    emails_taken = set()
+    for table in UNIQUE_EMAIL:
+        wanted = set(emails[(tables == table) & (emails != '')])
+        emails_taken |= {(table, email.lower()) for email in _existing(
+            cursor, f"SELECT EMAIL FROM {table} WHERE EMAIL IN ({{values}})", wanted)}
+
+    reasons = pd.Series('', index=chunk.index)
+
+    def reject(mask, reason):
+        reasons[mask & (reasons == '')] = reason
+
+    needs = {column: roles.map(lambda role: column in PROFILES.get(role, ('', '', ()))[2])
+             for column in REQUIRED}
+    reject((usernames == '') | (usernames.str.len() > USERNAME_LENGTH),
+           f"username must be 1-{USERNAME_LENGTH} characters")
+    reject(roles == 'Admin', 'admin accounts are registered one at a time')
+    reject(~roles.isin(list(PROFILES)), 'unknown role')
+    reject((text['PASSWORD'] == '') & (text['PASSWORD_HASH'] == ''), 'missing password')
+    reject((text['PASSWORD'] == '') & ~text['PASSWORD_HASH'].str.match(r'^\$2[aby]\$\d\d\$'),
+           'PASSWORD_HASH is not a bcrypt hash')
+    for column in sorted(REQUIRED):
+        reject(needs[column] & (text[column] == ''), f"missing {column}")
+    reject(user_keys.isin(taken) | user_keys.isin(seen['usernames']), 'username already registered')
+    reject(user_keys.duplicated(), 'username repeated in the file')
+    email_keys = pd.Series(list(zip(tables, emails)), index=chunk.index)
+    has_unique_email = tables.isin(list(UNIQUE_EMAIL)) & (emails != '')
+    reject(has_unique_email & email_keys.map(lambda key: key in emails_taken or key in seen['emails']),
+           'email already registered')
+    reject(has_unique_email & email_keys.duplicated(), 'email repeated in the file')
+
+    bad = reasons != ''
+    rejects = [
+        {'row': first_row + int(index), 'reason': reasons[index],
+         **{k: v for k, v in chunk.loc[index].to_dict().items() if k not in ('PASSWORD', 'PASSWORD_HASH')}}
+        for index in chunk.index[bad]
+    ]
+    valid = pd.DataFrame({column: values[~bad] for column, values in text.items()})
+    seen['usernames'] |= set(user_keys[~bad])
+    seen['emails'] |= set(email_keys[~bad & has_unique_email])
+    return valid, rejects
+
+
+def insert_chunk(cursor, valid):
+    # Caller owns the transaction; returns role -> accounts created
+    if valid.empty:
+        return {}
+    hashes = dict(zip(valid.index, valid['PASSWORD_HASH']))
+    plain = valid[valid['PASSWORD'] != '']
+    hashes.update(zip(plain.index, hash_many(list(plain['PASSWORD']))))
+
+    created = {}
+    users = []
+    for role, group in valid.groupby('ROLE', sort=True):
+        columns = PROFILES[role][2]
+        profiles = [
+            tuple(value or None for value in row)
+            for row in group[list(columns)].itertuples(index=False)
+        ]
+        entity_ids = _insert_profiles(cursor, role, profiles)
+        users += [
+            (username, hashes[index], role, entity_id)
+            for username, index, entity_id in zip(group['USERNAME'], group.index, entity_ids)
+        ]
+        created[role] = len(profiles)
+    # executemany folds this into one multi-row INSERT
+    cursor.executemany(INSERT_USER, users)
+    return created
+
+
+def onboard(path_or_file, kind=None, chunksize=ONBOARD_CHUNK):
+    # Register every valid account in a file. Each chunk commits on its own;
+    # a chunk the database refuses is rolled back and its rows reported, and
+    # the rest of the file still goes in.
+    report = OnboardReport()
+    started = time.perf_counter()
+    seen = {'usernames': set(), 'emails': set()}
+    first_row = 1
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            for chunk in read_chunks(path_or_file, kind, chunksize):
+                valid, rejects = validate_chunk(chunk, cursor, first_row, seen)
+                conn.commit()
+                report.rejects += rejects
+                try:
+                    conn.start_transaction()
+                    created = insert_chunk(cursor, valid)
+                    conn.commit()
+                except Error as e:
+                    conn.rollback()
+                    created = {}
+                    seen['usernames'] -= set(valid['USERNAME'].str.lower())
+                    seen['emails'] -= {
+                        (PROFILES[role][0], email.lower())
+                        for role, email in zip(valid['ROLE'], valid['EMAIL'])
+                    }
+                    report.rejects += [
+                        {'row': first_row + int(index), 'reason': f"chunk failed: {e.msg}", 'USERNAME': username}
+                        for index, username in zip(valid.index, valid['USERNAME'])
+                    ]
+                for role, count in created.items():
+                    report.created[role] = report.created.get(role, 0) + count
+                report.chunks += 1
+                first_row += len(chunk)
+    finally:
+        report.elapsed = time.perf_counter() - started
+        if report.created:
+            invalidate('USERS', *(PROFILES[role][0] for role in report.created))
+    return report
+
+
+def main(argv):
+    if not argv:
+        print("usage: python accounts.py FILE")
+        return 2
+    report = onboard(argv[0])
+    for reject in report.rejects:
+        print(f"row {reject['row']}: {reject['reason']}")
+    created = ', '.join(f"{count} {role}" for role, count in sorted(report.created.items())) or 'nothing'
+    print(f"created {created}; rejected {len(report.rejects)} in {report.elapsed:.2f}s "
+          f"({report.accounts_per_second:.0f} accounts/s)")
+    return 0 if not report.rejects else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
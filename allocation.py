@@ -0,0 +1,477 @@
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import date
+
+import numpy as np
+
+from mysql.connector import Error
+
+from cache import invalidate
+from db import bulk_update, get_connection
+from inventory import record_allocation
+
+# Donation allocation engine (replaces the GetDonationSource SQL function).
+# Stock is reserved with SELECT ... FOR UPDATE SKIP LOCKED inside a single
+# transaction and decremented before commit, so concurrent NGO requests never
+# allocate the same units twice; requests skip rows another request is holding
+# instead of queueing behind it. Only when that fast path comes up short does
+# the request retry with blocking locks, so a shortfall reported to the NGO is
+# real and not an artefact of rows held by concurrent requests. A request may
+# be split across several items and sources, earliest expiry first.
+
+SCAN_BATCH = 20          # candidate rows locked per round trip
+MAX_RETRIES = 3          # on deadlock / lock wait timeout
+RETRY_ERRNOS = (1205, 1213)
+
+CANDIDATES_DATED = """
+    SELECT f.FOOD_ID, f.QUANTITY, f.EXPIRY_DATE, f.SOURCE_ID
+    FROM FOOD_ITEM f
+    WHERE f.CATEGORY = %s AND f.QUANTITY >= %s AND f.SOURCE_ID IS NOT NULL
+      AND f.EXPIRY_DATE >= CURDATE()
+      AND (f.EXPIRY_DATE > %s OR (f.EXPIRY_DATE = %s AND f.FOOD_ID > %s))
+    ORDER BY f.EXPIRY_DATE, f.FOOD_ID
+    LIMIT %s
+    {lock}
+"""
+
+# Items without an expiry date are only used once dated stock runs out
+CANDIDATES_UNDATED = """
+    SELECT f.FOOD_ID, f.QUANTITY, f.EXPIRY_DATE, f.SOURCE_ID
+    FROM FOOD_ITEM f
+    WHERE f.CATEGORY = %s AND f.QUANTITY >= %s AND f.SOURCE_ID IS NOT NULL
+      AND f.EXPIRY_DATE IS NULL AND f.FOOD_ID > %s
+    ORDER BY f.FOOD_ID
+    LIMIT %s
+    {lock}
+"""
+
+SKIP_LOCKED = 'FOR UPDATE SKIP LOCKED'
+BLOCKING = 'FOR UPDATE'
+
+
+@dataclass
+class AllocationLine:
+    food_id: int
+    source_id: int
+    quantity: int
+    expiry_date: object = None
+
+
+@dataclass
+class Allocation:
+    ngo_id: int
+    category: str
+    requested: int
+    lines: list = field(default_factory=list)
+    donation_ids: list = field(default_factory=list)
+
+    @property
+    def allocated(self):
+        return sum(line.quantity for line in self.lines)
+
+    @property
+    def fulfilled(self):
+        return self.allocated >= self.requested
+
+    @property
+    def source_ids(self):
+        return sorted({line.source_id for line in self.lines})
+
+    @property
+    def status(self):
+        if self.fulfilled:
+            return 'fulfilled'
+        return 'partial' if self.lines else 'unfilled'
+
+
+def _iter_candidates(cursor, category, min_quantity, lock):
+    # Keyset-paginate over matching stock so only the rows actually needed get
+    # locked, dated items in expiry order first.
+    last_expiry, last_id = '0001-01-01', 0
+    while True:
+        cursor.execute(CANDIDATES_DATED.format(lock=lock), (category, min_quantity, last_expiry, last_expiry, last_id, SCAN_BATCH))
+        rows = cursor.fetchall()
+        yield from rows
+        if len(rows) < SCAN_BATCH:
+            break
+        last_expiry, last_id = rows[-1][2], rows[-1][0]
+
+    last_id = 0
+    while True:
+        cursor.execute(CANDIDATES_UNDATED.format(lock=lock), (category, min_quantity, last_id, SCAN_BATCH))
+        rows = cursor.fetchall()
+        yield from rows
+        if len(rows) < SCAN_BATCH:
+            break
+        last_id = rows[-1][0]
+
+
+def reserve_stock(cursor, category, quantity, allow_split=True, lock=SKIP_LOCKED):
+    # Lock and pick stock for one request within the caller's transaction.
+    # Without allow_split only a single item holding the whole quantity is used.
+    lines = []
+    remaining = quantity
+    min_quantity = 1 if allow_split else quantity
+    for food_id, available, expiry_date, source_id in _iter_candidates(cursor, category, min_quantity, lock):
+        take = min(available, remaining)
+        lines.append(AllocationLine(food_id, source_id, take, expiry_date))
+        remaining -= take
+        if remaining == 0:
+            break
+    return lines
+
+
+def write_donations(cursor, ngo_id, category, lines):
+    # Decrement the reserved stock and record one DONATIONS row per source.
+    # The rows are locked by reserve_stock(), so plain updates are safe.
+    cursor.executemany(
+        "UPDATE FOOD_ITEM SET QUANTITY = QUANTITY - %s WHERE FOOD_ID = %s",
+        [(line.quantity, line.food_id) for line in lines]
+    )
+    per_source = {}
+    for line in lines:
+        per_source[line.source_id] = per_source.get(line.source_id, 0) + line.quantity
+
+    donation_ids = []
+    for source_id, quantity in per_source.items():
+        cursor.execute(
+            "INSERT INTO DONATIONS (SOURCE_ID, NGO_ID, SOURCE, DESTINATION, QUANTITY, CATEGORY) "
+            "SELECT fs.SOURCE_ID, n.NGO_ID, fs.NAME, n.NAME, %s, %s "
+            "FROM FOOD_SOURCES fs JOIN NGO n ON n.NGO_ID = %s WHERE fs.SOURCE_ID = %s",
+            (quantity, category, ngo_id, source_id)
+        )
+        donation_ids.append(cursor.lastrowid)
+    return donation_ids
+
+
+def _try_allocate(ngo_id, category, quantity, allow_split, allow_partial, lock):
+    with get_connection() as conn:
+        conn.start_transaction(isolation_level='READ COMMITTED')
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1 FROM NGO WHERE NGO_ID = %s", (ngo_id,))
+        if cursor.fetchone() is None:
+            raise ValueError(f"NGO {ngo_id} does not exist")
+
+        allocation = Allocation(ngo_id, category, quantity)
+        lines = reserve_stock(cursor, category, quantity, allow_split, lock)
+        if not lines or (sum(line.quantity for line in lines) < quantity and not allow_partial):
+            conn.rollback()
+            return allocation
+
+        allocation.lines = lines
+        allocation.donation_ids = write_donations(cursor, ngo_id, category, lines)
+        conn.commit()
+    invalidate('FOOD_ITEM', 'DONATIONS')
+    record_allocation(lines)
+    return allocation
+
+
+def _retrying(fn, *args):
+    for attempt in range(MAX_RETRIES):
+        try:
+            return fn(*args)
+        except Error as e:
+            if e.errno not in RETRY_ERRNOS or attempt == MAX_RETRIES - 1:
+                raise
+            time.sleep(0.05 * (attempt + 1))
+
+
+def allocate_donation(ngo_id, category, quantity, allow_split=True, allow_partial=False):
+    # Allocate quantity units of category to an NGO in one transaction. Unless
+    # allow_partial is set the request is all-or-nothing: if the stock cannot
+    # cover it nothing is reserved and the returned Allocation has no lines.
+    # Each pass commits on its own, so the blocking pass (and a retry) asks
+    # only for what is still missing and never allocates committed units twice.
+    allocation = Allocation(ngo_id, category, quantity)
+    for lock in (SKIP_LOCKED, BLOCKING):
+        remaining = quantity - allocation.allocated
+        if remaining <= 0:
+            break
+        part = _retrying(_try_allocate, ngo_id, category, remaining, allow_split, allow_partial, lock)
+        allocation.lines += part.lines
+        allocation.donation_ids += part.donation_ids
+    return allocation
+
+
+# Batch mode. At end of day there can be hundreds of queued requests; instead
+# of a locked scan per request, load every open request and the stock they can
+# draw on once, solve the assignment in memory and write all the results in a
+# single transaction. Requests may be filled partially; the remainder stays
+# open for the next run.
+
+BULK_CHUNK = 500           # rows per multi-row UPDATE
+UNDATED_DAYS = 365         # expiry horizon assumed for items without a date
+NON_LOCAL_PENALTY = 30     # cost, in days, of sending stock outside the NGO's pincode
+
+OPEN_REQUESTS = """
+    SELECT r.REQUEST_ID, r.NGO_ID, r.CATEGORY, r.QUANTITY - r.ALLOCATED, n.NAME, n.ADDRESS
+    FROM DONATION_REQUESTS r
+    JOIN NGO n ON n.NGO_ID = r.NGO_ID
+    WHERE r.STATUS IN ('OPEN', 'PARTIAL')
+    ORDER BY r.REQUESTED_AT, r.REQUEST_ID
+    {limit}
+    FOR UPDATE OF r
+"""
+
+BATCH_STOCK = """
+    SELECT f.FOOD_ID, f.SOURCE_ID, f.CATEGORY, f.QUANTITY, f.EXPIRY_DATE, fs.NAME, fs.PINCODE
+    FROM FOOD_ITEM f
+    JOIN FOOD_SOURCES fs ON fs.SOURCE_ID = f.SOURCE_ID
+    WHERE f.CATEGORY IN ({categories}) AND f.QUANTITY > 0
+      AND (f.EXPIRY_DATE IS NULL OR f.EXPIRY_DATE >= CURDATE())
+    ORDER BY f.EXPIRY_DATE IS NULL, f.EXPIRY_DATE, f.FOOD_ID
+    FOR UPDATE OF f
+"""
+
+
+@dataclass
+class PendingRequest:
+    request_id: int
+    ngo_id: int
+    category: str
+    quantity: int          # still outstanding
+    ngo_name: str
+    address: str = None
+
+
+@dataclass
+class StockItem:
+    food_id: int
+    source_id: int
+    category: str
+    quantity: int
+    expiry_date: object
+    source_name: str
+    pincode: str = None
+
+
+@dataclass
+class BatchReport:
+    strategy: str
+    allocations: dict = field(default_factory=dict)   # request_id -> Allocation
+    elapsed: float = 0.0
+
+    def count(self, status):
+        return sum(1 for allocation in self.allocations.values() if allocation.status == status)
+
+    @property
+    def allocated(self):
+        return sum(allocation.allocated for allocation in self.allocations.values())
+
+    def summary(self):
+        return {
+            'requests': len(self.allocations),
+            'fulfilled': self.count('fulfilled'),
+            'partial': self.count('partial'),
+            'unfilled': self.count('unfilled'),
+            'units': self.allocated,
+            'seconds': round(self.elapsed, 3),
+        }
+
+    def rows(self):
+        return [
+            {
+                'request_id': request_id,
+                'ngo_id': allocation.ngo_id,
+                'category': allocation.category,
+                'requested': allocation.requested,
+                'allocated': allocation.allocated,
+                'status': allocation.status,
+                'sources': ', '.join(str(source_id) for source_id in allocation.source_ids),
+            }
+            for request_id, allocation in self.allocations.items()
+        ]
+
+
+def queue_request(ngo_id, category, quantity):
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO DONATION_REQUESTS (NGO_ID, CATEGORY, QUANTITY) VALUES (%s, %s, %s)",
+            (ngo_id, category, quantity)
+        )
+        conn.commit()
+        request_id = cursor.lastrowid
+    invalidate('DONATION_REQUESTS')
+    return request_id
+
+
+def _load_batch(cursor, limit=None):
+    cursor.execute(OPEN_REQUESTS.format(limit='LIMIT %d' % limit if limit else ''))
+    requests = [PendingRequest(*row) for row in cursor.fetchall()]
+    categories = sorted({request.category for request in requests})
+    if not categories:
+        return requests, []
+    cursor.execute(BATCH_STOCK.format(categories=', '.join(['%s'] * len(categories))), categories)
+    stock = [StockItem(*row) for row in cursor.fetchall()]
+    return requests, stock
+
+
+def _by_category(requests, stock):
+    groups = {}
+    for request in requests:
+        groups.setdefault(request.category, ([], []))[0].append(request)
+    for item in stock:
+        if item.category in groups:
+            groups[item.category][1].append(item)
+    return groups
+
+
+def solve_expiry_first(requests, stock):
+    # Oldest request first, each drawing on the earliest-expiring stock, i.e.
+    # the single-request rule applied to the whole queue. stock arrives in
+    # expiry order, so each category only ever walks forward through it.
+    allocations = {}
+    for requests_in, items in _by_category(requests, stock).values():
+        left = [item.quantity for item in items]
+        first = 0
+        for request in requests_in:
+            allocation = Allocation(request.ngo_id, request.category, request.quantity)
+            need = request.quantity
+            i = first
+            while need and i < len(items):
+                take = min(left[i], need)
+                if take:
+                    item = items[i]
+                    allocation.lines.append(AllocationLine(item.food_id, item.source_id, take, item.expiry_date))
+                    left[i] -= take
+                    need -= take
+                i += 1
+            while first < len(items) and left[first] == 0:
+                first += 1
+            allocations[request.request_id] = allocation
+    return allocations
+
+
+def _cost_matrix(requests, items, today):
+    # Cost of moving one unit of item j to request i: days until the item
+    # expires (use short-dated stock first), plus a penalty when the source's
+    # pincode does not appear in the NGO's address.
+    days = np.array([
+        (item.expiry_date - today).days if item.expiry_date else UNDATED_DAYS
+        for item in items
+    ], dtype=float)
+    local = np.array([
+        [bool(item.pincode) and item.pincode in (request.address or '') for item in items]
+        for request in requests
+    ], dtype=bool).reshape(len(requests), len(items))
+    return days[np.newaxis, :] + np.where(local, 0.0, NON_LOCAL_PENALTY)
+
+
+def solve_min_cost(requests, stock, today=None):
+    # Least-cost method for the transportation problem: fill the cheapest
+    # (request, item) cells first. Not guaranteed optimal, but it is a single
+    # sort of the cost matrix and close to optimal for this cost shape. Ties go
+    # to the older request.
+    today = today or date.today()
+    allocations = {request.request_id: Allocation(request.ngo_id, request.category, request.quantity)
+                   for request in requests}
+    for requests_in, items in _by_category(requests, stock).values():
+        if not items:
+            continue
+        demand = np.array([request.quantity for request in requests_in])
+        supply = np.array([item.quantity for item in items])
+        cost = _cost_matrix(requests_in, items, today)
+        age = np.broadcast_to(np.arange(len(requests_in))[:, np.newaxis], cost.shape)
+        order = np.lexsort((age.ravel(), cost.ravel()))
+        open_demand, open_supply = demand.sum(), supply.sum()
+        for r, j in zip(*np.unravel_index(order, cost.shape)):
+            if not open_demand or not open_supply:
+                break
+            take = min(demand[r], supply[j])
+            if not take:
+                continue
+            demand[r] -= take
+            supply[j] -= take
+            open_demand -= take
+            open_supply -= take
+            item = items[j]
+            allocations[requests_in[r].request_id].lines.append(
+                AllocationLine(item.food_id, item.source_id, int(take), item.expiry_date))
+    return allocations
+
+
+SOLVERS = {
+    'expiry': solve_expiry_first,
+    'min_cost': solve_min_cost,
+}
+
+
+def write_batch(cursor, requests, stock, allocations):
+    names = {request.request_id: request.ngo_name for request in requests}
+    source_names = {item.source_id: item.source_name for item in stock}
+
+    taken, donations, updates = {}, [], []
+    for request_id, allocation in allocations.items():
+        if not allocation.lines:
+            continue
+        per_source = {}
+        for line in allocation.lines:
+            taken[line.food_id] = taken.get(line.food_id, 0) + line.quantity
+            per_source[line.source_id] = per_source.get(line.source_id, 0) + line.quantity
+        for source_id, quantity in per_source.items():
+            donations.append((source_id, allocation.ngo_id, source_names[source_id],
+                              names[request_id], quantity, allocation.category))
+        updates.append((request_id, allocation.allocated,
+                        'FULFILLED' if allocation.fulfilled else 'PARTIAL'))
+
+    if not donations:
+        return 0
+    bulk_update(cursor, """
+        UPDATE FOOD_ITEM f JOIN ({values}) t ON t.FOOD_ID = f.FOOD_ID
+        SET f.QUANTITY = f.QUANTITY - t.TAKEN
+    """, ('FOOD_ID', 'TAKEN'), list(taken.items()), BULK_CHUNK)
+    # executemany folds this into one multi-row INSERT
+    cursor.executemany(
+        "INSERT INTO DONATIONS (SOURCE_ID, NGO_ID, SOURCE, DESTINATION, QUANTITY, CATEGORY) "
+        "VALUES (%s, %s, %s, %s, %s, %s)",
+        donations
+    )
+    bulk_update(cursor, """
+        UPDATE DONATION_REQUESTS r JOIN ({values}) t ON t.REQUEST_ID = r.REQUEST_ID
+        SET r.ALLOCATED = r.ALLOCATED + t.ALLOCATED, r.STATUS = t.STATUS, r.PROCESSED_AT = NOW()
+    """, ('REQUEST_ID', 'ALLOCATED', 'STATUS'), updates, BULK_CHUNK)
+    return len(donations)
+
+
+def allocate_batch(strategy='expiry', limit=None):
+    # Allocate every open request (the oldest limit of them if given). Request
+    # and stock rows are locked for the whole run, so concurrent single
+    # requests and a second batch simply wait for it.
+    solve = SOLVERS[strategy]
+    for attempt in range(MAX_RETRIES):
+        started = time.perf_counter()
+        try:
+            with get_connection() as conn:
+                conn.start_transaction(isolation_level='READ COMMITTED')
+                cursor = conn.cursor()
+                requests, stock = _load_batch(cursor, limit)
+                allocations = solve(requests, stock)
+                written = write_batch(cursor, requests, stock, allocations)
+                conn.commit()
+            if written:
+                invalidate('FOOD_ITEM', 'DONATIONS', 'DONATION_REQUESTS')
+                for allocation in allocations.values():
+                    record_allocation(allocation.lines)
+            return BatchReport(strategy, allocations, time.perf_counter() - started)
+        except Error as e:
+            if e.errno not in RETRY_ERRNOS or attempt == MAX_RETRIES - 1:
+                raise
+            time.sleep(0.05 * (attempt + 1))
+
+
+def main(argv):
+    # python allocation.py [--min-cost] [--limit N]   allocate queued requests
+    strategy = 'min_cost' if '--min-cost' in argv else 'expiry'
+    limit = int(argv[argv.index('--limit') + 1]) if '--limit' in argv else None
+    report = allocate_batch(strategy, limit)
+    for row in report.rows():
+        print(f"{row['request_id']:>6} NGO {row['ngo_id']:<5} {row['category']:<20} "
+              f"{row['allocated']:>5}/{row['requested']:<5} {row['status']:<9} {row['sources']}")
+    print(', '.join(f"{key}: {value}" for key, value in report.summary().items()))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,131 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from multiprocessing import get_context
+
+import bcrypt
+
+# Password hashing off the Streamlit script threads. bcrypt is deliberately
+# slow, and run inline a burst of logins at shift start competes with every
+# other session in the server process for its CPU (and, on bcrypt builds that
+# keep it, the GIL). Hashes and checks run in a small process pool instead; at
+# most AUTH_WORKERS of them use CPU at once and the rest wait in the pool's
+# queue.
+#
+# BCRYPT_ROUNDS is the cost factor for new hashes. A successful login whose
+# stored hash has a different cost returns a fresh hash for the caller to
+# store, so raising (or lowering) the cost takes effect as users sign in.
+#
+# Workers are spawned, not forked: the server process has pool, reaper and
+# snapshot threads that must not be copied mid-lock. This module only imports
+# bcrypt so the workers start quickly.
+BCRYPT_ROUNDS = int(os.environ.get('PMS_BCRYPT_ROUNDS', '12'))
+AUTH_WORKERS = int(os.environ.get('PMS_AUTH_WORKERS', str(min(4, os.cpu_count() or 1))))   # 0 hashes inline
+AUTH_TIMEOUT = float(os.environ.get('PMS_AUTH_TIMEOUT', '10'))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class AuthBusy(Exception):
+    # The pool did not answer within AUTH_TIMEOUT
+    pass
+
+
+@dataclass
+class PasswordCheck:
+    ok: bool
+    new_hash: str = None     # set when the stored hash should be replaced
+
+    @property
+    def needs_rehash(self):
+        return self.new_hash is not None
+
+
+def hash_rounds(hashed):
+    # Cost factor of a modular-crypt bcrypt hash ($2b$12$...)
+    try:
+        return int(hashed.split('$')[2])
+    except (IndexError, ValueError):
+        return None
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds)).decode()
+
+
+def _verify(password, hashed, rounds):
+    try:
+        ok = bcrypt.checkpw(password.encode(), hashed.encode())
+    except ValueError:       # not a bcrypt hash
+        return False, None
+    if ok and hash_rounds(hashed) != rounds:
+        return True, _hash(password, rounds)
+    return ok, None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ProcessPoolExecutor(max_workers=AUTH_WORKERS, mp_context=get_context('spawn'))
+    return _executor
+
+
+def _reset_executor(broken):
+    global _executor
+    with _executor_lock:
+        if _executor is broken:
+            _executor = None
+    broken.shutdown(wait=False)
+
+
+def _run(fn, *args):
+    if AUTH_WORKERS <= 0:
+        return fn(*args)
+    executor = get_executor()
+    try:
+        future = executor.submit(fn, *args)
+        return future.result(timeout=AUTH_TIMEOUT)
+    except FutureTimeout:
+        # Drop the job if no worker has picked it up; nobody reads its result
+        future.cancel()
+        raise AuthBusy(f"password check did not finish within {AUTH_TIMEOUT:g}s") from None
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM-killed); start a fresh pool for the next call
+        _reset_executor(executor)
+        raise AuthBusy("password worker pool restarted, try again") from None
+
+
+def hash_password(password):
+    return _run(_hash, password, BCRYPT_ROUNDS)
+
+
+def hash_many(passwords):
+    # Bulk onboarding: hash a batch across all the workers
+    if AUTH_WORKERS <= 0:
+        return [_hash(password, BCRYPT_ROUNDS) for password in passwords]
+    executor = get_executor()
+    chunk = max(1, len(passwords) // (AUTH_WORKERS * 4))
+    try:
+        return list(executor.map(_hash, passwords, [BCRYPT_ROUNDS] * len(passwords), chunksize=chunk))
+    except BrokenProcessPool:
+        _reset_executor(executor)
+        raise AuthBusy("password worker pool restarted, try again") from None
+
+
+def verify_password(password, hashed):
+    ok, new_hash = _run(_verify, password, hashed, BCRYPT_ROUNDS)
+    return PasswordCheck(ok, new_hash)
+
+
+def warm_up():
+    # Start the workers ahead of the first login (spawning takes a moment)
+    if AUTH_WORKERS > 0:
+        executor = get_executor()
+        for future in [executor.submit(hash_rounds, '') for _ in range(AUTH_WORKERS)]:
+            future.result()
@@ -0,0 +1,120 @@
+import argparse
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from allocation import allocate_donation
+from db import POOL_SIZE, get_connection
+
+# Fires many concurrent donation requests at a fixed amount of stock and checks
+# that nothing is oversold: stock never goes negative and every allocated unit
+# is matched by exactly one DONATIONS unit.
+#
+#   python -m benchmarks.bench_allocation --requests 500 --items 40
+
+
+def setup(category, items, quantity):
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO FOOD_SOURCES (NAME, CONTACT, EMAIL) VALUES (%s, %s, %s)",
+            (f"Bench source {category}", '0000000000', f"{category}@bench.invalid")
+        )
+        source_id = cursor.lastrowid
+        cursor.execute(
+            "INSERT INTO NGO (NAME, CONTACT, EMAIL) VALUES (%s, %s, %s)",
+            (f"Bench NGO {category}", '0000000000', f"{category}@bench-ngo.invalid")
+        )
+        ngo_id = cursor.lastrowid
+        cursor.executemany(
+            "INSERT INTO FOOD_ITEM (NAME, QUANTITY, CATEGORY, EXPIRY_DATE, SOURCE_ID) "
+            "VALUES (%s, %s, %s, DATE_ADD(CURDATE(), INTERVAL %s DAY), %s)",
+            [(f"Bench item {i}", quantity, category, 1 + i % 30, source_id) for i in range(items)]
+        )
+        conn.commit()
+    return source_id, ngo_id
+
+
+def cleanup(category, source_id, ngo_id):
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT DONATION_ID FROM DONATIONS WHERE CATEGORY = %s", (category,))
+        donation_ids = [row[0] for row in cursor.fetchall()]
+        for table in ('DONATES_TO', 'RECEIVES'):
+            cursor.executemany(f"DELETE FROM {table} WHERE DONATION_ID = %s", [(i,) for i in donation_ids])
+        cursor.execute("DELETE FROM DONATIONS WHERE CATEGORY = %s", (category,))
+        cursor.execute("DELETE FROM PROVIDES WHERE SOURCE_ID = %s", (source_id,))
+        cursor.execute("DELETE FROM FOOD_ITEM WHERE CATEGORY = %s", (category,))
+        cursor.execute("DELETE FROM FOOD_SOURCES WHERE SOURCE_ID = %s", (source_id,))
+        cursor.execute("DELETE FROM NGO WHERE NGO_ID = %s", (ngo_id,))
+        conn.commit()
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--items', type=int, default=40)
+    parser.add_argument('--item-quantity', type=int, default=25)
+    parser.add_argument('--request-quantity', type=int, default=7)
+    parser.add_argument('--threads', type=int, default=POOL_SIZE)
+    parser.add_argument('--keep', action='store_true', help="keep the benchmark rows")
+    args = parser.parse_args()
+
+    category = f"bench-{uuid.uuid4().hex[:8]}"
+    stock = args.items * args.item_quantity
+    source_id, ngo_id = setup(category, args.items, args.item_quantity)
+
+    def request(_):
+        started = time.perf_counter()
+        allocation = allocate_donation(ngo_id, category, args.request_quantity)
+        return allocation, time.perf_counter() - started
+
+    try:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.threads) as executor:
+            results = list(executor.map(request, range(args.requests)))
+        wall = time.perf_counter() - started
+
+        latencies = [elapsed for _, elapsed in results]
+        allocated = sum(allocation.allocated for allocation, _ in results)
+        fulfilled = sum(1 for allocation, _ in results if allocation.fulfilled)
+
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COALESCE(SUM(QUANTITY), 0), COALESCE(MIN(QUANTITY), 0) "
+                           "FROM FOOD_ITEM WHERE CATEGORY = %s", (category,))
+            remaining, min_quantity = cursor.fetchone()
+            cursor.execute("SELECT COALESCE(SUM(QUANTITY), 0) FROM DONATIONS WHERE CATEGORY = %s", (category,))
+            donated = cursor.fetchone()[0]
+
+        print(f"requests: {args.requests} on {args.threads} threads, stock {stock} units")
+        print(f"fulfilled: {fulfilled}, allocated {allocated} units, {remaining} left")
+        print(f"throughput: {args.requests / wall:.0f} req/s")
+        print(f"latency ms: p50 {percentile(latencies, 50) * 1000:.1f}  "
+              f"p95 {percentile(latencies, 95) * 1000:.1f}  "
+              f"p99 {percentile(latencies, 99) * 1000:.1f}  "
+              f"max {max(latencies) * 1000:.1f}  mean {statistics.mean(latencies) * 1000:.1f}")
+
+        expected_fulfilled = min(args.requests, stock // args.request_quantity)
+        checks = {
+            'no negative stock': min_quantity >= 0,
+            'stock conserved': allocated + remaining == stock,
+            'donations match allocations': donated == allocated,
+            'every coverable request fulfilled': fulfilled >= expected_fulfilled,
+        }
+        for name, passed in checks.items():
+            print(f"{'PASS' if passed else 'FAIL'} {name}")
+        return 0 if all(checks.values()) else 1
+    finally:
+        if not args.keep:
+            cleanup(category, source_id, ngo_id)
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,100 @@
+import argparse
+import time
+
+from db import get_connection
+from migrate import dashboard_queries, explain_dashboard_queries
+from pickup_status import drift
+from summary import verify
+from synthetic import load
+
+# Loads a synthetic data set (synthetic.py) at a multiple of production
+# volume, times every dashboard query against it and checks the load left
+# the schema as the triggers would have: summary tables and driver counters
+# match the facts, and every donation and item has its link rows. Run it
+# against a scratch database; compare --scale 1, 10 and 100.
+#
+#   PMS_DB_NAME=pms_load python -m benchmarks.bench_dashboards --scale 10
+
+MISSING_LINKS = """
+    SELECT
+        (SELECT COUNT(*) FROM DONATIONS d
+         LEFT JOIN DONATES_TO dt ON dt.DONATION_ID = d.DONATION_ID AND dt.SOURCE_ID = d.SOURCE_ID
+         LEFT JOIN RECEIVES r ON r.DONATION_ID = d.DONATION_ID AND r.NGO_ID = d.NGO_ID
+         WHERE dt.DONATION_ID IS NULL OR r.DONATION_ID IS NULL),
+        (SELECT COUNT(*) FROM FOOD_ITEM f
+         LEFT JOIN PROVIDES p ON p.FOOD_ID = f.FOOD_ID AND p.SOURCE_ID = f.SOURCE_ID
+         WHERE p.FOOD_ID IS NULL)
+"""
+
+
+def busiest(cursor):
+    # The NGO and driver with the most history: the slowest home pages
+    cursor.execute("SELECT NGO_ID FROM NGO_STATS ORDER BY DONATIONS DESC LIMIT 1")
+    ngo = cursor.fetchone()
+    cursor.execute("SELECT DRIVER_ID FROM DRIVERS ORDER BY TOTAL_COMPLETED_PICKUPS DESC, NAME LIMIT 1")
+    driver = cursor.fetchone()
+    return (ngo[0] if ngo else 1), (driver[0] if driver else 1)
+
+
+def time_queries(repeat):
+    timings = []
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        ngo_id, driver_id = busiest(cursor)
+        for name, sql, params in dashboard_queries():
+            if name.startswith('ngo_home.'):
+                params = (ngo_id,)
+            elif name.startswith('driver_home.'):
+                params = (driver_id,)
+            samples = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                cursor.execute(sql, params)
+                rows = cursor.fetchall()
+                samples.append(time.perf_counter() - started)
+            conn.rollback()
+            samples.sort()
+            timings.append((name, samples[len(samples) // 2], samples[-1], len(rows)))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', type=float, default=1.0, help="multiple of synthetic.BASE_VOLUME")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--skip-load', action='store_true', help="time the data already in the database")
+    args = parser.parse_args()
+
+    if not args.skip_load:
+        report = load(args.scale, args.seed)
+        print(f"loaded {report.total:,} rows at scale {args.scale:g} in {report.elapsed:.1f}s "
+              f"({report.rows_per_second:,.0f} rows/s)")
+
+    timings = time_queries(args.repeat)
+    for name, median, slowest, rows in sorted(timings, key=lambda row: row[1], reverse=True):
+        print(f"{name:<32} p50 {median * 1000:8.1f} ms  max {slowest * 1000:8.1f} ms  {rows:>7} rows")
+    plans = explain_dashboard_queries()
+
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        summaries = verify(cursor)
+        drivers = drift(cursor)
+        cursor.execute(MISSING_LINKS)
+        donations_unlinked, items_unlinked = cursor.fetchone()
+        conn.rollback()
+
+    checks = {
+        'every dashboard query uses an index': all(row['uses_index'] for row in plans),
+        'summary tables match the facts': not any(summaries.values()),
+        'driver counters match FOOD_PICKUP': not drivers,
+        'every donation has DONATES_TO and RECEIVES': donations_unlinked == 0,
+        'every item has PROVIDES': items_unlinked == 0,
+    }
+    for name, passed in checks.items():
+        print(f"{'PASS' if passed else 'FAIL'} {name}")
+    return 0 if all(checks.values()) else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
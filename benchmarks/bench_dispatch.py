@@ -0,0 +1,62 @@
+import argparse
+import random
+import time
+from datetime import date, timedelta
+
+from dispatch import MAX_RUNS_PER_DRIVER, MAX_STOPS_PER_RUN, VEHICLE_RANK, Driver, Pickup, assign_drivers, batch_runs
+
+# Times run batching and driver assignment on synthetic pickups and drivers
+# (no database needed) and checks the plan respects stop and load limits and
+# never gives a driver overlapping runs.
+#
+#   python -m benchmarks.bench_dispatch --pickups 500 --drivers 60
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pickups', type=int, default=500)
+    parser.add_argument('--drivers', type=int, default=60)
+    parser.add_argument('--areas', type=int, default=40)
+    parser.add_argument('--days', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    vehicles = list(VEHICLE_RANK)
+    start = date(2024, 1, 1)
+    pincodes = [f"{560000 + area * 17:06d}" for area in range(args.areas)]
+    pickups = [
+        Pickup(i, rng.randrange(1, 200), 'Depot', rng.choice(vehicles[:3]),
+               start + timedelta(days=rng.randrange(args.days)),
+               timedelta(hours=rng.randrange(7, 20), minutes=rng.choice((0, 15, 30, 45))),
+               rng.choice(pincodes))
+        for i in range(args.pickups)
+    ]
+    drivers = [Driver(i, f"Driver {i}", '9999999999', rng.choice(vehicles), rng.randrange(100))
+               for i in range(args.drivers)]
+
+    timings = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        runs = batch_runs(list(pickups))
+        unassigned = assign_drivers(runs, drivers)
+        timings.append(time.perf_counter() - started)
+    print(f"{args.pickups} pickups, {args.drivers} drivers -> {len(runs)} runs, "
+          f"{len(unassigned)} unassigned, best {min(timings) * 1000:.1f} ms")
+
+    windows = {}
+    for run in runs:
+        assert len(run.stops) <= MAX_STOPS_PER_RUN
+        if run.driver is not None:
+            assert run.driver.rank >= run.required_rank
+            windows.setdefault((run.driver.driver_id, run.date), []).append(run.window)
+    assert all(len(booked) <= MAX_RUNS_PER_DRIVER for booked in windows.values())
+    for booked in windows.values():
+        booked.sort()
+        assert all(end <= start for (_, end), (start, _) in zip(booked, booked[1:]))
+    assert sorted(stop.pickup_id for run in runs for stop in run.stops) == list(range(args.pickups))
+    print("plan respects stop, vehicle, per-driver and slot limits")
+
+
+if __name__ == '__main__':
+    main()
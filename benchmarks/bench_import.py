@@ -0,0 +1,113 @@
+import argparse
+import csv
+import os
+import tempfile
+import time
+import uuid
+from datetime import date, timedelta
+
+from db import get_connection
+from importer import import_items
+
+# Compares the bulk importer with the one-row-per-commit path of the Create
+# Item form, on a throwaway source and category.
+#
+#   python -m benchmarks.bench_import --rows 20000 --single-rows 500
+
+
+def setup(tag):
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO FOOD_SOURCES (NAME, CONTACT, EMAIL) VALUES (%s, %s, %s)",
+            (f"Bench source {tag}", '0000000000', f"{tag}@bench.invalid")
+        )
+        conn.commit()
+        return cursor.lastrowid
+
+
+def cleanup(category, source_id):
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM PROVIDES WHERE SOURCE_ID = %s", (source_id,))
+        cursor.execute("DELETE FROM FOOD_ITEM WHERE CATEGORY = %s", (category,))
+        cursor.execute("DELETE FROM FOOD_SOURCES WHERE SOURCE_ID = %s", (source_id,))
+        conn.commit()
+
+
+def make_rows(count, category, source_id):
+    today = date.today()
+    return [(f"Bench item {i}", 1 + i % 50, category, today + timedelta(days=1 + i % 30), source_id)
+            for i in range(count)]
+
+
+def single_inserts(rows):
+    # What the Create Item form does: one INSERT, one trigger, one commit per row
+    started = time.perf_counter()
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        for row in rows:
+            cursor.execute(
+                "INSERT INTO FOOD_ITEM (NAME, QUANTITY, CATEGORY, EXPIRY_DATE, SOURCE_ID) VALUES (%s, %s, %s, %s, %s)",
+                row
+            )
+            conn.commit()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--single-rows', type=int, default=500)
+    parser.add_argument('--bad-rows', type=int, default=100, help="invalid rows mixed into the file")
+    parser.add_argument('--keep', action='store_true', help="keep the benchmark rows")
+    args = parser.parse_args()
+
+    tag = uuid.uuid4().hex[:8]
+    category = f"bench-{tag}"
+    source_id = setup(tag)
+    path = os.path.join(tempfile.gettempdir(), f"bench-import-{tag}.csv")
+    try:
+        rows = make_rows(args.rows, category, source_id)
+        bad = [(f"Bad item {i}", -1, category, 'not a date', 0) for i in range(args.bad_rows)]
+        with open(path, 'w', newline='') as handle:
+            writer = csv.writer(handle)
+            writer.writerow(['NAME', 'QUANTITY', 'CATEGORY', 'EXPIRY_DATE', 'SOURCE_ID'])
+            writer.writerows(rows + bad)
+
+        single = single_inserts(make_rows(args.single_rows, category, source_id))
+        report = import_items(path)
+
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT COUNT(*), COUNT(p.FOOD_ID) FROM FOOD_ITEM f "
+                "LEFT JOIN PROVIDES p ON p.FOOD_ID = f.FOOD_ID AND p.SOURCE_ID = f.SOURCE_ID "
+                "WHERE f.CATEGORY = %s", (category,)
+            )
+            items, provided = cursor.fetchone()
+
+        single_rate = args.single_rows / single
+        bulk_rate = report.inserted / report.elapsed
+        print(f"single-row inserts: {args.single_rows} rows in {single:.2f}s ({single_rate:.0f} rows/s)")
+        print(f"bulk import:        {report.inserted} rows in {report.elapsed:.2f}s ({bulk_rate:.0f} rows/s), "
+              f"{report.chunks} chunks, {len(report.rejects)} rejected")
+        print(f"speedup: {bulk_rate / single_rate:.1f}x")
+
+        checks = {
+            'valid rows inserted': report.inserted == args.rows,
+            'invalid rows rejected': len(report.rejects) == args.bad_rows,
+            'every item has its PROVIDES row': items == provided == args.rows + args.single_rows,
+        }
+        for name, passed in checks.items():
+            print(f"{'PASS' if passed else 'FAIL'} {name}")
+        return 0 if all(checks.values()) else 1
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+        if not args.keep:
+            cleanup(category, source_id)
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,111 @@
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import auth
+from auth import BCRYPT_ROUNDS, _hash, _verify, hash_rounds, verify_password, warm_up
+
+# A shift-start burst: many sessions log in at once. Runs the same logins with
+# bcrypt inline on the session threads and through the auth worker pool, and
+# meanwhile times a heartbeat thread standing in for the other sessions'
+# script threads. No database is needed.
+#
+#   python -m benchmarks.bench_login --logins 200 --sessions 32
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class Heartbeat:
+    # Sleeps in short ticks and records how late each tick wakes up
+    def __init__(self, tick=0.01):
+        self.tick = tick
+        self.lateness = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = time.perf_counter()
+            time.sleep(self.tick)
+            self.lateness.append(time.perf_counter() - started - self.tick)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def run(label, logins, sessions, check):
+    def attempt(spec):
+        password, hashed = spec
+        started = time.perf_counter()
+        ok = check(password, hashed)
+        return ok, time.perf_counter() - started
+
+    with Heartbeat() as heartbeat:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=sessions) as executor:
+            results = list(executor.map(attempt, logins))
+        wall = time.perf_counter() - started
+
+    latencies = [elapsed for _, elapsed in results]
+    stalls = heartbeat.lateness or [0.0]
+    print(f"{label}: {len(logins) / wall:.1f} logins/s  "
+          f"latency ms p50 {percentile(latencies, 50) * 1000:.0f}  p95 {percentile(latencies, 95) * 1000:.0f}  "
+          f"max {max(latencies) * 1000:.0f}  | heartbeat lateness ms p95 {percentile(stalls, 95) * 1000:.1f}  "
+          f"max {max(stalls) * 1000:.1f}")
+    return [ok for ok, _ in results]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--logins', type=int, default=100)
+    parser.add_argument('--sessions', type=int, default=16, help="concurrent login attempts")
+    parser.add_argument('--users', type=int, default=20)
+    args = parser.parse_args()
+
+    if auth.AUTH_WORKERS <= 0:
+        print("PMS_AUTH_WORKERS is 0; nothing to compare against")
+        return 1
+
+    print(f"bcrypt cost {BCRYPT_ROUNDS}, {auth.AUTH_WORKERS} auth workers, "
+          f"{args.logins} logins from {args.sessions} sessions")
+    warm_up()
+    users = [(f"password-{i}", _hash(f"password-{i}", BCRYPT_ROUNDS)) for i in range(args.users)]
+    # Every fifth attempt uses a wrong password
+    logins = [
+        (password if i % 5 else password + '!', hashed)
+        for i, (password, hashed) in ((i, users[i % len(users)]) for i in range(args.logins))
+    ]
+    expected = [bool(i % 5) for i in range(args.logins)]
+
+    inline = run('inline', logins, args.sessions, lambda p, h: _verify(p, h, BCRYPT_ROUNDS)[0])
+    pooled = run('pooled', logins, args.sessions, lambda p, h: verify_password(p, h).ok)
+
+    # A hash at another cost verifies and comes back rehashed at the current one
+    old_cost = 4 if BCRYPT_ROUNDS != 4 else 5
+    legacy = _hash('legacy-password', old_cost)
+    upgraded = verify_password('legacy-password', legacy)
+
+    checks = {
+        'inline results correct': inline == expected,
+        'pooled results correct': pooled == expected,
+        'old-cost hash is rehashed': upgraded.ok and hash_rounds(upgraded.new_hash or '') == BCRYPT_ROUNDS,
+        'rehash verifies': upgraded.ok and verify_password('legacy-password', upgraded.new_hash).ok,
+        'current-cost hash is left alone': not verify_password(*users[0]).needs_rehash,
+        'non-bcrypt hash is rejected': not verify_password('x', 'plain-text').ok,
+    }
+    for name, passed in checks.items():
+        print(f"{'PASS' if passed else 'FAIL'} {name}")
+    return 0 if all(checks.values()) else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
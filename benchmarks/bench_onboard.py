@@ -0,0 +1,132 @@
+import argparse
+import csv
+import os
+import tempfile
+import time
+import uuid
+
+from accounts import PROFILES, onboard
+from auth import BCRYPT_ROUNDS, _hash
+from db import get_connection
+
+# Onboards a file of NGO, driver and food source accounts through accounts.py
+# and compares it with the old signup path (profile INSERT + commit, then
+# USERS INSERT + commit, per account). Passwords are supplied pre-hashed by
+# default so the numbers measure the database writes; --hash puts plain
+# passwords in the file and includes the worker pool's hashing.
+#
+#   python -m benchmarks.bench_onboard --accounts 10000 --single 300
+
+ROLES = list(PROFILES)
+
+
+def make_rows(tag, count, hashed, plain):
+    rows = []
+    for i in range(count):
+        role = ROLES[i % len(ROLES)]
+        rows.append({
+            'USERNAME': f"bench-{tag}-{i}",
+            'PASSWORD': f"pw-{i}" if plain else '',
+            'PASSWORD_HASH': '' if plain else hashed,
+            'ROLE': role,
+            'NAME': f"Bench {role} {i}",
+            'CONTACT_NAME': f"Contact {i}",
+            'CONTACT': '0000000000',
+            'PHONE_NUMBER': '0000000000',
+            'EMAIL': f"{i}@{tag}.bench.invalid",
+        })
+    return rows
+
+
+def old_signups(rows):
+    # What register_user used to do: two statements, two commits per account
+    started = time.perf_counter()
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        for row in rows:
+            table, _, columns = PROFILES[row['ROLE']]
+            cursor.execute(
+                f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})",
+                [row[column] for column in columns]
+            )
+            conn.commit()
+            cursor.execute(
+                "INSERT INTO USERS (USERNAME, PASSWORD, ROLE) VALUES (%s, %s, %s)",
+                (row['USERNAME'], row['PASSWORD_HASH'], row['ROLE'])
+            )
+            conn.commit()
+    return time.perf_counter() - started
+
+
+def cleanup(tag):
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM USERS WHERE USERNAME LIKE %s", (f"bench-{tag}-%",))
+        for table, _, _ in PROFILES.values():
+            cursor.execute(f"DELETE FROM {table} WHERE EMAIL LIKE %s", (f"%@{tag}.bench.invalid",))
+        conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--accounts', type=int, default=10000)
+    parser.add_argument('--single', type=int, default=300, help="accounts written the old way, for comparison")
+    parser.add_argument('--bad-rows', type=int, default=50, help="invalid rows mixed into the file")
+    parser.add_argument('--hash', action='store_true', help="plain passwords, hashed during the onboarding")
+    parser.add_argument('--keep', action='store_true', help="keep the benchmark rows")
+    args = parser.parse_args()
+
+    tag = uuid.uuid4().hex[:8]
+    hashed = _hash('bench-password', BCRYPT_ROUNDS)
+    path = os.path.join(tempfile.gettempdir(), f"bench-onboard-{tag}.csv")
+    try:
+        single = old_signups(make_rows(f"{tag}old", args.single, hashed, False))
+        rows = make_rows(tag, args.accounts, hashed, args.hash)
+        # Repeated usernames, unknown roles and missing names
+        bad = [dict(rows[i % len(rows)], ROLE='Volunteer' if i % 3 == 1 else rows[i % len(rows)]['ROLE'],
+                    NAME='' if i % 3 == 2 else 'x') for i in range(args.bad_rows)]
+        with open(path, 'w', newline='') as handle:
+            writer = csv.DictWriter(handle, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows + bad)
+
+        report = onboard(path)
+
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            orphans = 0
+            for role, (table, id_column, _) in PROFILES.items():
+                cursor.execute(f"""
+                    SELECT COUNT(*) FROM USERS u LEFT JOIN {table} p ON p.{id_column} = u.ENTITY_ID
+                    WHERE u.USERNAME LIKE %s AND u.ROLE = %s
+                      AND (p.{id_column} IS NULL OR p.NAME <> CONCAT(%s, SUBSTRING_INDEX(u.USERNAME, '-', -1)))
+                """, (f"bench-{tag}-%", role, f"Bench {role} "))
+                orphans += cursor.fetchone()[0]
+            cursor.execute("SELECT COUNT(*) FROM USERS WHERE USERNAME LIKE %s", (f"bench-{tag}-%",))
+            users = cursor.fetchone()[0]
+
+        single_rate = args.single / single
+        print(f"old signups: {args.single} accounts in {single:.2f}s ({single_rate:.0f} accounts/s)")
+        print(f"onboarding:  {report.total} accounts in {report.elapsed:.2f}s "
+              f"({report.accounts_per_second:.0f} accounts/s), {report.chunks} chunks, "
+              f"{len(report.rejects)} rejected{', passwords hashed' if args.hash else ''}")
+        print(f"speedup: {report.accounts_per_second / single_rate:.1f}x")
+
+        checks = {
+            'valid accounts created': report.total == users == args.accounts,
+            'invalid rows rejected': len(report.rejects) == args.bad_rows,
+            'every account points at its own profile': orphans == 0,
+        }
+        for name, passed in checks.items():
+            print(f"{'PASS' if passed else 'FAIL'} {name}")
+        return 0 if all(checks.values()) else 1
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+        if not args.keep:
+            cleanup(tag)
+            cleanup(f"{tag}old")
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
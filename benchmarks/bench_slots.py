@@ -0,0 +1,139 @@
+import argparse
+import random
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from db import POOL_SIZE, get_connection
+from slots import DaySchedule, reserve_slot
+
+# Many sessions book overlapping slots for a handful of drivers at once, then
+# checks that no driver ended up double-booked and that every accepted booking
+# (and nothing else) is stored and counted in the driver's SCHEDULE_VERSION.
+#
+#   python -m benchmarks.bench_slots --bookings 2000 --drivers 5
+
+
+def setup(tag, drivers):
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.executemany(
+            "INSERT INTO DRIVERS (NAME, PHONE_NUMBER, EMAIL) VALUES (%s, %s, %s)",
+            [(f"Bench driver {tag} {i}", '0000000000', f"{tag}-{i}@bench.invalid") for i in range(drivers)]
+        )
+        cursor.execute("SELECT DRIVER_ID FROM DRIVERS WHERE EMAIL LIKE %s", (f"{tag}-%@bench.invalid",))
+        driver_ids = [row[0] for row in cursor.fetchall()]
+        conn.commit()
+    return driver_ids
+
+
+def cleanup(driver_ids):
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        placeholders = ', '.join(['%s'] * len(driver_ids))
+        cursor.execute(f"DELETE FROM DRIVER_SLOTS WHERE DRIVER_ID IN ({placeholders})", driver_ids)
+        cursor.execute(f"DELETE FROM DRIVERS WHERE DRIVER_ID IN ({placeholders})", driver_ids)
+        conn.commit()
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def check_index(trials=2000):
+    # The interval index against a brute-force overlap test
+    rng = random.Random(3)
+    for _ in range(trials):
+        schedule, intervals = DaySchedule(), []
+        for _ in range(rng.randrange(0, 12)):
+            start = rng.randrange(0, 1400)
+            end = start + rng.randrange(1, 120)
+            schedule.add(start, end)
+            intervals.append((start, end))
+        start = rng.randrange(0, 1400)
+        end = start + rng.randrange(1, 120)
+        expected = any(s < end and start < e for s, e in intervals)
+        if (schedule.clash(start, end) is not None) != expected:
+            return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bookings', type=int, default=1000)
+    parser.add_argument('--drivers', type=int, default=5)
+    parser.add_argument('--days', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=POOL_SIZE)
+    parser.add_argument('--keep', action='store_true', help="keep the benchmark rows")
+    args = parser.parse_args()
+
+    tag = uuid.uuid4().hex[:8]
+    driver_ids = setup(tag, args.drivers)
+    first_day = date.today() + timedelta(days=30)
+    rng = random.Random(11)
+    attempts = [
+        (rng.choice(driver_ids), first_day + timedelta(days=rng.randrange(args.days)),
+         rng.randrange(6 * 4, 22 * 4) * 15, rng.choice((15, 30, 45, 60, 90)))
+        for _ in range(args.bookings)
+    ]
+
+    def attempt(spec):
+        driver_id, day, start, length = spec
+        started = time.perf_counter()
+        booking = reserve_slot(driver_id, day, start, start + length)
+        return booking, time.perf_counter() - started
+
+    try:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.threads) as executor:
+            results = list(executor.map(attempt, attempts))
+        wall = time.perf_counter() - started
+
+        latencies = [elapsed for _, elapsed in results]
+        accepted = [booking for booking, _ in results if booking.ok]
+        retried = sum(booking.attempts - 1 for booking, _ in results)
+
+        placeholders = ', '.join(['%s'] * len(driver_ids))
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT COUNT(*) FROM DRIVER_SLOTS a
+                JOIN DRIVER_SLOTS b ON b.DRIVER_ID = a.DRIVER_ID AND b.SLOT_DATE = a.SLOT_DATE
+                 AND b.SLOT_ID > a.SLOT_ID AND b.START_MIN < a.END_MIN AND a.START_MIN < b.END_MIN
+                WHERE a.DRIVER_ID IN ({placeholders})
+            """, driver_ids)
+            overlaps = cursor.fetchone()[0]
+            cursor.execute(f"SELECT COUNT(*) FROM DRIVER_SLOTS WHERE DRIVER_ID IN ({placeholders})", driver_ids)
+            stored = cursor.fetchone()[0]
+            cursor.execute(f"SELECT SUM(SCHEDULE_VERSION) FROM DRIVERS WHERE DRIVER_ID IN ({placeholders})",
+                           driver_ids)
+            versions = cursor.fetchone()[0]
+
+        print(f"bookings: {args.bookings} on {args.threads} threads for {args.drivers} drivers")
+        print(f"accepted: {len(accepted)}, refused as overlapping: {args.bookings - len(accepted)}, "
+              f"stale-schedule retries: {retried}")
+        print(f"throughput: {args.bookings / wall:.0f} bookings/s")
+        print(f"latency ms: p50 {percentile(latencies, 50) * 1000:.1f}  "
+              f"p95 {percentile(latencies, 95) * 1000:.1f}  "
+              f"p99 {percentile(latencies, 99) * 1000:.1f}  "
+              f"max {max(latencies) * 1000:.1f}  mean {statistics.mean(latencies) * 1000:.1f}")
+
+        checks = {
+            'interval index matches brute force': check_index(),
+            'no overlapping slots': overlaps == 0,
+            'every accepted booking stored': stored == len(accepted),
+            'one version bump per booking': versions == len(accepted),
+        }
+        for name, passed in checks.items():
+            print(f"{'PASS' if passed else 'FAIL'} {name}")
+        return 0 if all(checks.values()) else 1
+    finally:
+        if not args.keep:
+            cleanup(driver_ids)
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
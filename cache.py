@@ -0,0 +1,172 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from db import get_cursor
+
+# Process-wide query result cache shared by every Streamlit session. Entries
+# are keyed by SQL text + parameters, expire after a TTL, are evicted LRU once
+# the cache is full, and are dropped as soon as a write touches one of the
+# tables they were read from.
+CACHE_TTL = float(os.environ.get('PMS_CACHE_TTL', '300'))
+CACHE_MAX_ENTRIES = int(os.environ.get('PMS_CACHE_MAX_ENTRIES', '512'))
+
+# Tables that triggers write to when the key table is written (see
+# migrate.py), directly or through another trigger, so invalidating the key
+# table also invalidates them.
+TRIGGER_WRITES = {
+    'FOOD_ITEM': ('PROVIDES', 'SOURCE_STATS', 'CATEGORY_STATS'),
+    'PROVIDES': ('SOURCE_STATS',),
+    'DONATIONS': ('DONATES_TO', 'RECEIVES', 'SOURCE_STATS', 'NGO_STATS', 'SOURCE_NGO_STATS',
+                  'CATEGORY_STATS', 'DAILY_DONATION_STATS'),
+    'DONATES_TO': ('DAILY_DONATION_STATS',),
+    'IMPACT': ('SOURCE_STATS', 'NGO_STATS'),
+}
+
+_TABLE_RE = re.compile(r'\b(?:FROM|JOIN)\s+`?([A-Za-z_][A-Za-z0-9_]*)', re.IGNORECASE)
+
+
+def tables_in(query):
+    return frozenset(name.upper() for name in _TABLE_RE.findall(query))
+
+
+def affected_tables(tables):
+    # The tables written, plus those their triggers write
+    affected = set()
+    for table in tables:
+        table = table.upper()
+        affected.add(table)
+        affected.update(TRIGGER_WRITES.get(table, ()))
+    return affected
+
+
+class QueryCache:
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value, tables)
+        self._by_table = {}            # table -> set of keys read from it
+        self._versions = {}            # table -> write counter
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return False, None
+            if entry[0] < time.monotonic():
+                self._drop(key)
+                self.stats['misses'] += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return True, entry[1]
+
+    def snapshot_versions(self, tables):
+        with self._lock:
+            return {table: self._versions.get(table, 0) for table in tables}
+
+    def put(self, key, value, tables, versions, ttl=None):
+        with self._lock:
+            # A write landed while the value was being loaded: it may already be
+            # stale, so hand it back to the caller without caching it.
+            if any(self._versions.get(table, 0) != seen for table, seen in versions.items()):
+                return
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + (ttl or self.ttl), value, tables)
+            for table in tables:
+                self._by_table.setdefault(table, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.stats['evictions'] += 1
+
+    def invalidate(self, *tables):
+        affected = affected_tables(tables)
+        with self._lock:
+            for table in affected:
+                self._versions[table] = self._versions.get(table, 0) + 1
+                for key in list(self._by_table.get(table, ())):
+                    self._drop(key)
+                    self.stats['invalidations'] += 1
+        return affected
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_table.clear()
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for table in entry[2]:
+            keys = self._by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_table[table]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_cache = QueryCache()
+
+
+def get_cache():
+    return _cache
+
+
+def cached_call(key, loader, tables, ttl=None):
+    # Cache an arbitrary computed value (e.g. a stored function result) under
+    # key; it is invalidated by writes to any of tables.
+    tables = frozenset(table.upper() for table in tables)
+    found, value = _cache.get(key)
+    if found:
+        return value
+    versions = _cache.snapshot_versions(tables)
+    value = loader()
+    _cache.put(key, value, tables, versions, ttl)
+    return value
+
+
+def cached_query(query, params=(), tables=None, ttl=None):
+    # Run a read-only query through the cache and return all rows. The tables it
+    # depends on are taken from its FROM/JOIN clauses unless given explicitly.
+    params = tuple(params)
+    if tables is None:
+        tables = tables_in(query)
+
+    def load():
+        with get_cursor() as cursor:
+            cursor.execute(query, params)
+            return cursor.fetchall()
+
+    return cached_call(('query', query, params), load, tables, ttl)
+
+
+_listeners = []
+
+
+def on_invalidate(listener):
+    # listener(tables) is called after every invalidate() with the affected
+    # tables, e.g. to refresh snapshots derived from them
+    _listeners.append(listener)
+
+
+def invalidate(*tables):
+    affected = _cache.invalidate(*tables)
+    for listener in _listeners:
+        listener(affected)
+
+
+def cache_stats():
+    stats = dict(_cache.stats)
+    stats['entries'] = len(_cache)
+    return stats
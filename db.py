@@ -0,0 +1,212 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from mysql.connector import Error, pooling
+from mysql.connector.errors import PoolError
+
+from profiler import profiled
+
+# Shared data-access layer. Every page gets its connections from one pool per
+# server process instead of opening a fresh connection on each Streamlit rerun.
+# Settings come from the environment so deployments can size the pool without
+# editing code; the defaults match the original hard-coded credentials.
+DB_CONFIG = {
+    'host': os.environ.get('PMS_DB_HOST', 'localhost'),
+    'port': int(os.environ.get('PMS_DB_PORT', '3306')),
+    'user': os.environ.get('PMS_DB_USER', 'root'),
+    'password': os.environ.get('PMS_DB_PASSWORD', 'thegnas58'),
+    'database': os.environ.get('PMS_DB_NAME', 'perishable_management_system'),
+}
+
+POOL_NAME = 'pms_pool'
+POOL_SIZE = int(os.environ.get('PMS_DB_POOL_SIZE', '10'))            # mysql.connector caps this at 32
+POOL_TIMEOUT = float(os.environ.get('PMS_DB_POOL_TIMEOUT', '5'))     # seconds to wait for a free connection
+IDLE_TIMEOUT = float(os.environ.get('PMS_DB_IDLE_TIMEOUT', '300'))   # close server sessions idle longer than this
+
+_pool = None
+_pool_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_last_used = {}  # id(raw connection) -> time it was last returned to the pool
+_reaper = None
+
+POOL_STATS = {
+    'checkouts': 0,
+    'in_use': 0,
+    'peak_in_use': 0,
+    'waits': 0,
+    'wait_seconds': 0.0,
+    'exhausted': 0,
+    'reaped': 0,
+}
+
+
+def _bump(key, amount=1):
+    with _stats_lock:
+        POOL_STATS[key] += amount
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = pooling.MySQLConnectionPool(
+                    pool_name=POOL_NAME,
+                    pool_size=POOL_SIZE,
+                    pool_reset_session=True,
+                    **DB_CONFIG
+                )
+                _start_reaper()
+    return _pool
+
+
+def _checkout():
+    pool = get_pool()
+    deadline = time.monotonic() + POOL_TIMEOUT
+    started = None
+    while True:
+        try:
+            conn = pool.get_connection()
+            break
+        except PoolError:
+            # The pool raises immediately when empty; wait for a connection to be
+            # returned rather than failing the page on a short burst.
+            if started is None:
+                started = time.monotonic()
+                _bump('waits')
+            if time.monotonic() >= deadline:
+                _bump('exhausted')
+                raise
+            time.sleep(0.01)
+    if started is not None:
+        _bump('wait_seconds', time.monotonic() - started)
+
+    # MySQLConnectionPool.get_connection() already pings the connection it hands
+    # out and reconnects it if the server (wait_timeout) or the reaper below
+    # dropped the session, so callers always get a live connection.
+    with _stats_lock:
+        POOL_STATS['checkouts'] += 1
+        POOL_STATS['in_use'] += 1
+        POOL_STATS['peak_in_use'] = max(POOL_STATS['peak_in_use'], POOL_STATS['in_use'])
+    return conn
+
+
+def _checkin(conn):
+    raw = conn._cnx
+    try:
+        conn.close()
+    except Error:
+        # reset_session failed on a broken connection; the pool still takes it
+        # back and reconnects it on the next checkout.
+        pass
+    finally:
+        if raw is not None:
+            _last_used[id(raw)] = time.monotonic()
+        _bump('in_use', -1)
+
+
+@contextmanager
+def get_connection():
+    # Cursors of the connection report their statements to profiler.py
+    conn = _checkout()
+    handle = profiled(conn)
+    try:
+        yield handle
+    except BaseException:
+        try:
+            conn.rollback()
+        except Error:
+            pass
+        raise
+    finally:
+        if handle is not conn:
+            handle.finish()
+        _checkin(conn)
+
+
+@contextmanager
+def get_cursor(dictionary=False, commit=False):
+    with get_connection() as conn:
+        cursor = conn.cursor(dictionary=dictionary)
+        try:
+            yield cursor
+            if commit:
+                conn.commit()
+        finally:
+            cursor.close()
+
+
+def fetch_all(query, params=()):
+    with get_cursor() as cursor:
+        cursor.execute(query, params)
+        return cursor.fetchall()
+
+
+def fetch_one(query, params=()):
+    with get_cursor() as cursor:
+        cursor.execute(query, params)
+        return cursor.fetchone()
+
+
+def bulk_update(cursor, template, columns, rows, chunk=500):
+    # One multi-row UPDATE ... JOIN per chunk instead of a round trip per row.
+    # template contains {values}, which becomes a derived table of the rows
+    # with the given column names. Returns the number of rows changed.
+    changed = 0
+    for start in range(0, len(rows), chunk):
+        part = rows[start:start + chunk]
+        first = 'SELECT ' + ', '.join(f"%s AS {column}" for column in columns)
+        rest = 'SELECT ' + ', '.join(['%s'] * len(columns))
+        values = ' UNION ALL '.join([first] + [rest] * (len(part) - 1))
+        cursor.execute(template.format(values=values), [value for row in part for value in row])
+        changed += cursor.rowcount
+    return changed
+
+
+def reap_idle_connections():
+    # Disconnect pooled connections that have not been used for IDLE_TIMEOUT so
+    # an idle app does not hold server sessions; they reconnect on next checkout.
+    # mysql.connector has no public API for this, so walk the pool's queue under
+    # its own lock.
+    pool = _pool
+    if pool is None:
+        return 0
+    reaped = 0
+    now = time.monotonic()
+    with pooling.CONNECTION_POOL_LOCK:
+        for raw in list(pool._cnx_queue.queue):
+            last = _last_used.get(id(raw))
+            if last is not None and now - last > IDLE_TIMEOUT:
+                # Forget the timestamp so the next pass skips it until it has
+                # been checked out (and reconnected) again.
+                del _last_used[id(raw)]
+                try:
+                    raw.disconnect()
+                    reaped += 1
+                except Error:
+                    pass
+    if reaped:
+        _bump('reaped', reaped)
+    return reaped
+
+
+def _reap_forever():
+    while True:
+        time.sleep(max(IDLE_TIMEOUT / 2, 1))
+        reap_idle_connections()
+
+
+def _start_reaper():
+    global _reaper
+    if _reaper is None:
+        _reaper = threading.Thread(target=_reap_forever, name='pms-pool-reaper', daemon=True)
+        _reaper.start()
+
+
+def pool_stats():
+    with _stats_lock:
+        stats = dict(POOL_STATS)
+    stats['pool_size'] = POOL_SIZE
+    return stats
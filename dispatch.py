@@ -0,0 +1,356 @@
+import heapq
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+from mysql.connector import Error
+
+from cache import invalidate
+from db import bulk_update, get_connection
+from slots import (DAY_MINUTES, SLOT_MINUTES, SlotIndex, StaleSchedule, book, claim_versions,
+                   in_schedule_transaction, minute_of_day, sync_availability)
+
+# Driver dispatch. Pickups are requested without a driver; a planning run
+# loads every pending unassigned pickup and every available driver once,
+# groups pickups from the same area (pincode prefix, else locality) into
+# multi-stop runs, and hands each run to the least-loaded driver whose vehicle
+# is big enough and who has no overlapping slot (slots.py), in memory. Writing
+# the plan is one transaction that only claims pickups still unassigned and
+# drivers whose schedules have not changed since planning.
+#
+#   python dispatch.py [--date YYYY-MM-DD] [--dry-run]
+
+MAX_STOPS_PER_RUN = int(os.environ.get('PMS_DISPATCH_MAX_STOPS', '4'))
+MAX_RUNS_PER_DRIVER = int(os.environ.get('PMS_DISPATCH_MAX_RUNS', '3'))      # per day
+RUN_WINDOW_MINUTES = int(os.environ.get('PMS_DISPATCH_RUN_WINDOW', '120'))  # first to last stop
+PINCODE_PREFIX = int(os.environ.get('PMS_DISPATCH_PINCODE_PREFIX', '4'))    # digits that make an "area"
+
+# A driver can take a run needing their vehicle or anything smaller
+VEHICLE_RANK = {'Bike': 0, 'Car': 1, 'Van': 2, 'Truck': 3}
+DEFAULT_RANK = VEHICLE_RANK['Car']
+
+PENDING_PICKUPS = """
+    SELECT p.PICKUP_ID, p.SOURCE_ID, p.DESTINATION, p.VEHICLE_TYPE, s.DATE, s.TIME, fs.PINCODE, fs.LOCALITY
+    FROM FOOD_PICKUP p
+    JOIN SCHEDULES s ON s.SOURCE_ID = p.SOURCE_ID AND s.PICKUP_ID = p.PICKUP_ID
+    JOIN FOOD_SOURCES fs ON fs.SOURCE_ID = p.SOURCE_ID
+    WHERE p.DRIVER_ID IS NULL AND p.STATUS = 'Pending'{date_filter}
+    ORDER BY s.DATE, s.TIME, p.PICKUP_ID
+"""
+
+AVAILABLE_DRIVERS = """
+    SELECT DRIVER_ID, NAME, PHONE_NUMBER, VEHICLE_TYPE, IFNULL(TOTAL_COMPLETED_PICKUPS, 0), SCHEDULE_VERSION
+    FROM DRIVERS
+    WHERE AVAILABILITY_STATUS <> 'Off-Duty'
+"""
+
+# Runs each driver already has on the planned days
+EXISTING_RUNS = """
+    SELECT DRIVER_ID, RUN_DATE, COUNT(*)
+    FROM PICKUP_RUNS
+    WHERE RUN_DATE IN ({dates})
+    GROUP BY DRIVER_ID, RUN_DATE
+"""
+
+
+@dataclass
+class Pickup:
+    pickup_id: int
+    source_id: int
+    destination: str
+    vehicle_type: str
+    date: object
+    time: object
+    pincode: str = None
+    locality: str = None
+
+    @property
+    def when(self):
+        # SCHEDULES.TIME comes back as a timedelta
+        offset = self.time if isinstance(self.time, timedelta) else timedelta()
+        return datetime.combine(self.date, datetime.min.time()) + offset
+
+    @property
+    def minute(self):
+        return minute_of_day(self.time) if self.time is not None else 0
+
+    @property
+    def area(self):
+        if self.pincode:
+            return 'pin:' + self.pincode[:PINCODE_PREFIX]
+        if self.locality:
+            return 'loc:' + self.locality.strip().lower()
+        return f"src:{self.source_id}"
+
+
+@dataclass
+class Driver:
+    driver_id: int
+    name: str
+    phone: str
+    vehicle_type: str
+    completed: int
+    version: int = 0
+
+    @property
+    def rank(self):
+        return VEHICLE_RANK.get(self.vehicle_type, DEFAULT_RANK)
+
+
+@dataclass
+class Run:
+    date: object
+    area: str
+    stops: list = field(default_factory=list)   # Pickups in visiting order
+    driver: Driver = None
+
+    @property
+    def required_rank(self):
+        return max(VEHICLE_RANK.get(stop.vehicle_type, DEFAULT_RANK) for stop in self.stops)
+
+    @property
+    def window(self):
+        # Minutes of the day the run occupies its driver
+        return self.stops[0].minute, min(DAY_MINUTES, self.stops[-1].minute + SLOT_MINUTES)
+
+
+@dataclass
+class DispatchPlan:
+    runs: list = field(default_factory=list)
+    unassigned: list = field(default_factory=list)   # Runs no driver could take
+    elapsed: float = 0.0
+
+    @property
+    def assigned(self):
+        return [run for run in self.runs if run.driver is not None]
+
+    def rows(self):
+        return [
+            {
+                'date': run.date,
+                'area': run.area,
+                'driver': run.driver.name if run.driver else None,
+                'vehicle': run.driver.vehicle_type if run.driver else None,
+                'stops': len(run.stops),
+                'pickups': ', '.join(str(stop.pickup_id) for stop in run.stops),
+                'first_stop': run.stops[0].when.strftime('%H:%M'),
+            }
+            for run in self.runs
+        ]
+
+
+def request_pickup(source_id, destination, vehicle_type, pickup_date, pickup_time):
+    # Record a pending pickup and its schedule; a driver is assigned by the
+    # next planning run. Replaces the schedulePickup procedure.
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO FOOD_PICKUP (SOURCE_ID, STATUS, DESTINATION, VEHICLE_TYPE) VALUES (%s, 'Pending', %s, %s)",
+            (source_id, destination, vehicle_type)
+        )
+        pickup_id = cursor.lastrowid
+        cursor.execute(
+            "INSERT INTO SCHEDULES (SOURCE_ID, PICKUP_ID, DATE, TIME) VALUES (%s, %s, %s, %s)",
+            (source_id, pickup_id, pickup_date, pickup_time)
+        )
+        conn.commit()
+    invalidate('FOOD_PICKUP', 'SCHEDULES')
+    return pickup_id
+
+
+def request_pickup_with_driver(source_id, destination, vehicle_type, pickup_date, pickup_time, driver_id):
+    # Record a pickup already assigned to a driver, booking the driver's slot
+    # in the same transaction. Nothing is written when the slot is refused;
+    # the returned SlotBooking says why.
+    start = minute_of_day(pickup_time)
+
+    def work(cursor):
+        cursor.execute(
+            "INSERT INTO FOOD_PICKUP (SOURCE_ID, STATUS, DESTINATION, VEHICLE_TYPE) VALUES (%s, 'Pending', %s, %s)",
+            (source_id, destination, vehicle_type)
+        )
+        pickup_id = cursor.lastrowid
+        booking = book(cursor, driver_id, pickup_date, start, min(DAY_MINUTES, start + SLOT_MINUTES), pickup_id)
+        if booking.ok:
+            cursor.execute(
+                "UPDATE FOOD_PICKUP SET DRIVER_ID = %s, DRIVER_NAME = %s, CONTACT = %s WHERE PICKUP_ID = %s",
+                (driver_id, booking.driver_name, booking.driver_phone, pickup_id)
+            )
+            cursor.execute(
+                "INSERT INTO SCHEDULES (SOURCE_ID, PICKUP_ID, DATE, TIME) VALUES (%s, %s, %s, %s)",
+                (source_id, pickup_id, pickup_date, pickup_time)
+            )
+        return booking
+
+    booking = in_schedule_transaction(work)
+    if booking.ok:
+        invalidate('FOOD_PICKUP', 'SCHEDULES', 'DRIVER_SLOTS', 'DRIVERS')
+        sync_availability([driver_id])
+    return booking
+
+
+def batch_runs(pickups):
+    # Same day and area, in time order; a run closes when it is full or its
+    # next stop would fall outside the run window.
+    groups = {}
+    for pickup in pickups:
+        groups.setdefault((pickup.date, pickup.area), []).append(pickup)
+
+    window = timedelta(minutes=RUN_WINDOW_MINUTES)
+    runs = []
+    for (day, area), stops in groups.items():
+        stops.sort(key=lambda stop: (stop.when, stop.pickup_id))
+        run = None
+        for stop in stops:
+            if run is None or len(run.stops) >= MAX_STOPS_PER_RUN or stop.when - run.stops[0].when > window:
+                run = Run(day, area)
+                runs.append(run)
+            run.stops.append(stop)
+    return runs
+
+
+def assign_drivers(runs, drivers, existing=None, slots=None):
+    # Per day, one heap per vehicle rank keyed by (runs that day, completed
+    # pickups) so the least-loaded, least-used driver comes first. Runs needing
+    # the biggest vehicles are placed first; each takes the smallest vehicle
+    # that fits and the first driver in the heap who is free for the run's
+    # window. existing maps (driver_id, date) -> runs already planned; slots is
+    # a SlotIndex of what drivers are already booked for, and is updated with
+    # the plan's runs.
+    existing = existing or {}
+    slots = slots if slots is not None else SlotIndex()
+    by_day = {}
+    for run in runs:
+        by_day.setdefault(run.date, []).append(run)
+
+    unassigned = []
+    for day, day_runs in by_day.items():
+        heaps = {rank: [] for rank in set(VEHICLE_RANK.values()) | {DEFAULT_RANK}}
+        for driver in drivers:
+            load = existing.get((driver.driver_id, day), 0)
+            if load < MAX_RUNS_PER_DRIVER:
+                heapq.heappush(heaps[driver.rank], (load, driver.completed, driver.driver_id, driver))
+
+        day_runs.sort(key=lambda run: (-run.required_rank, run.stops[0].when))
+        for run in day_runs:
+            start, end = run.window
+            for rank in sorted(rank for rank in heaps if rank >= run.required_rank):
+                busy = []
+                while heaps[rank]:
+                    entry = heapq.heappop(heaps[rank])
+                    if slots.is_free(entry[2], day, start, end):
+                        break
+                    busy.append(entry)
+                else:
+                    entry = None
+                for other in busy:
+                    heapq.heappush(heaps[rank], other)
+                if entry is not None:
+                    load, completed, driver_id, driver = entry
+                    run.driver = driver
+                    slots.add(driver_id, day, start, end)
+                    if load + 1 < MAX_RUNS_PER_DRIVER:
+                        heapq.heappush(heaps[rank], (load + 1, completed, driver_id, driver))
+                    break
+            else:
+                unassigned.append(run)
+    return unassigned
+
+
+def _load(cursor, day=None):
+    date_filter, params = ('', ())
+    if day is not None:
+        date_filter, params = ' AND s.DATE = %s', (day,)
+    cursor.execute(PENDING_PICKUPS.format(date_filter=date_filter), params)
+    pickups = [Pickup(*row) for row in cursor.fetchall()]
+    cursor.execute(AVAILABLE_DRIVERS)
+    drivers = [Driver(*row) for row in cursor.fetchall()]
+    existing = {}
+    dates = sorted({pickup.date for pickup in pickups})
+    if dates:
+        cursor.execute(EXISTING_RUNS.format(dates=', '.join(['%s'] * len(dates))), dates)
+        existing = {(driver_id, run_date): count for driver_id, run_date, count in cursor.fetchall()}
+    return pickups, drivers, existing, SlotIndex().load(cursor, dates)
+
+
+def plan_dispatch(day=None):
+    # Build a plan for one day (or every pending day) without writing it
+    started = time.perf_counter()
+    with get_connection() as conn:
+        pickups, drivers, existing, slots = _load(conn.cursor(), day)
+        conn.commit()
+    runs = batch_runs(pickups)
+    unassigned = assign_drivers(runs, drivers, existing, slots)
+    return DispatchPlan(runs, unassigned, time.perf_counter() - started)
+
+
+def apply_plan(plan):
+    # Write every assigned run, and the slot it books, in one transaction. If
+    # any pickup was assigned or any driver's schedule changed since planning,
+    # nothing is written and Error is raised so the caller can plan again.
+    assigned = plan.assigned
+    if not assigned:
+        return 0
+    versions = {run.driver.driver_id: run.driver.version for run in assigned}
+    with get_connection() as conn:
+        conn.start_transaction(isolation_level='READ COMMITTED')
+        cursor = conn.cursor()
+        try:
+            claim_versions(cursor, versions)
+        except StaleSchedule as e:
+            conn.rollback()
+            raise Error(msg=f"driver {e} was booked since planning; plan again")
+        rows, slot_rows = [], []
+        for run in assigned:
+            cursor.execute(
+                "INSERT INTO PICKUP_RUNS (DRIVER_ID, RUN_DATE, STOPS) VALUES (%s, %s, %s)",
+                (run.driver.driver_id, run.date, len(run.stops))
+            )
+            run_id = cursor.lastrowid
+            slot_rows.append((run.driver.driver_id, run.date) + run.window + (None, run_id))
+            rows += [
+                (stop.pickup_id, run.driver.driver_id, run.driver.name, run.driver.phone,
+                 run.driver.vehicle_type, run_id, seq)
+                for seq, stop in enumerate(run.stops, start=1)
+            ]
+        claimed = bulk_update(cursor, """
+            UPDATE FOOD_PICKUP p JOIN ({values}) t ON t.PICKUP_ID = p.PICKUP_ID
+            SET p.DRIVER_ID = t.DRIVER_ID, p.DRIVER_NAME = t.DRIVER_NAME, p.CONTACT = t.CONTACT,
+                p.VEHICLE_TYPE = t.VEHICLE_TYPE, p.RUN_ID = t.RUN_ID, p.STOP_SEQ = t.STOP_SEQ
+            WHERE p.DRIVER_ID IS NULL AND p.STATUS = 'Pending'
+        """, ('PICKUP_ID', 'DRIVER_ID', 'DRIVER_NAME', 'CONTACT', 'VEHICLE_TYPE', 'RUN_ID', 'STOP_SEQ'), rows)
+        if claimed != len(rows):
+            conn.rollback()
+            raise Error(msg=f"{len(rows) - claimed} pickup(s) were assigned since planning; plan again")
+        cursor.executemany(
+            "INSERT INTO DRIVER_SLOTS (DRIVER_ID, SLOT_DATE, START_MIN, END_MIN, PICKUP_ID, RUN_ID) "
+            "VALUES (%s, %s, %s, %s, %s, %s)",
+            slot_rows
+        )
+        conn.commit()
+    invalidate('FOOD_PICKUP', 'PICKUP_RUNS', 'DRIVER_SLOTS', 'DRIVERS')
+    sync_availability(list(versions))
+    return len(rows)
+
+
+def dispatch(day=None):
+    plan = plan_dispatch(day)
+    apply_plan(plan)
+    return plan
+
+
+def main(argv):
+    day = argv[argv.index('--date') + 1] if '--date' in argv else None
+    plan = plan_dispatch(day) if '--dry-run' in argv else dispatch(day)
+    for row in plan.rows():
+        print(f"{row['date']} {row['first_stop']} {row['area']:<16} {row['stops']} stop(s) "
+              f"-> {row['driver'] or 'UNASSIGNED'} ({row['vehicle'] or '-'}): {row['pickups']}")
+    print(f"{len(plan.assigned)} run(s) assigned, {len(plan.unassigned)} unassigned, "
+          f"planned in {plan.elapsed * 1000:.0f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
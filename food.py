@@ -2,99 +2,202 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-import mysql.connector
 from datetime import datetime, timedelta
 import numpy as np
 from mysql.connector import Error
 import matplotlib.pyplot as plt
+from db import get_connection
+from cache import cached_query, invalidate, tables_in
+from inventory import forget_item, get_inventory, record_item
+from grid import Filter, GridSpec, Sort, render_grid
+from importer import import_items
+from summary import GENERAL_TOTALS_QUERY, SOURCE_IMPACT_QUERY, SourceImpact, impact_leaderboard
+from snapshots import get_snapshot, query_rows, register
+from forecast import DEMAND_WINDOW_DAYS, expired_stock, waste_forecast
 
-def create_connection():
+
+# Monthly donated quantity per source, for any set of sources in one grouped
+# query. Joining on both DONATES_TO key columns makes each lookup a primary key
+# read. The %% escapes are needed because the query always takes parameters.
+MONTHLY_SOURCE_TRENDS_QUERY = """
+    SELECT d.SOURCE_ID, DATE_FORMAT(dt.DATE_TIME, '%%Y-%%m') AS month, SUM(d.QUANTITY)
+    FROM DONATIONS d
+    JOIN DONATES_TO dt ON dt.SOURCE_ID = d.SOURCE_ID AND dt.DONATION_ID = d.DONATION_ID
+    WHERE dt.DATE_TIME >= %s{sources}
+    GROUP BY d.SOURCE_ID, month
+"""
+
+def monthly_source_trends(source_ids=None, since='1000-01-01'):
+    # month x source matrix of donated quantity (sources as columns)
+    sql, params = MONTHLY_SOURCE_TRENDS_QUERY, (since,)
+    if source_ids is not None:
+        source_ids = tuple(source_ids)
+        if not source_ids:
+            return pd.DataFrame()
+        sql = sql.format(sources=f" AND d.SOURCE_ID IN ({', '.join(['%s'] * len(source_ids))})")
+        params += source_ids
+    else:
+        sql = sql.format(sources='')
+    rows = pd.DataFrame(cached_query(sql, params), columns=['source_id', 'month', 'quantity'])
+    if rows.empty:
+        return pd.DataFrame()
+    rows['quantity'] = rows['quantity'].astype(float)
+    return rows.pivot_table(index='month', columns='source_id', values='quantity',
+                            aggfunc='sum', fill_value=0).sort_index()
+
+# Aggregates behind the single-source dashboard, shared by every session
+# through the snapshot worker; selecting a source is a lookup in memory.
+MONTHLY_TRENDS_FEED = register(
+    'food.monthly_trends', lambda: monthly_source_trends(), tables_in(MONTHLY_SOURCE_TRENDS_QUERY)
+)
+
+
+def all_source_impacts():
+    # source_id -> SourceImpact for every source
+    rows = query_rows(SOURCE_IMPACT_QUERY, name='food.source_impacts')
+    return {row[0]: SourceImpact.from_row(row) for row in rows}
+
+
+def all_monthly_trends():
+    snapshot = get_snapshot(MONTHLY_TRENDS_FEED)
+    if not snapshot.ok:
+        raise Error(msg=snapshot.error)
+    return snapshot.value
+
+def display_source_comparison(sources):
+    st.title("📊 Food Source Comparison")
     try:
-        connection = mysql.connector.connect(
-            host='localhost',
-            user='root',    # Update with your MySQL username
-            password='thegnas58',  # Update with your MySQL password
-            database='perishable_management_system'  # Update with your MySQL database
-        )
-        return connection
-    except Error as e:
-        st.error(f"Error: {e}")
-        return None
-
-def display_impact_dashboard():
+        compare_all = st.sidebar.checkbox("Compare all sources")
+        if compare_all:
+            selected = None
+        else:
+            default = [leader.source_id for leader in impact_leaderboard('quantity', limit=5)]
+            selected = st.sidebar.multiselect("Sources to compare", options=list(sources.keys()),
+                                              default=[source for source in default if source in sources],
+                                              format_func=lambda x: sources[x])
+            if not selected:
+                st.info("Select at least one source to compare.")
+                return
+        months = st.sidebar.slider("Months of history", min_value=1, max_value=36, value=12)
+        since = (pd.Timestamp.today().normalize() - pd.DateOffset(months=months)).replace(day=1).date()
+
+        matrix = monthly_source_trends(selected, since)
+        if matrix.empty:
+            st.info("No donations recorded for these sources in this period.")
+            return
+        matrix.columns = [sources.get(source_id, source_id) for source_id in matrix.columns]
+
+        # Overlaid monthly trends
+        trend = matrix.reset_index().melt(id_vars='month', var_name='source', value_name='quantity')
+        fig = px.line(trend, x='month', y='quantity', color='source',
+                      title='Monthly Donation Quantities by Source',
+                      labels={'month': 'Month', 'quantity': 'Quantity (kg)', 'source': 'Source'})
+        st.plotly_chart(fig, use_container_width=True)
+
+        # Rankings over the period, with the latest month against the one before
+        ranking = pd.DataFrame({
+            'Total (kg)': matrix.sum(),
+            'Monthly Average (kg)': matrix.mean().round(1),
+            'Active Months': (matrix > 0).sum(),
+            'Last Month (kg)': matrix.iloc[-1],
+            'Change vs Previous (kg)': matrix.iloc[-1] - matrix.iloc[-2] if len(matrix) > 1 else 0,
+        }).sort_values('Total (kg)', ascending=False)
+        ranking.index.name = 'Source'
+        st.subheader("🏆 Rankings")
+        st.dataframe(ranking)
+
+        fig = px.bar(ranking.reset_index().head(20), x='Source', y='Total (kg)',
+                     title='Total Donated per Source (top 20)')
+        st.plotly_chart(fig, use_container_width=True)
+
+    except Exception as e:
+        st.error(f"Error: {str(e)}")
+
+LEADERBOARD_LABELS = {
+    'quantity': 'Quantity donated',
+    'people': 'People helped',
+    'ngos': 'NGOs supported',
+    'items': 'Items provided',
+}
+
+LEADERBOARD_FIELDS = {
+    'quantity': 'quantity_donated',
+    'people': 'people_helped',
+    'ngos': 'ngos_supported',
+    'items': 'items_provided',
+}
+
+def display_impact_dashboard(source_id=None):
+    # source_id pins the page to the logged-in food source
     st.title("🏪 Food Source Impact Analytics Dashboard")
     
     try:
-        conn = create_connection()
-        if not conn:
-            return
-        
-        cursor = conn.cursor()
-        
-        # Get all food sources for selection
-        cursor.execute("SELECT SOURCE_ID, NAME FROM FOOD_SOURCES")
-        sources = dict(cursor.fetchall())
-        
-        # Sidebar for source selection
-        st.sidebar.header("📊 Dashboard Controls")
-        selected_source = st.sidebar.selectbox(
-            "Select Food Source",
-            options=list(sources.keys()),
-            format_func=lambda x: sources[x]
-        )
-        
+        # Every source's impact, from the shared snapshot
+        impacts = all_source_impacts()
+        sources = {source_id: impact.name for source_id, impact in impacts.items()}
+    
+        if source_id is not None:
+            selected_source = source_id
+        else:
+            # Sidebar for source selection
+            st.sidebar.header("📊 Dashboard Controls")
+            selected_source = st.sidebar.selectbox(
+                "Select Food Source",
+                options=list(sources.keys()),
+                format_func=lambda x: sources[x]
+            )
+    
         # Get impact data for the selected source
-        cursor.execute("SELECT GetFoodSourceImpact(%s)", (selected_source,))
-        impact_data = cursor.fetchone()[0]
-        
-        # Parse impact data for selected source
-        impact_metrics = {}
-        for metric in impact_data.split(', '):
-            key, value = metric.split(': ')
-            impact_metrics[key] = value.replace(' kg', '') if 'kg' in value else value
-        
+        impact = impacts.get(selected_source)
+    
         # Show Key Performance Metrics for the selected source
         st.header("📈 Selected Source Impact")
         col1, col2, col3 = st.columns(3)
-        
+    
         with col1:
             st.markdown(f"""
             <div style='padding: 20px; background-color: #f0f2f6; border-radius: 10px; text-align: center; margin-bottom: 20px; border: 2px solid #ddd;'>
                 <h3 style='color: black;'>Total Food Items</h3>
-                <h2 style='color: black;'>{impact_metrics.get('Total Food Items Provided', 'N/A')}</h2>
+                <h2 style='color: black;'>{impact.items_provided if impact else 'N/A'}</h2>
             </div>
             """, unsafe_allow_html=True)
-            
+        
         with col2:
             st.markdown(f"""
             <div style='padding: 20px; background-color: #f0f2f6; border-radius: 10px; text-align: center; margin-bottom: 20px; border: 2px solid #ddd;'>
                 <h3 style='color: black;'>NGOs Supported</h3>
-                <h2 style='color: black;'>{impact_metrics.get('Total NGOs Supported', 'N/A')}</h2>
+                <h2 style='color: black;'>{impact.ngos_supported if impact else 'N/A'}</h2>
             </div>
             """, unsafe_allow_html=True)
-            
+        
         with col3:
             st.markdown(f"""
             <div style='padding: 20px; background-color: #f0f2f6; border-radius: 10px; text-align: center; margin-bottom: 20px; border: 2px solid #ddd;'>
                 <h3 style='color: black;'>People Helped</h3>
-                <h2 style='color: black;'>{impact_metrics.get('Total People Helped', 'N/A')}</h2>
+                <h2 style='color: black;'>{impact.people_helped if impact else 'N/A'}</h2>
             </div>
             """, unsafe_allow_html=True)
 
+        # Leaderboard of all sources, ranked from the same snapshot
+        st.header("🏆 Source Leaderboard")
+        rank_by = st.selectbox("Rank sources by", list(LEADERBOARD_LABELS), format_func=LEADERBOARD_LABELS.get)
+        field = LEADERBOARD_FIELDS[rank_by]
+        leaders = sorted(impacts.values(), key=lambda s: (-getattr(s, field), s.source_id))[:10]
+        if leaders:
+            st.dataframe(pd.DataFrame([
+                {'Source': leader.name, 'Items Provided': leader.items_provided,
+                 'NGOs Supported': leader.ngos_supported, 'Quantity Donated (kg)': leader.quantity_donated,
+                 'Average Rating': leader.average_rating, 'People Helped': leader.people_helped}
+                for leader in leaders
+            ]), hide_index=True)
+
         # Monthly Donation Trends for the selected source
         st.header("📊 Monthly Donation Analysis")
-        cursor.execute(f"""
-            SELECT 
-                DATE_FORMAT(dt.DATE_TIME, '%Y-%m') as month,
-                SUM(d.QUANTITY) as total_quantity
-            FROM DONATES_TO dt
-            JOIN DONATIONS d ON dt.DONATION_ID = d.DONATION_ID
-            WHERE d.SOURCE_ID = {selected_source}
-            GROUP BY DATE_FORMAT(dt.DATE_TIME, '%Y-%m')
-            ORDER BY month
-        """)
-        donation_trends = pd.DataFrame(cursor.fetchall(), columns=['month', 'quantity'])
-        
+        matrix = all_monthly_trends()
+        donation_trends = pd.DataFrame()
+        if selected_source in matrix.columns:
+            donation_trends = pd.DataFrame({'month': matrix.index, 'quantity': matrix[selected_source].values})
+    
         if not donation_trends.empty:
             fig = px.line(donation_trends, 
                          x='month', 
@@ -103,44 +206,36 @@ def display_impact_dashboard():
                          labels={'month': 'Month', 'quantity': 'Quantity (kg)'},
                          line_shape='spline')
             st.plotly_chart(fig, use_container_width=True)
-        
+    
         # Display general statistics (not specific to any source)
         st.header("📊 General Impact Statistics")
-        
-        # General food item statistics (across all sources)
-        cursor.execute("""
-            SELECT 
-                SUM(d.QUANTITY) as total_quantity,
-                COUNT(DISTINCT d.SOURCE_ID) as total_sources,
-                COUNT(DISTINCT n.NGO_ID) as total_ngos,
-                SUM(d.QUANTITY) / COUNT(DISTINCT n.NGO_ID) as avg_donated_per_ngo
-            FROM DONATIONS d
-            JOIN DONATES_TO dt ON d.DONATION_ID = dt.DONATION_ID
-            JOIN NGO n ON d.NGO_ID = n.NGO_ID
-        """)
-        general_stats = cursor.fetchone()
-        
+    
+        # General food item statistics (across all sources), from the summary tables
+        total_quantity, total_sources, total_ngos = query_rows(GENERAL_TOTALS_QUERY, name='food.general_totals')[0]
+        general_stats = (total_quantity, total_sources, total_ngos,
+                         total_quantity / total_ngos if total_ngos else 0)
+    
         st.markdown(f"""
         <div style='padding: 20px; background-color: #f0f2f6; border-radius: 10px; text-align: center; margin-bottom: 20px; border: 2px solid #ddd;'>
             <h3 style='color: black;'>Total Food Items Donated (Across All Sources)</h3>
             <h2 style='color: black;'>{general_stats[0]:,.0f} kg</h2>
         </div>
         """, unsafe_allow_html=True)
-        
+    
         st.markdown(f"""
         <div style='padding: 20px; background-color: #f0f2f6; border-radius: 10px; text-align: center; margin-bottom: 20px; border: 2px solid #ddd;'>
             <h3 style='color: black;'>Total Sources Contributing</h3>
             <h2 style='color: black;'>{general_stats[1]}</h2>
         </div>
         """, unsafe_allow_html=True)
-        
+    
         st.markdown(f"""
         <div style='padding: 20px; background-color: #f0f2f6; border-radius: 10px; text-align: center; margin-bottom: 20px; border: 2px solid #ddd;'>
             <h3 style='color: black;'>Total NGOs Supported</h3>
             <h2 style='color: black;'>{general_stats[2]}</h2>
         </div>
         """, unsafe_allow_html=True)
-        
+    
         st.markdown(f"""
         <div style='padding: 20px; background-color: #f0f2f6; border-radius: 10px; text-align: center; margin-bottom: 20px; border: 2px solid #ddd;'>
             <h3 style='color: black;'>Average Quantity Donated Per NGO</h3>
@@ -150,25 +245,33 @@ def display_impact_dashboard():
 
     except Exception as e:
         st.error(f"Error: {str(e)}")
-    finally:
-        if 'conn' in locals() and conn:
-            conn.close()
 
 
 
 # Function to manage food sources
+FOOD_SOURCE_GRID = GridSpec(
+    'food_sources', 'FOOD_SOURCES', 'SOURCE_ID',
+    [('SOURCE_ID', 'Source ID'), ('NAME', 'Name'), ('CONTACT_NAME', 'Contact Name'), ('CONTACT', 'Contact'),
+     ('EMAIL', 'Email'), ('DETAILS', 'Details'), ('LOCALITY', 'Locality'), ('PINCODE', 'Pincode')],
+    filters=[Filter('LOCALITY', 'Locality', 'prefix'), Filter('PINCODE', 'Pincode')],
+    sorts=[Sort('Name', 'NAME'), Sort('Locality', "COALESCE(LOCALITY, '')")],
+)
+
+FOOD_ITEM_GRID = GridSpec(
+    'food_items', 'FOOD_ITEM', 'FOOD_ID',
+    [('FOOD_ID', 'Food ID'), ('NAME', 'Name'), ('QUANTITY', 'Quantity'), ('CATEGORY', 'Category'),
+     ('EXPIRY_DATE', 'Expiry Date'), ('SOURCE_ID', 'Source ID')],
+    filters=[Filter('CATEGORY', 'Category'), Filter('EXPIRY_DATE', 'Expires within (days)', 'within_days')],
+    sorts=[Sort('Expiry', "COALESCE(EXPIRY_DATE, '9999-12-31')"), Sort('Quantity', 'QUANTITY'), Sort('Name', 'NAME')],
+)
+
 def manage_food_sources(conn):
     c = conn.cursor()
     st.subheader("Manage Food Sources")
 
-    # Display all food sources with headers
+    # Display food sources one page at a time
     st.write("### List of Food Sources")
-    c.execute("SELECT * FROM FOOD_SOURCES")
-    sources = c.fetchall()
-    if sources:
-        st.table([['Source ID', 'Name', 'Contact Name', 'Contact', 'Email', 'Details', 'Locality', 'Pincode']] + sources)
-    else:
-        st.info("No food sources available.")
+    render_grid(FOOD_SOURCE_GRID)
 
     # Operation options
     operation = st.radio("Select Operation", ['Update Source', 'Delete Source', 'View Source Details'])
@@ -200,6 +303,7 @@ def manage_food_sources(conn):
                         (updated_name, updated_contact_name, updated_contact, updated_email, updated_details, updated_locality, updated_pincode, source_id)
                     )
                     conn.commit()
+                    invalidate('FOOD_SOURCES')
                     st.success("Food Source updated successfully!")
                 except Exception as e:
                     st.error(f"Error: {e}")
@@ -215,6 +319,7 @@ def manage_food_sources(conn):
             try:
                 c.execute("DELETE FROM FOOD_SOURCES WHERE SOURCE_ID = %s", (source_id,))
                 conn.commit()
+                invalidate('FOOD_SOURCES')
                 if c.rowcount > 0:
                     st.success("Food Source deleted successfully!")
                 else:
@@ -241,21 +346,28 @@ def manage_food_sources(conn):
         else:
             st.warning("Food Source not found. Please enter a valid Source ID.")
 
-def manage_food_items(conn):
+def manage_food_items(conn, source_id=None):
+    # source_id (the logged-in food source) owns every item created here
+    own_source = source_id
     c = conn.cursor()
     st.subheader("Manage Food Items")
 
-    # Display all food items with headers
-    st.write("### List of Food Items")
-    c.execute("SELECT * FROM FOOD_ITEM")
-    items = c.fetchall()
-    if items:
-        st.table([['Food ID', 'Name', 'Quantity', 'Category', 'Expiry Date', 'Source ID']] + items)
+    # Served from the in-memory inventory index, soonest expiry first
+    inventory = get_inventory()
+    st.write("### Expiring Soon")
+    days = st.slider("Expiring within (days)", min_value=1, max_value=30, value=3)
+    expiring = inventory.expiring_within(days)
+    if expiring:
+        st.table([['Food ID', 'Name', 'Quantity', 'Category', 'Expiry Date', 'Source ID']] + [item.as_row() for item in expiring])
     else:
-        st.info("No food items available.")
+        st.info(f"Nothing expires in the next {days} days.")
+
+    # Display food items one page at a time
+    st.write("### List of Food Items")
+    render_grid(FOOD_ITEM_GRID)
 
     # Operation options
-    operation = st.radio("Select Operation", ['Create Item', 'Update Item', 'Delete Item', 'View Item Details'])
+    operation = st.radio("Select Operation", ['Create Item', 'Bulk Import', 'Update Item', 'Delete Item', 'View Item Details'])
 
     # 1. Create a New Food Item
     if operation == 'Create Item':
@@ -264,7 +376,7 @@ def manage_food_items(conn):
         quantity = st.number_input("Enter Quantity", min_value=1, step=1)
         category = st.text_input("Enter Category")
         expiry_date = st.date_input("Enter Expiry Date")
-        source_id = st.number_input("Enter Source ID", min_value=1)
+        source_id = own_source or st.number_input("Enter Source ID", min_value=1)
 
         if st.button("Create Item"):
             try:
@@ -273,6 +385,8 @@ def manage_food_items(conn):
                     (name, quantity, category, expiry_date, source_id)
                 )
                 conn.commit()
+                invalidate('FOOD_ITEM')
+                record_item(c.lastrowid, name, quantity, category, expiry_date, source_id)
                 st.success("Food item created successfully!")
             except Exception as e:
                 st.error(f"Error: {e}")
@@ -288,7 +402,7 @@ def manage_food_items(conn):
             st.write(f"Food ID: {item[0]}, Name: {item[1]}, Quantity: {item[2]}, Category: {item[3]}, Expiry Date: {item[4]}, Source ID: {item[5]}")
 
             updated_name = st.text_input("Update Name", value=item[1])
-            updated_quantity = st.number_input("Update Quantity", min_value=1, step=1, value=item[2])
+            updated_quantity = st.number_input("Update Quantity", min_value=0, step=1, value=item[2])
             updated_category = st.text_input("Update Category", value=item[3])
             updated_expiry_date = st.date_input("Update Expiry Date", value=item[4])
             updated_source_id = st.number_input("Update Source ID", min_value=1, value=item[5])
@@ -300,6 +414,8 @@ def manage_food_items(conn):
                         (updated_name, updated_quantity, updated_category, updated_expiry_date, updated_source_id, food_id)
                     )
                     conn.commit()
+                    invalidate('FOOD_ITEM')
+                    record_item(food_id, updated_name, updated_quantity, updated_category, updated_expiry_date, updated_source_id)
                     st.success("Food item updated successfully!")
                 except Exception as e:
                     st.error(f"Error: {e}")
@@ -314,6 +430,8 @@ def manage_food_items(conn):
             try:
                 c.execute("DELETE FROM FOOD_ITEM WHERE FOOD_ID = %s", (food_id,))
                 conn.commit()
+                invalidate('FOOD_ITEM')
+                forget_item(food_id)
                 if c.rowcount > 0:
                     st.success("Food item deleted successfully!")
                 else:
@@ -337,6 +455,24 @@ def manage_food_items(conn):
         else:
             st.warning("Food item not found. Please enter a valid Food ID.")
 
+    # 5. Import many items from a file
+    elif operation == 'Bulk Import':
+        st.write("### Bulk Import Food Items")
+        st.caption("Columns: NAME, QUANTITY, CATEGORY, EXPIRY_DATE, SOURCE_ID (SOURCE_ID may be omitted if set below)")
+        upload = st.file_uploader("Upload CSV or Parquet", type=['csv', 'parquet'])
+        source_id = own_source or st.number_input("Source ID for all rows (0 = take it from the file)",
+                                                  min_value=0, step=1)
+        if upload is not None and st.button("Import"):
+            try:
+                report = import_items(upload, source_id or None)
+                st.success(f"Imported {report.inserted} items in {report.elapsed:.2f}s "
+                           f"({report.rows_per_second:.0f} rows/s).")
+                if report.rejects:
+                    st.warning(f"{len(report.rejects)} rows rejected.")
+                    st.dataframe(pd.DataFrame(report.rejects), hide_index=True)
+            except (Error, ValueError) as e:
+                st.error(f"Error: {e}")
+
 def get_top_demanded_categories(conn, top_n):
     c = conn.cursor()
     c.execute("CALL GetTopDemandedCategories(%s)", (top_n,))
@@ -363,30 +499,73 @@ def get_top_demanded_categories(conn, top_n):
     else:
         st.warning("No data available.")
 
+def display_expiry_risk(source_id=None):
+    # source_id limits the lists to one source's items; they are still scored
+    # against the whole inventory
+    st.title("⏳ Expiry Risk & Waste Forecast")
+    horizon = st.slider("Forecast horizon (days)", min_value=1, max_value=60, value=7)
+    window = st.slider("Demand history (days)", min_value=7, max_value=180, value=DEMAND_WINDOW_DAYS)
+
+    try:
+        expired = expired_stock(source_id)
+        if not expired.empty:
+            st.warning(f"{expired['quantity'].sum():,.0f} units in {len(expired):,} items are already past "
+                       "their expiry date and can no longer be allocated.")
+            with st.expander("Expired stock"):
+                st.dataframe(expired[['food_id', 'name', 'category', 'quantity', 'expiry_date', 'source_id']].rename(
+                    columns={'food_id': 'Food ID', 'name': 'Name', 'category': 'Category', 'quantity': 'Quantity',
+                             'expiry_date': 'Expiry Date', 'source_id': 'Source ID'}
+                ), hide_index=True)
+
+        by_day, at_risk = waste_forecast(horizon, window, source_id)
+        if at_risk.empty:
+            st.success(f"Current demand is expected to clear everything expiring in the next {horizon} days.")
+            return
+
+        col1, col2 = st.columns(2)
+        col1.metric("Units forecast to expire unallocated", f"{at_risk['expected_waste'].sum():,.0f}")
+        col2.metric("Items at risk", f"{len(at_risk):,}")
+
+        # Expected waste per day, stacked by category
+        trend = by_day.reset_index().melt(id_vars='expiry_date', var_name='category', value_name='units')
+        fig = px.bar(trend, x='expiry_date', y='units', color='category',
+                     title='Expected Unallocated Units by Expiry Date',
+                     labels={'expiry_date': 'Expiry Date', 'units': 'Units', 'category': 'Category'})
+        st.plotly_chart(fig, use_container_width=True)
+
+        st.subheader("Highest-risk items")
+        top = at_risk.head(50)[['food_id', 'name', 'category', 'quantity', 'expiry_date',
+                                'days_to_expiry', 'expected_waste', 'source_id']]
+        st.dataframe(top.rename(columns={
+            'food_id': 'Food ID', 'name': 'Name', 'category': 'Category', 'quantity': 'Quantity',
+            'expiry_date': 'Expiry Date', 'days_to_expiry': 'Days Left',
+            'expected_waste': 'Expected Waste', 'source_id': 'Source ID',
+        }).round({'Expected Waste': 1}), hide_index=True)
+    except Exception as e:
+        st.error(f"Error: {str(e)}")
+
 # Streamlit main function to run the app
 def main():
-    # Connect to the database
-    conn = mysql.connector.connect(
-        host="localhost",  # Replace with your database host
-        user="root",  # Replace with your database user
-        password="thegnas58",  # Replace with your database password
-        database="perishable_management_system"  # Replace with your database name
-    )
-    
     st.sidebar.title("Navigation")
-    app_mode = st.sidebar.radio("Choose a tab", ["Home", "Manage Info","Make Donation ","Top Categories"])
+    app_mode = st.sidebar.radio("Choose a tab", ["Home", "Manage Info","Make Donation ","Top Categories","Expiry Risk"])
     
     if app_mode == "Home":
         st.subheader("Welcome to the Perishable Management System")
         st.write("Use the side menu to navigate to different sections.")
-        display_impact_dashboard()
+        view = st.sidebar.radio("View", ["Single source", "Compare sources"])
+        if view == "Compare sources":
+            display_source_comparison(dict(cached_query("SELECT SOURCE_ID, NAME FROM FOOD_SOURCES")))
+        else:
+            display_impact_dashboard()
         
     
     elif app_mode == "Manage Info":
-        manage_food_sources(conn)
+        with get_connection() as conn:
+            manage_food_sources(conn)
 
     elif app_mode == "Make Donation ":
-        manage_food_items(conn)
+        with get_connection() as conn:
+            manage_food_items(conn)
     
     elif app_mode == "Top Categories":
         st.title("Top Demanded Food Categories")
@@ -396,11 +575,11 @@ def main():
             submit_button = st.form_submit_button(label='Get Top Demanded Categories')
         
         if submit_button:
-            get_top_demanded_categories(conn, top_n)
-        
-    
-    # Close the connection
-    conn.close()
+            with get_connection() as conn:
+                get_top_demanded_categories(conn, top_n)
+
+    elif app_mode == "Expiry Risk":
+        display_expiry_risk()
 
 # Run the app
 if __name__ == "__main__":
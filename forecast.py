@@ -0,0 +1,143 @@
+import os
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from cache import cached_query
+
+# Expiry-risk scoring and waste forecast over FOOD_ITEM. Stock in a category
+# is assumed to be handed out earliest expiry first (the allocation rule) at
+# that category's recent daily demand. An item therefore goes to waste by the
+# amount still left when demand reaches it:
+#
+#   ahead  = units in the same category that expire before it
+#   served = clamp(demand_rate * days_to_expiry - ahead, 0, quantity)
+#   waste  = quantity - served
+#
+# Stock already past its expiry date is never allocated, so it is all waste
+# and does not count towards ahead; expired_stock() lists it separately.
+#
+# Everything is computed with one lexsort and one cumsum over the whole
+# inventory, so scoring a million items takes well under a second.
+DEMAND_WINDOW_DAYS = int(os.environ.get('PMS_DEMAND_WINDOW_DAYS', '30'))
+
+INVENTORY_QUERY = """
+    SELECT FOOD_ID, NAME, CATEGORY, QUANTITY, EXPIRY_DATE, SOURCE_ID
+    FROM FOOD_ITEM
+    WHERE QUANTITY > 0 AND EXPIRY_DATE IS NOT NULL
+"""
+
+# Units donated per category over the demand window. The %% escapes are
+# needed because the query takes a parameter.
+DEMAND_QUERY = """
+    SELECT IFNULL(d.CATEGORY, ''), SUM(d.QUANTITY)
+    FROM DONATIONS d
+    JOIN DONATES_TO dt ON dt.SOURCE_ID = d.SOURCE_ID AND dt.DONATION_ID = d.DONATION_ID
+    WHERE dt.DATE_TIME >= NOW() - INTERVAL %s DAY
+    GROUP BY IFNULL(d.CATEGORY, '')
+"""
+
+
+def score_arrays(category_codes, quantity, days, daily_demand):
+    # Core scoring on plain arrays. category_codes index into daily_demand
+    # (units per day). Returns (expected waste units, risk score), aligned
+    # with the inputs.
+    quantity = np.asarray(quantity, dtype=np.float64)
+    days = np.asarray(days, dtype=np.float64)
+    expired = days < 0
+    days = np.maximum(days, 0.0)
+    codes = np.asarray(category_codes)
+    # Expired units cannot be handed out: none of them is served
+    sellable = np.where(expired, 0.0, quantity)
+
+    # Within each category, expiry order
+    order = np.lexsort((days, codes))
+    sorted_codes = codes[order]
+    sorted_quantity = quantity[order]
+    sorted_sellable = sellable[order]
+
+    # Sellable units ahead of each item in its category: exclusive running
+    # total, restarted at every category boundary
+    running = np.cumsum(sorted_sellable) - sorted_sellable
+    starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+    group_offset = np.repeat(running[starts], np.diff(np.r_[starts, len(order)]))
+    ahead = running - group_offset
+
+    demand = np.asarray(daily_demand, dtype=np.float64)[sorted_codes] * days[order]
+    served = np.clip(demand - ahead, 0.0, sorted_sellable)
+
+    waste = np.empty_like(quantity)
+    waste[order] = sorted_quantity - served
+    # Units expected to spoil, per day of shelf life left
+    risk = waste / (1.0 + days)
+    return waste, risk
+
+
+def score_inventory(items, demand, today=None):
+    # items: DataFrame with category, quantity, expiry_date; demand: category
+    # -> units per day. Returns a copy with days_to_expiry, expected_waste,
+    # waste_share and risk columns.
+    today = pd.Timestamp(today or date.today())
+    scored = items.copy()
+    if scored.empty:
+        for column in ('days_to_expiry', 'expected_waste', 'waste_share', 'risk'):
+            scored[column] = pd.Series(dtype=float)
+        return scored
+    codes, categories = pd.factorize(scored['category'].fillna(''))
+    rates = np.array([demand.get(category, 0.0) for category in categories], dtype=np.float64)
+    days = (pd.to_datetime(scored['expiry_date']) - today).dt.days.to_numpy()
+    waste, risk = score_arrays(codes, scored['quantity'].to_numpy(), days, rates)
+    scored['days_to_expiry'] = days
+    scored['expected_waste'] = waste
+    scored['waste_share'] = waste / scored['quantity'].to_numpy()
+    scored['risk'] = risk
+    return scored
+
+
+def load_inventory():
+    return pd.DataFrame(cached_query(INVENTORY_QUERY),
+                        columns=['food_id', 'name', 'category', 'quantity', 'expiry_date', 'source_id'])
+
+
+def load_demand(window_days=DEMAND_WINDOW_DAYS):
+    # category -> average units donated per day over the window
+    rows = cached_query(DEMAND_QUERY, (window_days,))
+    return {category: float(total) / window_days for category, total in rows}
+
+
+def _scored(window_days, source_id):
+    # The whole inventory is scored, since every source's stock competes for
+    # the same demand; source_id only narrows the result
+    scored = score_inventory(load_inventory(), load_demand(window_days))
+    if source_id is not None:
+        scored = scored[scored['source_id'] == source_id]
+    return scored
+
+
+def expiry_risk(horizon_days=None, limit=None, window_days=DEMAND_WINDOW_DAYS, source_id=None):
+    # Every in-stock dated item that has not expired yet, scored and ranked,
+    # riskiest first; optionally only items expiring within horizon_days
+    scored = _scored(window_days, source_id)
+    scored = scored[scored['days_to_expiry'] >= 0]
+    if horizon_days is not None:
+        scored = scored[scored['days_to_expiry'] <= horizon_days]
+    scored = scored.sort_values(['risk', 'days_to_expiry'], ascending=[False, True])
+    return scored.head(limit) if limit else scored
+
+
+def expired_stock(source_id=None):
+    # In-stock items already past their expiry date, oldest first
+    scored = _scored(DEMAND_WINDOW_DAYS, source_id)
+    return scored[scored['days_to_expiry'] < 0].sort_values('days_to_expiry')
+
+
+def waste_forecast(horizon_days=7, window_days=DEMAND_WINDOW_DAYS, source_id=None):
+    # Units expected to expire unallocated in the next horizon_days, as a
+    # (day x category) frame, plus the scored items behind it. Stock that has
+    # already expired is not part of it (see expired_stock()).
+    at_risk = expiry_risk(horizon_days, window_days=window_days, source_id=source_id)
+    at_risk = at_risk[at_risk['expected_waste'] > 0]
+    by_day = at_risk.pivot_table(index='expiry_date', columns='category', values='expected_waste',
+                                 aggfunc='sum', fill_value=0).sort_index()
+    return by_day, at_risk
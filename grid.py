@@ -0,0 +1,154 @@
+import os
+from dataclasses import dataclass, field
+
+import streamlit as st
+
+from cache import cached_query
+
+# Paginated listing for the management pages. Filters and sort run in MySQL,
+# and only the visible page is fetched: rows are sought by keyset (the last
+# row's sort value and id) instead of OFFSET, so page N costs the same as page
+# 1. The total comes from a separate COUNT. Both go through the query cache
+# and are dropped by the same invalidate() calls as the rest of the page.
+PAGE_SIZE = int(os.environ.get('PMS_GRID_PAGE_SIZE', '25'))
+
+
+@dataclass
+class Filter:
+    column: str
+    label: str
+    kind: str = 'equals'     # equals | prefix | choice | within_days
+    options: tuple = ()
+
+    def widget(self, key):
+        key = f"{key}_{self.column}"
+        if self.kind == 'choice':
+            return st.selectbox(self.label, ('All',) + tuple(self.options), key=key)
+        if self.kind == 'within_days':
+            return st.number_input(self.label, min_value=0, step=1, value=0, key=key,
+                                   help="0 shows everything")
+        return st.text_input(self.label, key=key)
+
+    def clause(self, value):
+        # (SQL predicate, params) or None when the filter is not set
+        if value in (None, '', 'All', 0):
+            return None
+        if self.kind == 'prefix':
+            escaped = value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            return f"{self.column} LIKE %s", (escaped + '%',)
+        if self.kind == 'within_days':
+            return f"{self.column} BETWEEN CURDATE() AND CURDATE() + INTERVAL %s DAY", (int(value),)
+        return f"{self.column} = %s", (value,)
+
+
+@dataclass
+class Sort:
+    label: str
+    expression: str          # a column, or COALESCE(column, sentinel) for nullable ones
+
+
+@dataclass
+class GridSpec:
+    key: str
+    table: str
+    id_column: str
+    columns: list            # [(column, header), ...]
+    filters: list = field(default_factory=list)
+    sorts: list = field(default_factory=list)
+
+
+def _where(spec, values, seek=None):
+    clauses, params = [], []
+    for flt in spec.filters:
+        clause = flt.clause(values.get(flt.column))
+        if clause:
+            clauses.append(clause[0])
+            params.extend(clause[1])
+    if seek:
+        clauses.append(seek[0])
+        params.extend(seek[1])
+    return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+
+def _seek(spec, sort, descending, after):
+    # Rows strictly after the last row of the previous page in (sort, id) order
+    if after is None:
+        return None
+    op = '<' if descending else '>'
+    if sort is None:
+        return f"{spec.id_column} {op} %s", (after[1],)
+    return (f"({sort.expression} {op} %s OR ({sort.expression} = %s AND {spec.id_column} {op} %s))",
+            (after[0], after[0], after[1]))
+
+
+def fetch_page(spec, values, sort=None, descending=False, after=None, page_size=PAGE_SIZE):
+    # One page of rows plus whether another page follows. after is the
+    # (sort value, id) of the last row already shown.
+    direction = 'DESC' if descending else 'ASC'
+    select = ', '.join(column for column, _ in spec.columns)
+    sort_key = sort.expression if sort else 'NULL'
+    order = f"{sort.expression} {direction}, " if sort else ''
+    where, params = _where(spec, values, _seek(spec, sort, descending, after))
+    rows = cached_query(
+        f"SELECT {select}, {sort_key}, {spec.id_column} FROM {spec.table}{where} "
+        f"ORDER BY {order}{spec.id_column} {direction} LIMIT %s",
+        tuple(params) + (page_size + 1,)
+    )
+    more = len(rows) > page_size
+    rows = rows[:page_size]
+    last = (rows[-1][-2], rows[-1][-1]) if rows else None
+    return [row[:-2] for row in rows], last, more
+
+
+def count_rows(spec, values):
+    where, params = _where(spec, values)
+    return cached_query(f"SELECT COUNT(*) FROM {spec.table}{where}", tuple(params))[0][0]
+
+
+def render_grid(spec, page_size=PAGE_SIZE):
+    # Filter/sort controls, the current page and Previous/Next. The keyset of
+    # each page start is kept in session_state so paging back needs no OFFSET.
+    controls = st.columns(len(spec.filters) + (1 if spec.sorts else 0))
+    values = {}
+    for column, flt in zip(controls, spec.filters):
+        with column:
+            values[flt.column] = flt.widget(spec.key)
+
+    sort, descending = None, False
+    if spec.sorts:
+        options = ['ID ↑', 'ID ↓'] + [f"{s.label} {arrow}" for s in spec.sorts for arrow in ('↑', '↓')]
+        with controls[-1]:
+            choice = st.selectbox("Sort by", options, key=f"{spec.key}_sort")
+        descending = choice.endswith('↓')
+        label = choice[:-2]
+        sort = next((s for s in spec.sorts if s.label == label), None)
+
+    state_key = f"grid_{spec.key}"
+    signature = (tuple(sorted(values.items())), choice if spec.sorts else None)
+    state = st.session_state.get(state_key)
+    if state is None or state['signature'] != signature:
+        # Filters or sort changed: back to the first page
+        state = {'signature': signature, 'starts': [None]}
+        st.session_state[state_key] = state
+
+    page = len(state['starts']) - 1
+    rows, last, more = fetch_page(spec, values, sort, descending, state['starts'][-1], page_size)
+    total = count_rows(spec, values)
+
+    if rows:
+        st.table([[header for _, header in spec.columns]] + rows)
+    else:
+        st.info("No rows match the current filters.")
+
+    previous_col, info_col, next_col = st.columns([1, 3, 1])
+    with info_col:
+        shown_from = page * page_size + 1 if rows else 0
+        st.caption(f"Rows {shown_from}–{page * page_size + len(rows)} of {total}")
+    with previous_col:
+        if st.button("◀ Previous", key=f"{spec.key}_prev", disabled=page == 0):
+            state['starts'].pop()
+            st.rerun()
+    with next_col:
+        if st.button("Next ▶", key=f"{spec.key}_next", disabled=not more):
+            state['starts'].append(last)
+            st.rerun()
@@ -0,0 +1,133 @@
+from dataclasses import dataclass, field
+
+import streamlit as st
+from mysql.connector import Error
+
+from accounts import DUPLICATE_KEY, PROFILES
+from cache import invalidate
+from db import get_cursor
+
+# Who is logged in. login resolves the account's profile (USERS.ENTITY_ID,
+# migration 14) once and keeps it in st.session_state, so the role dashboards
+# scope their pages to the user's own NGO, driver or food source by primary
+# key instead of asking for an ID on every rerun and looking it up again.
+#
+# Accounts registered before ENTITY_ID existed have no link; the first
+# dashboard that needs one asks once for the email and contact number on the
+# profile and links the account only if both match. A profile links to at
+# most one account per role (migration 17).
+
+# role -> columns of the profile kept in the session
+PROFILE_FIELDS = {
+    'NGO': ('NAME', 'CONTACT_NAME', 'CONTACT', 'EMAIL', 'CATEGORY_REQ'),
+    'Driver': ('NAME', 'PHONE_NUMBER', 'EMAIL', 'VEHICLE_TYPE'),
+    'Food Source': ('NAME', 'CONTACT_NAME', 'CONTACT', 'EMAIL', 'LOCALITY', 'PINCODE'),
+}
+ENTITY_LABELS = {'NGO': 'NGO ID', 'Driver': 'Driver ID', 'Food Source': 'Source ID'}
+# role -> profile column checked alongside EMAIL before an account is linked
+CONTACT_COLUMNS = {'NGO': 'CONTACT', 'Driver': 'PHONE_NUMBER', 'Food Source': 'CONTACT'}
+
+
+@dataclass
+class Identity:
+    username: str
+    role: str
+    entity_id: int = None
+    profile: dict = field(default_factory=dict)
+
+    @property
+    def linked(self):
+        return self.entity_id is not None
+
+    @property
+    def name(self):
+        return self.profile.get('NAME') or self.username
+
+
+def _profile(cursor, role, entity_id):
+    table, id_column, _ = PROFILES[role]
+    columns = PROFILE_FIELDS[role]
+    cursor.execute(f"SELECT {', '.join(columns)} FROM {table} WHERE {id_column} = %s", (entity_id,))
+    row = cursor.fetchone()
+    return dict(zip(columns, row)) if row else None
+
+
+def resolve(username, role, entity_id):
+    # The identity for a login; entity_id comes from the same USERS row the
+    # password was checked against. A link to a deleted profile counts as none.
+    if role not in PROFILES or entity_id is None:
+        return Identity(username, role)
+    with get_cursor() as cursor:
+        profile = _profile(cursor, role, entity_id)
+    if profile is None:
+        return Identity(username, role)
+    return Identity(username, role, entity_id, profile)
+
+
+def link(identity, email, contact):
+    # Attach a legacy account to the profile whose EMAIL and contact number
+    # both match. Refused if none does or another account already owns it.
+    table, id_column, _ = PROFILES[identity.role]
+    contact_column = CONTACT_COLUMNS[identity.role]
+    with get_cursor(commit=True) as cursor:
+        cursor.execute(
+            f"SELECT {id_column}, {contact_column} FROM {table} WHERE EMAIL = %s",
+            (email.strip(),)
+        )
+        row = cursor.fetchone()
+        if row is None or row[1] is None or str(row[1]).strip() != contact.strip():
+            raise ValueError(f"No {identity.role} profile has that email and contact number")
+        entity_id = row[0]
+        try:
+            cursor.execute(
+                "UPDATE USERS SET ENTITY_ID = %s WHERE USERNAME = %s AND ENTITY_ID IS NULL",
+                (entity_id, identity.username)
+            )
+        except Error as e:
+            if e.errno == DUPLICATE_KEY:
+                raise ValueError(f"{ENTITY_LABELS[identity.role]} {entity_id} belongs to another account") from None
+            raise
+        if cursor.rowcount != 1:
+            # Linked in another session meanwhile: keep what is stored
+            cursor.execute("SELECT ENTITY_ID FROM USERS WHERE USERNAME = %s", (identity.username,))
+            row = cursor.fetchone()
+            if row is None or row[0] is None:
+                raise ValueError("This account no longer exists")
+            entity_id = row[0]
+        profile = _profile(cursor, identity.role, entity_id)
+    invalidate('USERS')
+    if profile is None:
+        return Identity(identity.username, identity.role)
+    return Identity(identity.username, identity.role, entity_id, profile)
+
+
+def current_identity():
+    return st.session_state.get('identity')
+
+
+def current_entity_id():
+    # The logged-in user's profile id. For an unlinked account this renders a
+    # one-time form to link it and returns None until that is done.
+    identity = current_identity()
+    if identity is None or identity.role not in ENTITY_LABELS:
+        return None
+    if identity.linked:
+        return identity.entity_id
+
+    st.info(f"Your account is not linked to a {identity.role} profile yet. "
+            "Enter the email and contact number on the profile once to link it.")
+    with st.form(key='link_identity'):
+        email = st.text_input("Email")
+        contact = st.text_input("Contact Number")
+        submitted = st.form_submit_button("Link Account")
+    if submitted:
+        try:
+            st.session_state.identity = link(identity, email, contact)
+            if not st.session_state.identity.linked:
+                st.error("Error: this account is linked to a profile that no longer exists.")
+                return None
+            st.success(f"Linked to {st.session_state.identity.name}.")
+            return st.session_state.identity.entity_id
+        except (ValueError, Error) as e:
+            st.error(f"Error: {e}")
+    return None
@@ -0,0 +1,197 @@
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+from mysql.connector import Error
+
+from cache import invalidate
+from db import get_connection
+from inventory import mark_stale
+
+# Bulk import of food items from CSV or Parquet. The file is streamed in
+# chunks; each chunk is validated with vectorized pandas checks, and the valid
+# rows are written in one transaction as a multi-row INSERT. The per-row
+# after_food_item_insert trigger is switched off for the session
+# (@pms_bulk_import, migration 8) and the PROVIDES rows for the whole chunk are
+# written by one INSERT ... SELECT instead.
+#
+#   python importer.py items.csv [--source-id N]
+
+IMPORT_CHUNK = int(os.environ.get('PMS_IMPORT_CHUNK', '1000'))
+
+TEXT_LENGTH = 255   # FOOD_ITEM.NAME and CATEGORY are VARCHAR(255)
+
+COLUMNS = ['NAME', 'QUANTITY', 'CATEGORY', 'EXPIRY_DATE', 'SOURCE_ID']
+
+PROVIDES_FOR_CHUNK = """
+    INSERT IGNORE INTO PROVIDES (SOURCE_ID, FOOD_ID)
+    SELECT f.SOURCE_ID, f.FOOD_ID
+    FROM FOOD_ITEM f
+    LEFT JOIN PROVIDES p ON p.SOURCE_ID = f.SOURCE_ID AND p.FOOD_ID = f.FOOD_ID
+    WHERE f.FOOD_ID >= %s AND f.SOURCE_ID IS NOT NULL AND p.FOOD_ID IS NULL
+"""
+
+
+@dataclass
+class ImportReport:
+    inserted: int = 0
+    rejects: list = field(default_factory=list)   # {'row', 'reason', ...original values}
+    chunks: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def rows_per_second(self):
+        total = self.inserted + len(self.rejects)
+        return total / self.elapsed if self.elapsed else 0.0
+
+
+def read_chunks(path_or_file, kind=None, chunksize=IMPORT_CHUNK):
+    # Yield DataFrames of at most chunksize rows without loading the whole file
+    name = getattr(path_or_file, 'name', path_or_file)
+    kind = kind or ('parquet' if str(name).lower().endswith('.parquet') else 'csv')
+    if kind == 'parquet':
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError("Parquet import needs pyarrow (pip install pyarrow)")
+        for batch in pq.ParquetFile(path_or_file).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path_or_file, chunksize=chunksize, dtype=str, keep_default_na=False)
+
+
+def _known_sources(cursor, ids):
+    if not ids:
+        return set()
+    cursor.execute(
+        f"SELECT SOURCE_ID FROM FOOD_SOURCES WHERE SOURCE_ID IN ({', '.join(['%s'] * len(ids))})",
+        list(ids)
+    )
+    return {row[0] for row in cursor.fetchall()}
+
+
+def validate_chunk(chunk, cursor, first_row, source_id=None):
+    # Returns (valid rows as a DataFrame of COLUMNS, list of rejects)
+    chunk = chunk.rename(columns=lambda name: str(name).strip().upper())
+    if source_id is not None and 'SOURCE_ID' not in chunk:
+        chunk['SOURCE_ID'] = source_id
+    missing = [column for column in COLUMNS if column not in chunk]
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(missing)}")
+
+    chunk = chunk[COLUMNS].reset_index(drop=True)
+    names = chunk['NAME'].astype(str).str.strip()
+    categories = chunk['CATEGORY'].astype(str).str.strip()
+    quantity = pd.to_numeric(chunk['QUANTITY'], errors='coerce')
+    expiry = pd.to_datetime(chunk['EXPIRY_DATE'], errors='coerce')
+    sources = pd.to_numeric(chunk['SOURCE_ID'], errors='coerce')
+    if source_id is not None:
+        sources = sources.fillna(source_id)
+
+    known = _known_sources(cursor, {int(value) for value in sources.dropna().unique()})
+
+    reasons = pd.Series('', index=chunk.index)
+
+    def reject(mask, reason):
+        reasons[mask & (reasons == '')] = reason
+
+    reject(names.isin(['', 'nan', 'None']), 'missing name')
+    reject(names.str.len() > TEXT_LENGTH, f"name longer than {TEXT_LENGTH} characters")
+    reject(categories.str.len() > TEXT_LENGTH, f"category longer than {TEXT_LENGTH} characters")
+    reject(quantity.isna() | (quantity <= 0) | (quantity % 1 != 0), 'quantity must be a whole number > 0')
+    reject(expiry.isna(), 'invalid expiry date')
+    reject(expiry.dt.normalize() < pd.Timestamp.today().normalize(), 'already expired')
+    reject(sources.isna() | ~sources.isin(list(known)), 'unknown source')
+    if source_id is not None:
+        reject(sources != source_id, 'row belongs to another source')
+
+    bad = reasons != ''
+    rejects = [
+        {'row': first_row + int(index), 'reason': reasons[index], **chunk.loc[index].to_dict()}
+        for index in chunk.index[bad]
+    ]
+    valid = pd.DataFrame({
+        'NAME': names[~bad],
+        'QUANTITY': quantity[~bad].astype(int),
+        'CATEGORY': categories[~bad].where(categories[~bad] != '', None),
+        'EXPIRY_DATE': expiry[~bad].dt.date,
+        'SOURCE_ID': sources[~bad].astype(int),
+    })
+    return valid, rejects
+
+
+def insert_chunk(cursor, valid):
+    # Caller owns the transaction; returns the number of items inserted
+    if valid.empty:
+        return 0
+    rows = [
+        (name, int(quantity), category, expiry_date, int(source_id))
+        for name, quantity, category, expiry_date, source_id in valid.itertuples(index=False)
+    ]
+    cursor.execute("SET @pms_bulk_import = 1")
+    try:
+        # executemany folds this into one multi-row INSERT
+        cursor.executemany(
+            "INSERT INTO FOOD_ITEM (NAME, QUANTITY, CATEGORY, EXPIRY_DATE, SOURCE_ID) VALUES (%s, %s, %s, %s, %s)",
+            rows
+        )
+        first_id = cursor.lastrowid
+        cursor.execute(PROVIDES_FOR_CHUNK, (first_id,))
+    finally:
+        cursor.execute("SET @pms_bulk_import = NULL")
+    return len(rows)
+
+
+def import_items(path_or_file, source_id=None, kind=None, chunksize=IMPORT_CHUNK):
+    # Import a whole file; every chunk commits on its own. A chunk the
+    # database refuses is rolled back and its rows reported as rejects, and
+    # the rest of the file still goes in.
+    report = ImportReport()
+    started = time.perf_counter()
+    first_row = 1
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            for chunk in read_chunks(path_or_file, kind, chunksize):
+                valid, rejects = validate_chunk(chunk, cursor, first_row, source_id)
+                conn.commit()
+                report.rejects += rejects
+                try:
+                    conn.start_transaction()
+                    inserted = insert_chunk(cursor, valid)
+                    conn.commit()
+                    report.inserted += inserted
+                except Error as e:
+                    conn.rollback()
+                    report.rejects += [
+                        {'row': first_row + int(index), 'reason': f"chunk failed: {e.msg}", **row._asdict()}
+                        for index, row in zip(valid.index, valid.itertuples(index=False))
+                    ]
+                report.chunks += 1
+                first_row += len(chunk)
+    finally:
+        report.elapsed = time.perf_counter() - started
+        if report.inserted:
+            invalidate('FOOD_ITEM')
+            mark_stale()
+    return report
+
+
+def main(argv):
+    if not argv:
+        print("usage: python importer.py FILE [--source-id N]")
+        return 2
+    source_id = int(argv[argv.index('--source-id') + 1]) if '--source-id' in argv else None
+    report = import_items(argv[0], source_id)
+    for reject in report.rejects:
+        print(f"row {reject['row']}: {reject['reason']}")
+    print(f"inserted {report.inserted}, rejected {len(report.rejects)} in {report.elapsed:.2f}s "
+          f"({report.rows_per_second:.0f} rows/s)")
+    return 0 if not report.rejects else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
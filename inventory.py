@@ -0,0 +1,295 @@
+import os
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+from db import get_cursor
+
+# Process-wide inventory index. FOOD_ITEM is loaded once and kept per category
+# as a slot array in (expiry date, food id) order, with a max-quantity segment
+# tree over it, so "earliest-expiring item with at least N units" and "what
+# expires in the next X days" are answered in O(log n) without a database sort,
+# and item writes keep the tree current in O(log n) as well.
+#
+# The index is kept current by the write paths in this app (food.py item CRUD,
+# allocation.py) and fully reloaded every INVENTORY_REFRESH seconds to pick up
+# writes made by other processes. It is a read model only: anything that
+# reserves stock must still lock the rows in the database.
+INVENTORY_REFRESH = float(os.environ.get('PMS_INVENTORY_REFRESH', '300'))
+
+INDEX_WINDOW = 8   # smallest run of slots respread when an insert finds no gap
+
+UNDATED = date.max.toordinal()   # items without an expiry date sort last
+
+
+@dataclass
+class InventoryItem:
+    food_id: int
+    name: str
+    quantity: int
+    category: str
+    expiry_date: object = None
+    source_id: int = None
+
+    @property
+    def key(self):
+        return (self.expiry_date.toordinal() if self.expiry_date else UNDATED, self.food_id)
+
+    def as_row(self):
+        return (self.food_id, self.name, self.quantity, self.category, self.expiry_date, self.source_id)
+
+
+class _CategoryIndex:
+    # Entries sit in key order in a slot array with gaps, under a max-quantity
+    # segment tree over the slots. A removal leaves a gap (not live, quantity
+    # 0) and an insert takes the gap beside its position, so a write touches
+    # one leaf and its O(log n) ancestors. With no gap to hand, the smallest
+    # aligned window around the position with room to spare is respread, and
+    # the slot array doubles once it is three-quarters full.
+    def __init__(self, entries=()):
+        self.keys = []          # slot -> key; a gap repeats the key before it, so keys stays sorted
+        self.quantities = []    # slot -> quantity; 0 in a gap
+        self._live = []
+        self._tree = []
+        self._size = 0
+        if entries:
+            self._grow(sorted(entries))
+
+    def _grow(self, entries):
+        size = INDEX_WINDOW
+        while size < 2 * len(entries):
+            size *= 2
+        self.keys, self.quantities, self._live = [None] * size, [0] * size, [False] * size
+        self._tree, self._size = [0] * (2 * size), size
+        self._spread(0, size, entries)
+        self._refresh(0, size)
+
+    def _spread(self, lo, hi, entries):
+        # Lay entries out evenly over slots lo..hi-1, each followed by its gaps
+        bounds = [lo + j * (hi - lo) // len(entries) for j in range(len(entries))] + [hi]
+        for j, (key, quantity) in enumerate(entries):
+            first, end = bounds[j], bounds[j + 1]
+            self.keys[first:end] = [key] * (end - first)
+            self.quantities[first:end] = [quantity] + [0] * (end - first - 1)
+            self._live[first:end] = [True] + [False] * (end - first - 1)
+
+    def _refresh(self, lo, hi):
+        # Recompute the leaves for slots lo..hi-1 and every node above them
+        tree, size = self._tree, self._size
+        tree[size + lo:size + hi] = self.quantities[lo:hi]
+        lo, hi = (size + lo) // 2, (size + hi - 1) // 2
+        while lo:
+            for node in range(lo, hi + 1):
+                tree[node] = max(tree[2 * node], tree[2 * node + 1])
+            lo, hi = lo // 2, hi // 2
+
+    def _slot(self, key):
+        i = bisect_left(self.keys, key)
+        while i < len(self.keys) and self.keys[i] == key:
+            if self._live[i]:
+                return i
+            i += 1
+        return None
+
+    def insert(self, key, quantity):
+        i = bisect_left(self.keys, key)
+        for slot in (i - 1, i):
+            if 0 <= slot < self._size and not self._live[slot]:
+                self.keys[slot], self.quantities[slot], self._live[slot] = key, quantity, True
+                self._refresh(slot, slot + 1)
+                return
+        # The fill allowed in a window falls from all of it for the smallest
+        # windows to three-quarters for the whole array, which leaves each
+        # respread room for the inserts that follow
+        levels = max(1, (self._size // INDEX_WINDOW).bit_length() - 1)
+        width, depth = INDEX_WINDOW, 0
+        while width <= self._size:
+            lo = min(i, self._size - 1) // width * width
+            hi = lo + width
+            entries = [(k, q) for k, q, live in
+                       zip(self.keys[lo:hi], self.quantities[lo:hi], self._live[lo:hi]) if live]
+            if len(entries) < width - width * depth // (4 * levels):
+                insort(entries, (key, quantity))
+                self._spread(lo, hi, entries)
+                self._refresh(lo, hi)
+                return
+            width, depth = width * 2, depth + 1
+        entries = [(k, q) for k, q, live in zip(self.keys, self.quantities, self._live) if live]
+        insort(entries, (key, quantity))
+        self._grow(entries)
+
+    def remove(self, key):
+        i = self._slot(key)
+        if i is not None:
+            self.quantities[i], self._live[i] = 0, False
+            self._refresh(i, i + 1)
+
+    def set_quantity(self, key, quantity):
+        i = self._slot(key)
+        if i is not None:
+            self.quantities[i] = quantity
+            self._refresh(i, i + 1)
+
+    def first_at_least(self, start, quantity):
+        # Slot of the first entry at or after slot start holding >= quantity;
+        # quantity is at least 1, so gaps never match
+        if start >= self._size:
+            return None
+        found = self._find(1, 0, self._size, start, quantity)
+        return None if found < 0 else found
+
+    def _find(self, node, lo, hi, start, quantity):
+        if hi <= start or self._tree[node] < quantity:
+            return -1
+        if hi - lo == 1:
+            return lo
+        mid = (lo + hi) // 2
+        found = self._find(2 * node, lo, mid, start, quantity)
+        if found < 0:
+            found = self._find(2 * node + 1, mid, hi, start, quantity)
+        return found
+
+
+class InventoryIndex:
+    def __init__(self):
+        self._items = {}        # food_id -> InventoryItem
+        self._categories = {}   # category -> _CategoryIndex
+        self._lock = threading.RLock()
+        self.loaded_at = None
+
+    def load(self, rows):
+        with self._lock:
+            self._items.clear()
+            entries = {}
+            for row in rows:
+                item = InventoryItem(*row)
+                self._items[item.food_id] = item
+                entries.setdefault(item.category, []).append((item.key, item.quantity))
+            self._categories = {category: _CategoryIndex(pairs) for category, pairs in entries.items()}
+            self.loaded_at = time.monotonic()
+
+    def refresh(self):
+        with get_cursor() as cursor:
+            cursor.execute(
+                "SELECT FOOD_ID, NAME, QUANTITY, CATEGORY, EXPIRY_DATE, SOURCE_ID FROM FOOD_ITEM"
+            )
+            rows = cursor.fetchall()
+        self.load(rows)
+
+    def is_stale(self):
+        return self.loaded_at is None or time.monotonic() - self.loaded_at > INVENTORY_REFRESH
+
+    def _add(self, item):
+        self._items[item.food_id] = item
+        self._categories.setdefault(item.category, _CategoryIndex()).insert(item.key, item.quantity)
+
+    def _discard(self, food_id):
+        item = self._items.pop(food_id, None)
+        if item is not None:
+            index = self._categories.get(item.category)
+            if index is not None:
+                index.remove(item.key)
+        return item
+
+    def upsert(self, item):
+        with self._lock:
+            old = self._items.get(item.food_id)
+            if old is not None and old.category == item.category and old.key == item.key:
+                old.name, old.source_id, old.quantity = item.name, item.source_id, item.quantity
+                self._categories[item.category].set_quantity(item.key, item.quantity)
+            else:
+                self._discard(item.food_id)
+                self._add(item)
+
+    def remove(self, food_id):
+        with self._lock:
+            self._discard(food_id)
+
+    def adjust(self, food_id, delta):
+        with self._lock:
+            item = self._items.get(food_id)
+            if item is not None:
+                item.quantity = max(0, item.quantity + delta)
+                self._categories[item.category].set_quantity(item.key, item.quantity)
+
+    def earliest(self, category, min_quantity=1, today=None):
+        # Earliest-expiring unexpired item in category with >= min_quantity units
+        today = today or date.today()
+        with self._lock:
+            index = self._categories.get(category)
+            if index is None:
+                return None
+            start = bisect_left(index.keys, (today.toordinal(), 0))
+            position = index.first_at_least(start, max(1, min_quantity))
+            if position is None:
+                return None
+            return self._items[index.keys[position][1]]
+
+    def expiring_within(self, days, category=None, today=None):
+        # Items with stock expiring between today and today + days, soonest first
+        today = today or date.today()
+        low = (today.toordinal(), 0)
+        high = ((today + timedelta(days=days)).toordinal(), float('inf'))
+        with self._lock:
+            names = [category] if category is not None else list(self._categories)
+            found = []
+            for name in names:
+                index = self._categories.get(name)
+                if index is None:
+                    continue
+                lo, hi = bisect_left(index.keys, low), bisect_right(index.keys, high)
+                found += [self._items[key[1]] for key, quantity in
+                          zip(index.keys[lo:hi], index.quantities[lo:hi]) if quantity > 0]
+        found.sort(key=lambda item: item.key)
+        return found
+
+    def items(self):
+        # Every item, soonest expiry first
+        with self._lock:
+            return sorted(self._items.values(), key=lambda item: item.key)
+
+    def __len__(self):
+        return len(self._items)
+
+
+_inventory = InventoryIndex()
+_refresh_lock = threading.Lock()
+
+
+def get_inventory():
+    # Warm on first use and reload once INVENTORY_REFRESH has passed
+    if _inventory.is_stale():
+        with _refresh_lock:
+            if _inventory.is_stale():
+                _inventory.refresh()
+    return _inventory
+
+
+def _loaded():
+    # Write hooks only touch an index that has been warmed; a cold one will
+    # read the change from the database when it loads.
+    return _inventory.loaded_at is not None
+
+
+def record_item(food_id, name, quantity, category, expiry_date, source_id):
+    if _loaded():
+        _inventory.upsert(InventoryItem(food_id, name, quantity, category, expiry_date, source_id))
+
+
+def forget_item(food_id):
+    if _loaded():
+        _inventory.remove(food_id)
+
+
+def record_allocation(lines):
+    # Stock taken by allocation.py, after its transaction committed
+    if _loaded():
+        for line in lines:
+            _inventory.adjust(line.food_id, -line.quantity)
+
+
+def mark_stale():
+    # After bulk writes it is cheaper to reload once than to apply row by row
+    _inventory.loaded_at = None
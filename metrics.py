@@ -0,0 +1,99 @@
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from cache import tables_in
+from db import get_cursor
+from snapshots import get_snapshot, refresh as refresh_feed, register
+
+# System-wide KPIs for the admin console, held as a shared snapshot
+# (snapshots.py) that is recomputed every METRICS_REFRESH seconds and shortly
+# after writes to the tables it reads. Page views read it from memory, so the
+# page costs nothing however many admins are looking at it and however large
+# the tables grow. Each query is answered from an index or a summary table.
+METRICS_REFRESH = float(os.environ.get('PMS_METRICS_REFRESH', '30'))
+EXPIRING_DAYS = int(os.environ.get('PMS_METRICS_EXPIRING_DAYS', '3'))
+TREND_DAYS = 14
+
+KPI_QUERY = """
+    SELECT
+        (SELECT COUNT(*) FROM NGO) AS ngos,
+        (SELECT COUNT(*) FROM FOOD_SOURCES) AS sources,
+        (SELECT COUNT(*) FROM DRIVERS WHERE AVAILABILITY_STATUS <> 'Off-Duty') AS active_drivers,
+        (SELECT COUNT(*) FROM DRIVERS WHERE AVAILABILITY_STATUS = 'Busy') AS busy_drivers,
+        (SELECT COALESCE(SUM(STOCK), 0) FROM CATEGORY_STATS) AS stock_on_hand,
+        (SELECT COUNT(*) FROM FOOD_ITEM
+         WHERE EXPIRY_DATE BETWEEN CURDATE() AND CURDATE() + INTERVAL %s DAY AND QUANTITY > 0) AS expiring_items,
+        (SELECT COALESCE(SUM(QUANTITY), 0) FROM FOOD_ITEM
+         WHERE EXPIRY_DATE BETWEEN CURDATE() AND CURDATE() + INTERVAL %s DAY AND QUANTITY > 0) AS expiring_units,
+        (SELECT COUNT(*) FROM DONATION_REQUESTS WHERE STATUS IN ('OPEN', 'PARTIAL')) AS open_requests,
+        (SELECT COUNT(*) FROM FOOD_PICKUP WHERE DRIVER_ID IS NULL AND STATUS = 'Pending') AS unassigned_pickups
+"""
+
+DAILY_DONATIONS_QUERY = """
+    SELECT DAY, DONATIONS, QUANTITY
+    FROM DAILY_DONATION_STATS
+    WHERE DAY >= CURDATE() - INTERVAL %s DAY
+    ORDER BY DAY
+"""
+
+KPI_NAMES = ('ngos', 'sources', 'active_drivers', 'busy_drivers', 'stock_on_hand', 'expiring_items',
+             'expiring_units', 'open_requests', 'unassigned_pickups')
+
+
+@dataclass
+class MetricsSnapshot:
+    taken_at: datetime = None
+    kpis: dict = field(default_factory=dict)
+    daily: list = field(default_factory=list)    # (day, donations, quantity), oldest first
+    elapsed: float = 0.0
+    error: str = None                            # last refresh failure, if any
+
+    @property
+    def age(self):
+        return (datetime.now() - self.taken_at).total_seconds() if self.taken_at else None
+
+    @property
+    def donations_today(self):
+        today = datetime.now().date()
+        return next((int(donations) for day, donations, _ in self.daily if day == today), 0)
+
+    @property
+    def donations_per_day(self):
+        # Average over the trend window, counting days without donations
+        return sum(int(donations) for _, donations, _ in self.daily) / TREND_DAYS
+
+
+def compute_snapshot():
+    started = time.perf_counter()
+    with get_cursor() as cursor:
+        cursor.execute(KPI_QUERY, (EXPIRING_DAYS, EXPIRING_DAYS))
+        row = cursor.fetchone()
+        cursor.execute(DAILY_DONATIONS_QUERY, (TREND_DAYS - 1,))
+        daily = cursor.fetchall()
+    kpis = {name: int(value or 0) for name, value in zip(KPI_NAMES, row)}
+    return MetricsSnapshot(datetime.now(), kpis, daily, time.perf_counter() - started)
+
+
+METRICS_FEED = register(
+    'admin.metrics', compute_snapshot, tables_in(KPI_QUERY) | tables_in(DAILY_DONATIONS_QUERY), METRICS_REFRESH
+)
+
+
+def _with_error(snapshot):
+    metrics = snapshot.value if snapshot.ok else MetricsSnapshot()
+    if snapshot.error:
+        metrics = MetricsSnapshot(metrics.taken_at, metrics.kpis, metrics.daily, metrics.elapsed, snapshot.error)
+    return metrics
+
+
+def get_metrics():
+    # The latest snapshot. Only the first call in a process waits for the
+    # database; after that the snapshot worker keeps it current.
+    return _with_error(get_snapshot(METRICS_FEED))
+
+
+def refresh():
+    # Recompute now; a failure keeps the previous numbers
+    return _with_error(refresh_feed(METRICS_FEED))
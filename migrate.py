@@ -0,0 +1,1023 @@
+import sys
+
+from mysql.connector import Error
+
+from db import get_connection
+
+# Versioned schema migrations. Each migration is a list of steps that are safe
+# to re-run (IF NOT EXISTS, DROP ... IF EXISTS before CREATE, index existence
+# checks), because MySQL commits DDL implicitly and a migration interrupted
+# half way must be resumable. A version is recorded in SCHEMA_MIGRATIONS only
+# after all of its steps succeeded.
+#
+#   python migrate.py            apply pending migrations
+#   python migrate.py --status   list applied / pending versions
+#   python migrate.py --explain  check every dashboard query uses an index
+
+LOCK_NAME = 'pms_schema_migrations'
+
+
+def add_index(table, name, columns):
+    # MySQL has no CREATE INDEX IF NOT EXISTS, so look it up first
+    def step(cursor):
+        cursor.execute(
+            "SELECT 1 FROM information_schema.STATISTICS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s LIMIT 1",
+            (table, name)
+        )
+        if cursor.fetchone() is None:
+            cursor.execute(f"CREATE INDEX {name} ON {table} ({columns})")
+    step.description = f"index {name} on {table} ({columns})"
+    return step
+
+
+def add_column(table, column, definition):
+    # MySQL has no ADD COLUMN IF NOT EXISTS
+    def step(cursor):
+        cursor.execute(
+            "SELECT 1 FROM information_schema.COLUMNS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s LIMIT 1",
+            (table, column)
+        )
+        if cursor.fetchone() is None:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    step.description = f"column {column} on {table}"
+    return step
+
+
+BASE_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS FOOD_SOURCES (
+        SOURCE_ID INT AUTO_INCREMENT,
+        NAME VARCHAR(255) NOT NULL,
+        CONTACT_NAME VARCHAR(255),
+        CONTACT VARCHAR(255) NOT NULL,
+        EMAIL VARCHAR(255) UNIQUE,
+        DETAILS TEXT DEFAULT NULL,
+        LOCALITY VARCHAR(255) DEFAULT NULL,
+        PINCODE VARCHAR(10) DEFAULT NULL CHECK (PINCODE REGEXP '^[0-9]{6}$'),
+        PRIMARY KEY (SOURCE_ID)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS TYPE_OF_SOURCE (
+        SOURCE_ID INT,
+        TYPE_SOURCE VARCHAR(255),
+        PRIMARY KEY (SOURCE_ID, TYPE_SOURCE),
+        FOREIGN KEY (SOURCE_ID) REFERENCES FOOD_SOURCES(SOURCE_ID)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS FOOD_ITEM (
+        FOOD_ID INT AUTO_INCREMENT,
+        NAME VARCHAR(255) NOT NULL,
+        QUANTITY INT NOT NULL CHECK (QUANTITY > 0),
+        CATEGORY VARCHAR(255),
+        EXPIRY_DATE DATE,
+        SOURCE_ID INT,
+        PRIMARY KEY (FOOD_ID),
+        FOREIGN KEY (SOURCE_ID) REFERENCES FOOD_SOURCES(SOURCE_ID)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS PROVIDES (
+        SOURCE_ID INT,
+        FOOD_ID INT,
+        PRIMARY KEY (SOURCE_ID, FOOD_ID),
+        FOREIGN KEY (SOURCE_ID) REFERENCES FOOD_SOURCES(SOURCE_ID),
+        FOREIGN KEY (FOOD_ID) REFERENCES FOOD_ITEM(FOOD_ID)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS NGO (
+        NGO_ID INT AUTO_INCREMENT,
+        NAME VARCHAR(255) NOT NULL,
+        CONTACT_NAME VARCHAR(255),
+        CONTACT VARCHAR(255) NOT NULL,
+        EMAIL VARCHAR(255) UNIQUE,
+        CATEGORY_REQ VARCHAR(255) DEFAULT NULL,
+        ADDRESS TEXT DEFAULT NULL,
+        PRIMARY KEY (NGO_ID)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS DONATIONS (
+        DONATION_ID INT AUTO_INCREMENT,
+        SOURCE_ID INT NOT NULL,
+        NGO_ID INT NOT NULL,
+        SOURCE VARCHAR(255) NOT NULL,
+        DESTINATION VARCHAR(255) NOT NULL,
+        QUANTITY INT NOT NULL CHECK (QUANTITY > 0),
+        CATEGORY VARCHAR(255),
+        PRIMARY KEY (DONATION_ID),
+        FOREIGN KEY (SOURCE_ID) REFERENCES FOOD_SOURCES(SOURCE_ID),
+        FOREIGN KEY (NGO_ID) REFERENCES NGO(NGO_ID)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS DONATES_TO (
+        SOURCE_ID INT,
+        DONATION_ID INT,
+        DATE_TIME DATETIME,
+        PRIMARY KEY (SOURCE_ID, DONATION_ID),
+        FOREIGN KEY (SOURCE_ID) REFERENCES FOOD_SOURCES(SOURCE_ID),
+        FOREIGN KEY (DONATION_ID) REFERENCES DONATIONS(DONATION_ID)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS RECEIVES (
+        NGO_ID INT,
+        DONATION_ID INT,
+        PRIMARY KEY (NGO_ID, DONATION_ID),
+        FOREIGN KEY (NGO_ID) REFERENCES NGO(NGO_ID),
+        FOREIGN KEY (DONATION_ID) REFERENCES DONATIONS(DONATION_ID)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS FOOD_PICKUP (
+        PICKUP_ID INT AUTO_INCREMENT,
+        SOURCE_ID INT NOT NULL,
+        DRIVER_ID INT NOT NULL,
+        DRIVER_NAME VARCHAR(255),
+        CONTACT VARCHAR(255),
+        STATUS VARCHAR(50),
+        DESTINATION VARCHAR(255),
+        VEHICLE_TYPE VARCHAR(50),
+        PRIMARY KEY (PICKUP_ID),
+        FOREIGN KEY (SOURCE_ID) REFERENCES FOOD_SOURCES(SOURCE_ID)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS IMPACT (
+        IMPACT_ID INT AUTO_INCREMENT,
+        SOURCE_ID INT NOT NULL,
+        NGO_ID INT NOT NULL,
+        SOURCE VARCHAR(255) NOT NULL,
+        DESTINATION VARCHAR(255) NOT NULL,
+        FEEDBACK TEXT,
+        RATE INT CHECK (RATE BETWEEN 1 AND 5),
+        PEOPLE_HELPED INT CHECK (PEOPLE_HELPED >= 0),
+        PRIMARY KEY (IMPACT_ID),
+        FOREIGN KEY (SOURCE_ID) REFERENCES FOOD_SOURCES(SOURCE_ID),
+        FOREIGN KEY (NGO_ID) REFERENCES NGO(NGO_ID)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS SCHEDULES (
+        SOURCE_ID INT,
+        PICKUP_ID INT,
+        DATE DATE,
+        TIME TIME,
+        PRIMARY KEY (SOURCE_ID, PICKUP_ID),
+        FOREIGN KEY (SOURCE_ID) REFERENCES FOOD_SOURCES(SOURCE_ID),
+        FOREIGN KEY (PICKUP_ID) REFERENCES FOOD_PICKUP(PICKUP_ID)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS DRIVERS (
+        DRIVER_ID INT AUTO_INCREMENT PRIMARY KEY,
+        NAME VARCHAR(100) NOT NULL,
+        PHONE_NUMBER VARCHAR(15) NOT NULL,
+        EMAIL VARCHAR(100),
+        LICENSE_NUMBER VARCHAR(50) DEFAULT NULL,
+        VEHICLE_TYPE VARCHAR(50) DEFAULT NULL,
+        VEHICLE_NUMBER VARCHAR(20) DEFAULT NULL,
+        AVAILABILITY_STATUS ENUM('Available', 'Busy', 'Off-Duty') DEFAULT 'Available',
+        LAST_PICKUP_DATE DATETIME DEFAULT NULL,
+        TOTAL_COMPLETED_PICKUPS INT DEFAULT 0
+    )
+    """,
+]
+
+USERS_TABLE = [
+    """
+    CREATE TABLE IF NOT EXISTS USERS (
+        USERNAME VARCHAR(50) UNIQUE NOT NULL PRIMARY KEY,
+        PASSWORD VARCHAR(255) NOT NULL,
+        ROLE ENUM('Admin', 'NGO', 'Driver', 'Food Source') NOT NULL
+    )
+    """,
+]
+
+# Stored routines and triggers that used to be pasted by hand from food.sql and
+# ngo.sql. The connector sends each statement on its own, so no DELIMITER.
+ROUTINES = [
+    "DROP FUNCTION IF EXISTS GetFoodSourceImpact",
+    """
+    CREATE FUNCTION GetFoodSourceImpact(source_id INT)
+    RETURNS VARCHAR(1000)
+    DETERMINISTIC
+    BEGIN
+        DECLARE sourceName VARCHAR(255);
+        DECLARE totalFoodItems INT DEFAULT 0;
+        DECLARE totalNGOsSupported INT DEFAULT 0;
+        DECLARE totalQuantityDonated INT DEFAULT 0;
+        DECLARE avgRating DECIMAL(3,2) DEFAULT 0.0;
+        DECLARE totalPeopleHelped INT DEFAULT 0;
+
+        SELECT NAME INTO sourceName
+        FROM FOOD_SOURCES WHERE SOURCE_ID = source_id LIMIT 1;
+
+        SELECT COUNT(DISTINCT FOOD_ID) INTO totalFoodItems
+        FROM PROVIDES WHERE SOURCE_ID = source_id LIMIT 1;
+
+        SELECT COUNT(DISTINCT NGO_ID) INTO totalNGOsSupported
+        FROM DONATIONS WHERE SOURCE_ID = source_id LIMIT 1;
+
+        SELECT SUM(QUANTITY) INTO totalQuantityDonated
+        FROM DONATIONS WHERE SOURCE_ID = source_id LIMIT 1;
+
+        SELECT IFNULL(ROUND(AVG(RATE), 2), 0.0), IFNULL(SUM(PEOPLE_HELPED), 0)
+        INTO avgRating, totalPeopleHelped
+        FROM IMPACT WHERE SOURCE_ID = source_id LIMIT 1;
+
+        RETURN CONCAT(
+            'Food Source: ', sourceName,
+            ', Total Food Items Provided: ', totalFoodItems,
+            ', Total NGOs Supported: ', totalNGOsSupported,
+            ', Total Quantity Donated: ', totalQuantityDonated, ' kg',
+            ', Average Rating: ', avgRating,
+            ', Total People Helped: ', totalPeopleHelped
+        );
+    END
+    """,
+    "DROP TRIGGER IF EXISTS after_food_item_insert",
+    """
+    CREATE TRIGGER after_food_item_insert
+    AFTER INSERT ON FOOD_ITEM
+    FOR EACH ROW
+    BEGIN
+        IF NEW.SOURCE_ID IS NOT NULL THEN
+            INSERT INTO PROVIDES (SOURCE_ID, FOOD_ID)
+            VALUES (NEW.SOURCE_ID, NEW.FOOD_ID);
+        ELSE
+            SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Source ID is required for the donation';
+        END IF;
+    END
+    """,
+    "DROP PROCEDURE IF EXISTS GetTopDemandedCategories",
+    """
+    CREATE PROCEDURE GetTopDemandedCategories(IN p_top_n INT)
+    BEGIN
+        SELECT
+            fs.SOURCE_ID,
+            fs.NAME AS SourceName,
+            ngo.NGO_ID,
+            ngo.NAME AS NGOName,
+            ngo.CATEGORY_REQ AS RequestedCategory,
+            COUNT(ngo.CATEGORY_REQ) AS RequestCount
+        FROM NGO ngo
+        INNER JOIN DONATIONS d ON ngo.NGO_ID = d.NGO_ID
+        INNER JOIN FOOD_SOURCES fs ON fs.SOURCE_ID = d.SOURCE_ID
+        GROUP BY fs.SOURCE_ID, fs.NAME, ngo.NGO_ID, ngo.NAME, ngo.CATEGORY_REQ
+        ORDER BY RequestCount DESC
+        LIMIT p_top_n;
+    END
+    """,
+    "DROP TRIGGER IF EXISTS afterDonationInsert",
+    """
+    CREATE TRIGGER afterDonationInsert
+    AFTER INSERT ON DONATIONS
+    FOR EACH ROW
+    BEGIN
+        INSERT INTO DONATES_TO (SOURCE_ID, DONATION_ID, DATE_TIME)
+        VALUES (NEW.SOURCE_ID, NEW.DONATION_ID, NOW());
+
+        INSERT INTO RECEIVES (NGO_ID, DONATION_ID)
+        VALUES (NEW.NGO_ID, NEW.DONATION_ID);
+    END
+    """,
+    "DROP FUNCTION IF EXISTS GetDonationSource",
+    """
+    CREATE FUNCTION GetDonationSource(ngo_id INT, required_category VARCHAR(255), required_quantity INT)
+    RETURNS INT
+    DETERMINISTIC
+    BEGIN
+        DECLARE source_id INT;
+        DECLARE food_id INT;
+        DECLARE total_quantity INT;
+        DECLARE donation_quantity INT;
+
+        SELECT f.FOOD_ID, f.QUANTITY, f.EXPIRY_DATE, fs.SOURCE_ID
+        INTO food_id, total_quantity, @expiry_date, source_id
+        FROM FOOD_ITEM f
+        JOIN PROVIDES p ON f.FOOD_ID = p.FOOD_ID
+        JOIN FOOD_SOURCES fs ON p.SOURCE_ID = fs.SOURCE_ID
+        JOIN NGO n ON n.NGO_ID = ngo_id
+        WHERE f.CATEGORY = required_category
+          AND f.QUANTITY >= required_quantity
+        ORDER BY f.EXPIRY_DATE ASC
+        LIMIT 1;
+
+        IF source_id IS NOT NULL THEN
+            SET donation_quantity = LEAST(total_quantity, required_quantity);
+
+            INSERT INTO DONATIONS (SOURCE_ID, NGO_ID, SOURCE, DESTINATION, QUANTITY, CATEGORY)
+            VALUES (source_id, ngo_id,
+                    (SELECT NAME FROM FOOD_SOURCES WHERE SOURCE_ID = source_id LIMIT 1),
+                    (SELECT NAME FROM NGO WHERE NGO_ID = ngo_id LIMIT 1),
+                    donation_quantity, required_category);
+
+            RETURN source_id;
+        ELSE
+            RETURN NULL;
+        END IF;
+    END
+    """,
+]
+
+# Secondary indexes for the predicates and sort keys the dashboards and the
+# donation lookup hit on every page view. Several are covering so the
+# aggregate queries can be answered from the index alone.
+HOT_PATH_INDEXES = [
+    # GetDonationSource: category filter, earliest expiry first, enough quantity
+    add_index('FOOD_ITEM', 'idx_food_item_category_expiry', 'CATEGORY, EXPIRY_DATE, QUANTITY'),
+    # daily/monthly trends and recent activity feeds order and group by DATE_TIME
+    add_index('DONATES_TO', 'idx_donates_to_date_time', 'DATE_TIME, DONATION_ID'),
+    # per-source trend and totals, SUM(QUANTITY) without touching the rows
+    add_index('DONATIONS', 'idx_donations_source_quantity', 'SOURCE_ID, QUANTITY'),
+    # today's / upcoming pickups and the recent pickup feed
+    add_index('SCHEDULES', 'idx_schedules_date_time', 'DATE, TIME'),
+    add_index('DRIVERS', 'idx_drivers_status', 'AVAILABILITY_STATUS'),
+    # top drivers leaderboard and average completed pickups
+    add_index('DRIVERS', 'idx_drivers_completed', 'TOTAL_COMPLETED_PICKUPS, NAME'),
+    add_index('FOOD_PICKUP', 'idx_food_pickup_vehicle_type', 'VEHICLE_TYPE'),
+    # top NGOs by people helped and total people helped
+    add_index('IMPACT', 'idx_impact_ngo_people', 'NGO_ID, PEOPLE_HELPED'),
+    add_index('IMPACT', 'idx_impact_rate', 'RATE'),
+    add_index('NGO', 'idx_ngo_category_req', 'CATEGORY_REQ'),
+]
+
+def _relax_food_item_quantity_check(cursor):
+    # Allocation decrements FOOD_ITEM.QUANTITY and a fully allocated item has
+    # to stay (PROVIDES references it), so stock may now reach zero.
+    cursor.execute("""
+        SELECT cc.CONSTRAINT_NAME
+        FROM information_schema.CHECK_CONSTRAINTS cc
+        JOIN information_schema.TABLE_CONSTRAINTS tc
+          ON tc.CONSTRAINT_SCHEMA = cc.CONSTRAINT_SCHEMA AND tc.CONSTRAINT_NAME = cc.CONSTRAINT_NAME
+        WHERE tc.TABLE_SCHEMA = DATABASE() AND tc.TABLE_NAME = 'FOOD_ITEM'
+          AND tc.CONSTRAINT_TYPE = 'CHECK' AND cc.CHECK_CLAUSE LIKE '%QUANTITY%'
+    """)
+    for (name,) in cursor.fetchall():
+        cursor.execute(f"ALTER TABLE FOOD_ITEM DROP CHECK `{name}`")
+    cursor.execute("ALTER TABLE FOOD_ITEM ADD CONSTRAINT chk_food_item_quantity CHECK (QUANTITY >= 0)")
+
+
+ALLOCATION_ENGINE = [
+    _relax_food_item_quantity_check,
+    # superseded by allocation.allocate_donation()
+    "DROP FUNCTION IF EXISTS GetDonationSource",
+]
+
+# Queue for batch allocation (allocation.allocate_batch); the status index
+# serves the oldest-open-first scan.
+DONATION_REQUESTS = [
+    """
+    CREATE TABLE IF NOT EXISTS DONATION_REQUESTS (
+        REQUEST_ID INT AUTO_INCREMENT,
+        NGO_ID INT NOT NULL,
+        CATEGORY VARCHAR(255) NOT NULL,
+        QUANTITY INT NOT NULL CHECK (QUANTITY > 0),
+        ALLOCATED INT NOT NULL DEFAULT 0,
+        STATUS ENUM('OPEN', 'PARTIAL', 'FULFILLED') NOT NULL DEFAULT 'OPEN',
+        REQUESTED_AT DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        PROCESSED_AT DATETIME DEFAULT NULL,
+        PRIMARY KEY (REQUEST_ID),
+        INDEX idx_donation_requests_open (STATUS, REQUESTED_AT, REQUEST_ID),
+        FOREIGN KEY (NGO_ID) REFERENCES NGO(NGO_ID)
+    )
+    """,
+]
+
+# Filter and sort columns of the paginated management listings (grid.py)
+LISTING_INDEXES = [
+    add_index('FOOD_ITEM', 'idx_food_item_name', 'NAME'),
+    add_index('FOOD_SOURCES', 'idx_food_sources_name', 'NAME'),
+    add_index('FOOD_SOURCES', 'idx_food_sources_locality', 'LOCALITY'),
+    add_index('FOOD_SOURCES', 'idx_food_sources_pincode', 'PINCODE'),
+    add_index('NGO', 'idx_ngo_name', 'NAME'),
+    add_index('DRIVERS', 'idx_drivers_name', 'NAME'),
+    add_index('DRIVERS', 'idx_drivers_vehicle_type', 'VEHICLE_TYPE'),
+]
+
+# Bulk loaders set @pms_bulk_import for their session and write the PROVIDES
+# rows for a whole chunk themselves (importer.py), so the per-row trigger
+# steps aside for them. It still rejects items without a source.
+BULK_IMPORT_TRIGGER = [
+    "DROP TRIGGER IF EXISTS after_food_item_insert",
+    """
+    CREATE TRIGGER after_food_item_insert
+    AFTER INSERT ON FOOD_ITEM
+    FOR EACH ROW
+    BEGIN
+        IF NEW.SOURCE_ID IS NULL THEN
+            SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Source ID is required for the donation';
+        ELSEIF @pms_bulk_import IS NULL THEN
+            INSERT INTO PROVIDES (SOURCE_ID, FOOD_ID)
+            VALUES (NEW.SOURCE_ID, NEW.FOOD_ID);
+        END IF;
+    END
+    """,
+]
+
+def _rebuild_summaries(cursor):
+    # Backfill the summary tables from the fact tables already in place
+    from summary import rebuild
+    rebuild(cursor)
+
+
+# Aggregate tables for the impact and donation dashboards, kept current by
+# triggers on every write to the fact tables (summary.py reads, rebuilds and
+# verifies them). Counters only ever move by the delta of the row written, so
+# each write touches a handful of primary-key rows however large the fact
+# tables grow.
+SUMMARY_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS SOURCE_STATS (
+        SOURCE_ID INT NOT NULL,
+        ITEMS_PROVIDED INT NOT NULL DEFAULT 0,
+        DONATIONS INT NOT NULL DEFAULT 0,
+        QUANTITY_DONATED BIGINT NOT NULL DEFAULT 0,
+        NGOS_SUPPORTED INT NOT NULL DEFAULT 0,
+        RATING_SUM BIGINT NOT NULL DEFAULT 0,
+        RATING_COUNT INT NOT NULL DEFAULT 0,
+        PEOPLE_HELPED BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (SOURCE_ID),
+        INDEX idx_source_stats_quantity (QUANTITY_DONATED)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS NGO_STATS (
+        NGO_ID INT NOT NULL,
+        DONATIONS INT NOT NULL DEFAULT 0,
+        QUANTITY_RECEIVED BIGINT NOT NULL DEFAULT 0,
+        SOURCES INT NOT NULL DEFAULT 0,
+        RATING_SUM BIGINT NOT NULL DEFAULT 0,
+        RATING_COUNT INT NOT NULL DEFAULT 0,
+        PEOPLE_HELPED BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (NGO_ID),
+        INDEX idx_ngo_stats_people (PEOPLE_HELPED)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS SOURCE_NGO_STATS (
+        SOURCE_ID INT NOT NULL,
+        NGO_ID INT NOT NULL,
+        DONATIONS INT NOT NULL DEFAULT 0,
+        QUANTITY BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (SOURCE_ID, NGO_ID)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS DAILY_DONATION_STATS (
+        DAY DATE NOT NULL,
+        DONATIONS INT NOT NULL DEFAULT 0,
+        QUANTITY BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (DAY)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS CATEGORY_STATS (
+        CATEGORY VARCHAR(255) NOT NULL,
+        ITEMS INT NOT NULL DEFAULT 0,
+        STOCK BIGINT NOT NULL DEFAULT 0,
+        DONATIONS INT NOT NULL DEFAULT 0,
+        QUANTITY_DONATED BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (CATEGORY)
+    )
+    """,
+    "DROP PROCEDURE IF EXISTS summary_apply_donation",
+    """
+    CREATE PROCEDURE summary_apply_donation(IN p_source INT, IN p_ngo INT, IN p_category VARCHAR(255),
+                                            IN p_quantity INT, IN p_sign INT)
+    BEGIN
+        DECLARE pair_donations INT DEFAULT 0;
+        DECLARE new_pair INT DEFAULT 0;
+
+        INSERT INTO SOURCE_NGO_STATS (SOURCE_ID, NGO_ID, DONATIONS, QUANTITY)
+        VALUES (p_source, p_ngo, p_sign, p_sign * p_quantity)
+        ON DUPLICATE KEY UPDATE DONATIONS = DONATIONS + p_sign, QUANTITY = QUANTITY + p_sign * p_quantity;
+
+        SELECT DONATIONS INTO pair_donations
+        FROM SOURCE_NGO_STATS WHERE SOURCE_ID = p_source AND NGO_ID = p_ngo;
+
+        -- first donation between this source and NGO, or the last one removed
+        IF (p_sign > 0 AND pair_donations = 1) OR (p_sign < 0 AND pair_donations = 0) THEN
+            SET new_pair = p_sign;
+        END IF;
+        IF pair_donations = 0 THEN
+            DELETE FROM SOURCE_NGO_STATS WHERE SOURCE_ID = p_source AND NGO_ID = p_ngo;
+        END IF;
+
+        INSERT INTO SOURCE_STATS (SOURCE_ID, DONATIONS, QUANTITY_DONATED, NGOS_SUPPORTED)
+        VALUES (p_source, p_sign, p_sign * p_quantity, new_pair)
+        ON DUPLICATE KEY UPDATE DONATIONS = DONATIONS + p_sign,
+                                QUANTITY_DONATED = QUANTITY_DONATED + p_sign * p_quantity,
+                                NGOS_SUPPORTED = NGOS_SUPPORTED + new_pair;
+
+        INSERT INTO NGO_STATS (NGO_ID, DONATIONS, QUANTITY_RECEIVED, SOURCES)
+        VALUES (p_ngo, p_sign, p_sign * p_quantity, new_pair)
+        ON DUPLICATE KEY UPDATE DONATIONS = DONATIONS + p_sign,
+                                QUANTITY_RECEIVED = QUANTITY_RECEIVED + p_sign * p_quantity,
+                                SOURCES = SOURCES + new_pair;
+
+        INSERT INTO CATEGORY_STATS (CATEGORY, DONATIONS, QUANTITY_DONATED)
+        VALUES (IFNULL(p_category, ''), p_sign, p_sign * p_quantity)
+        ON DUPLICATE KEY UPDATE DONATIONS = DONATIONS + p_sign,
+                                QUANTITY_DONATED = QUANTITY_DONATED + p_sign * p_quantity;
+    END
+    """,
+    "DROP PROCEDURE IF EXISTS summary_apply_daily",
+    """
+    CREATE PROCEDURE summary_apply_daily(IN p_day DATE, IN p_donation INT, IN p_sign INT)
+    BEGIN
+        DECLARE donated INT DEFAULT 0;
+        IF p_day IS NOT NULL THEN
+            SELECT QUANTITY INTO donated FROM DONATIONS WHERE DONATION_ID = p_donation;
+            INSERT INTO DAILY_DONATION_STATS (DAY, DONATIONS, QUANTITY)
+            VALUES (p_day, p_sign, p_sign * donated)
+            ON DUPLICATE KEY UPDATE DONATIONS = DONATIONS + p_sign, QUANTITY = QUANTITY + p_sign * donated;
+        END IF;
+    END
+    """,
+    "DROP PROCEDURE IF EXISTS summary_apply_impact",
+    """
+    CREATE PROCEDURE summary_apply_impact(IN p_source INT, IN p_ngo INT, IN p_rate INT,
+                                          IN p_people INT, IN p_sign INT)
+    BEGIN
+        DECLARE rate_sum INT DEFAULT p_sign * IFNULL(p_rate, 0);
+        DECLARE rate_count INT DEFAULT p_sign * (p_rate IS NOT NULL);
+        DECLARE people INT DEFAULT p_sign * IFNULL(p_people, 0);
+
+        INSERT INTO SOURCE_STATS (SOURCE_ID, RATING_SUM, RATING_COUNT, PEOPLE_HELPED)
+        VALUES (p_source, rate_sum, rate_count, people)
+        ON DUPLICATE KEY UPDATE RATING_SUM = RATING_SUM + rate_sum,
+                                RATING_COUNT = RATING_COUNT + rate_count,
+                                PEOPLE_HELPED = PEOPLE_HELPED + people;
+
+        INSERT INTO NGO_STATS (NGO_ID, RATING_SUM, RATING_COUNT, PEOPLE_HELPED)
+        VALUES (p_ngo, rate_sum, rate_count, people)
+        ON DUPLICATE KEY UPDATE RATING_SUM = RATING_SUM + rate_sum,
+                                RATING_COUNT = RATING_COUNT + rate_count,
+                                PEOPLE_HELPED = PEOPLE_HELPED + people;
+    END
+    """,
+    "DROP PROCEDURE IF EXISTS summary_apply_stock",
+    """
+    CREATE PROCEDURE summary_apply_stock(IN p_category VARCHAR(255), IN p_items INT, IN p_quantity INT)
+    BEGIN
+        INSERT INTO CATEGORY_STATS (CATEGORY, ITEMS, STOCK)
+        VALUES (IFNULL(p_category, ''), p_items, p_quantity)
+        ON DUPLICATE KEY UPDATE ITEMS = ITEMS + p_items, STOCK = STOCK + p_quantity;
+    END
+    """,
+    "DROP TRIGGER IF EXISTS summary_donation_insert",
+    """
+    CREATE TRIGGER summary_donation_insert AFTER INSERT ON DONATIONS FOR EACH ROW
+        CALL summary_apply_donation(NEW.SOURCE_ID, NEW.NGO_ID, NEW.CATEGORY, NEW.QUANTITY, 1)
+    """,
+    "DROP TRIGGER IF EXISTS summary_donation_update",
+    """
+    CREATE TRIGGER summary_donation_update AFTER UPDATE ON DONATIONS FOR EACH ROW
+    BEGIN
+        CALL summary_apply_donation(OLD.SOURCE_ID, OLD.NGO_ID, OLD.CATEGORY, OLD.QUANTITY, -1);
+        CALL summary_apply_donation(NEW.SOURCE_ID, NEW.NGO_ID, NEW.CATEGORY, NEW.QUANTITY, 1);
+        IF NEW.QUANTITY <> OLD.QUANTITY THEN
+            UPDATE DAILY_DONATION_STATS s
+            JOIN DONATES_TO dt ON s.DAY = DATE(dt.DATE_TIME)
+            SET s.QUANTITY = s.QUANTITY + (NEW.QUANTITY - OLD.QUANTITY)
+            WHERE dt.DONATION_ID = NEW.DONATION_ID;
+        END IF;
+    END
+    """,
+    "DROP TRIGGER IF EXISTS summary_donation_delete",
+    """
+    CREATE TRIGGER summary_donation_delete AFTER DELETE ON DONATIONS FOR EACH ROW
+        CALL summary_apply_donation(OLD.SOURCE_ID, OLD.NGO_ID, OLD.CATEGORY, OLD.QUANTITY, -1)
+    """,
+    "DROP TRIGGER IF EXISTS summary_donates_to_insert",
+    """
+    CREATE TRIGGER summary_donates_to_insert AFTER INSERT ON DONATES_TO FOR EACH ROW
+        CALL summary_apply_daily(DATE(NEW.DATE_TIME), NEW.DONATION_ID, 1)
+    """,
+    "DROP TRIGGER IF EXISTS summary_donates_to_update",
+    """
+    CREATE TRIGGER summary_donates_to_update AFTER UPDATE ON DONATES_TO FOR EACH ROW
+    BEGIN
+        CALL summary_apply_daily(DATE(OLD.DATE_TIME), OLD.DONATION_ID, -1);
+        CALL summary_apply_daily(DATE(NEW.DATE_TIME), NEW.DONATION_ID, 1);
+    END
+    """,
+    "DROP TRIGGER IF EXISTS summary_donates_to_delete",
+    """
+    CREATE TRIGGER summary_donates_to_delete AFTER DELETE ON DONATES_TO FOR EACH ROW
+        CALL summary_apply_daily(DATE(OLD.DATE_TIME), OLD.DONATION_ID, -1)
+    """,
+    "DROP TRIGGER IF EXISTS summary_impact_insert",
+    """
+    CREATE TRIGGER summary_impact_insert AFTER INSERT ON IMPACT FOR EACH ROW
+        CALL summary_apply_impact(NEW.SOURCE_ID, NEW.NGO_ID, NEW.RATE, NEW.PEOPLE_HELPED, 1)
+    """,
+    "DROP TRIGGER IF EXISTS summary_impact_update",
+    """
+    CREATE TRIGGER summary_impact_update AFTER UPDATE ON IMPACT FOR EACH ROW
+    BEGIN
+        CALL summary_apply_impact(OLD.SOURCE_ID, OLD.NGO_ID, OLD.RATE, OLD.PEOPLE_HELPED, -1);
+        CALL summary_apply_impact(NEW.SOURCE_ID, NEW.NGO_ID, NEW.RATE, NEW.PEOPLE_HELPED, 1);
+    END
+    """,
+    "DROP TRIGGER IF EXISTS summary_impact_delete",
+    """
+    CREATE TRIGGER summary_impact_delete AFTER DELETE ON IMPACT FOR EACH ROW
+        CALL summary_apply_impact(OLD.SOURCE_ID, OLD.NGO_ID, OLD.RATE, OLD.PEOPLE_HELPED, -1)
+    """,
+    "DROP TRIGGER IF EXISTS summary_provides_insert",
+    """
+    CREATE TRIGGER summary_provides_insert AFTER INSERT ON PROVIDES FOR EACH ROW
+        INSERT INTO SOURCE_STATS (SOURCE_ID, ITEMS_PROVIDED) VALUES (NEW.SOURCE_ID, 1)
+        ON DUPLICATE KEY UPDATE ITEMS_PROVIDED = ITEMS_PROVIDED + 1
+    """,
+    "DROP TRIGGER IF EXISTS summary_provides_delete",
+    """
+    CREATE TRIGGER summary_provides_delete AFTER DELETE ON PROVIDES FOR EACH ROW
+        UPDATE SOURCE_STATS SET ITEMS_PROVIDED = ITEMS_PROVIDED - 1 WHERE SOURCE_ID = OLD.SOURCE_ID
+    """,
+    "DROP TRIGGER IF EXISTS summary_food_item_insert",
+    """
+    CREATE TRIGGER summary_food_item_insert AFTER INSERT ON FOOD_ITEM FOR EACH ROW
+        CALL summary_apply_stock(NEW.CATEGORY, 1, NEW.QUANTITY)
+    """,
+    "DROP TRIGGER IF EXISTS summary_food_item_update",
+    """
+    CREATE TRIGGER summary_food_item_update AFTER UPDATE ON FOOD_ITEM FOR EACH ROW
+    BEGIN
+        IF NEW.CATEGORY <=> OLD.CATEGORY THEN
+            CALL summary_apply_stock(NEW.CATEGORY, 0, NEW.QUANTITY - OLD.QUANTITY);
+        ELSE
+            CALL summary_apply_stock(OLD.CATEGORY, -1, -OLD.QUANTITY);
+            CALL summary_apply_stock(NEW.CATEGORY, 1, NEW.QUANTITY);
+        END IF;
+    END
+    """,
+    "DROP TRIGGER IF EXISTS summary_food_item_delete",
+    """
+    CREATE TRIGGER summary_food_item_delete AFTER DELETE ON FOOD_ITEM FOR EACH ROW
+        CALL summary_apply_stock(OLD.CATEGORY, -1, -OLD.QUANTITY)
+    """,
+    # One primary-key read instead of five scans of the fact tables
+    "DROP FUNCTION IF EXISTS GetFoodSourceImpact",
+    """
+    CREATE FUNCTION GetFoodSourceImpact(source_id INT)
+    RETURNS VARCHAR(1000)
+    READS SQL DATA
+    BEGIN
+        DECLARE result VARCHAR(1000);
+
+        SELECT CONCAT(
+            'Food Source: ', fs.NAME,
+            ', Total Food Items Provided: ', IFNULL(s.ITEMS_PROVIDED, 0),
+            ', Total NGOs Supported: ', IFNULL(s.NGOS_SUPPORTED, 0),
+            ', Total Quantity Donated: ', IFNULL(s.QUANTITY_DONATED, 0), ' kg',
+            ', Average Rating: ', IF(IFNULL(s.RATING_COUNT, 0) = 0, 0.0, ROUND(s.RATING_SUM / s.RATING_COUNT, 2)),
+            ', Total People Helped: ', IFNULL(s.PEOPLE_HELPED, 0)
+        ) INTO result
+        FROM FOOD_SOURCES fs
+        LEFT JOIN SOURCE_STATS s ON s.SOURCE_ID = fs.SOURCE_ID
+        WHERE fs.SOURCE_ID = source_id;
+
+        RETURN result;
+    END
+    """,
+    _rebuild_summaries,
+]
+
+# Dispatch engine (dispatch.py): pickups are requested without a driver and
+# assigned later, grouped into multi-stop runs.
+DISPATCH = [
+    "ALTER TABLE FOOD_PICKUP MODIFY DRIVER_ID INT NULL",
+    """
+    CREATE TABLE IF NOT EXISTS PICKUP_RUNS (
+        RUN_ID INT AUTO_INCREMENT,
+        DRIVER_ID INT NOT NULL,
+        RUN_DATE DATE NOT NULL,
+        STOPS INT NOT NULL,
+        CREATED_AT DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (RUN_ID),
+        INDEX idx_pickup_runs_driver_date (DRIVER_ID, RUN_DATE),
+        FOREIGN KEY (DRIVER_ID) REFERENCES DRIVERS(DRIVER_ID)
+    )
+    """,
+    add_column('FOOD_PICKUP', 'RUN_ID', 'INT NULL'),
+    add_column('FOOD_PICKUP', 'STOP_SEQ', 'INT NULL'),
+    "DROP PROCEDURE IF EXISTS schedulePickup",
+    # pending, unassigned pickups; a driver's open pickups
+    add_index('FOOD_PICKUP', 'idx_food_pickup_driver_status', 'DRIVER_ID, STATUS'),
+    add_index('SCHEDULES', 'idx_schedules_pickup', 'PICKUP_ID'),
+]
+
+# Slot reservations (slots.py): one row per interval a driver is booked for,
+# plus the version counter writers use for optimistic concurrency. Upcoming
+# pickups that already have a driver are carried over as default 30-minute slots.
+DRIVER_SLOTS = [
+    add_column('DRIVERS', 'SCHEDULE_VERSION', 'INT NOT NULL DEFAULT 0'),
+    """
+    CREATE TABLE IF NOT EXISTS DRIVER_SLOTS (
+        SLOT_ID INT AUTO_INCREMENT,
+        DRIVER_ID INT NOT NULL,
+        SLOT_DATE DATE NOT NULL,
+        START_MIN SMALLINT NOT NULL,
+        END_MIN SMALLINT NOT NULL,
+        PICKUP_ID INT NULL,
+        RUN_ID INT NULL,
+        PRIMARY KEY (SLOT_ID),
+        INDEX idx_driver_slots_driver_day (DRIVER_ID, SLOT_DATE, START_MIN),
+        INDEX idx_driver_slots_day (SLOT_DATE),
+        INDEX idx_driver_slots_pickup (PICKUP_ID),
+        FOREIGN KEY (DRIVER_ID) REFERENCES DRIVERS(DRIVER_ID),
+        CHECK (START_MIN >= 0 AND START_MIN < END_MIN AND END_MIN <= 1440)
+    )
+    """,
+    """
+    INSERT INTO DRIVER_SLOTS (DRIVER_ID, SLOT_DATE, START_MIN, END_MIN, PICKUP_ID)
+    SELECT p.DRIVER_ID, s.DATE, HOUR(s.TIME) * 60 + MINUTE(s.TIME),
+           LEAST(1440, HOUR(s.TIME) * 60 + MINUTE(s.TIME) + 30), p.PICKUP_ID
+    FROM FOOD_PICKUP p
+    JOIN SCHEDULES s ON s.SOURCE_ID = p.SOURCE_ID AND s.PICKUP_ID = p.PICKUP_ID
+    JOIN DRIVERS d ON d.DRIVER_ID = p.DRIVER_ID
+    WHERE s.DATE >= CURDATE() AND s.TIME IS NOT NULL
+      AND NOT EXISTS (SELECT 1 FROM DRIVER_SLOTS x WHERE x.PICKUP_ID = p.PICKUP_ID)
+    """,
+]
+
+# Pickup status transitions (pickup_status.py) stamp completions, and driver
+# runs are completed together.
+PICKUP_COMPLETION = [
+    add_column('FOOD_PICKUP', 'COMPLETED_AT', 'DATETIME NULL'),
+    add_index('FOOD_PICKUP', 'idx_food_pickup_run', 'RUN_ID'),
+]
+
+# Admin console snapshot (metrics.py): stock expiring in the next few days
+ADMIN_METRICS_INDEXES = [
+    add_index('FOOD_ITEM', 'idx_food_item_expiry_quantity', 'EXPIRY_DATE, QUANTITY'),
+]
+
+# Accounts (accounts.py) record the profile they log into. Accounts created
+# before this have no link.
+USER_ENTITIES = [
+    add_column('USERS', 'ENTITY_ID', 'INT NULL'),
+    add_index('USERS', 'idx_users_role_entity', 'ROLE, ENTITY_ID'),
+]
+
+# Per-NGO and per-driver home pages (ngo.py, pickups.py): each query reads
+# only the logged-in entity's index range, and these cover its columns.
+ENTITY_DASHBOARD_INDEXES = [
+    add_index('DONATIONS', 'idx_donations_ngo_source', 'NGO_ID, SOURCE_ID, QUANTITY, CATEGORY'),
+    add_index('IMPACT', 'idx_impact_ngo_rate', 'NGO_ID, RATE'),
+    add_index('DONATION_REQUESTS', 'idx_donation_requests_ngo_status', 'NGO_ID, STATUS'),
+    add_index('FOOD_PICKUP', 'idx_food_pickup_driver_status_vehicle', 'DRIVER_ID, STATUS, VEHICLE_TYPE'),
+]
+
+# Synthetic loads (synthetic.py) write the DONATES_TO and RECEIVES rows of
+# their donations themselves, with historical dates, so afterDonationInsert
+# steps aside under @pms_bulk_import like after_food_item_insert does. With
+# @pms_defer_summaries set the summary insert triggers step aside too, and the
+# loader rebuilds the summary tables once at the end.
+BULK_LOAD_TRIGGERS = [
+    "DROP TRIGGER IF EXISTS afterDonationInsert",
+    """
+    CREATE TRIGGER afterDonationInsert
+    AFTER INSERT ON DONATIONS
+    FOR EACH ROW
+    BEGIN
+        IF @pms_bulk_import IS NULL THEN
+            INSERT INTO DONATES_TO (SOURCE_ID, DONATION_ID, DATE_TIME)
+            VALUES (NEW.SOURCE_ID, NEW.DONATION_ID, NOW());
+
+            INSERT INTO RECEIVES (NGO_ID, DONATION_ID)
+            VALUES (NEW.NGO_ID, NEW.DONATION_ID);
+        END IF;
+    END
+    """,
+    "DROP TRIGGER IF EXISTS summary_donation_insert",
+    """
+    CREATE TRIGGER summary_donation_insert AFTER INSERT ON DONATIONS FOR EACH ROW
+        IF @pms_defer_summaries IS NULL THEN
+            CALL summary_apply_donation(NEW.SOURCE_ID, NEW.NGO_ID, NEW.CATEGORY, NEW.QUANTITY, 1);
+        END IF
+    """,
+    "DROP TRIGGER IF EXISTS summary_donates_to_insert",
+    """
+    CREATE TRIGGER summary_donates_to_insert AFTER INSERT ON DONATES_TO FOR EACH ROW
+        IF @pms_defer_summaries IS NULL THEN
+            CALL summary_apply_daily(DATE(NEW.DATE_TIME), NEW.DONATION_ID, 1);
+        END IF
+    """,
+    "DROP TRIGGER IF EXISTS summary_impact_insert",
+    """
+    CREATE TRIGGER summary_impact_insert AFTER INSERT ON IMPACT FOR EACH ROW
+        IF @pms_defer_summaries IS NULL THEN
+            CALL summary_apply_impact(NEW.SOURCE_ID, NEW.NGO_ID, NEW.RATE, NEW.PEOPLE_HELPED, 1);
+        END IF
+    """,
+    "DROP TRIGGER IF EXISTS summary_provides_insert",
+    """
+    CREATE TRIGGER summary_provides_insert AFTER INSERT ON PROVIDES FOR EACH ROW
+        IF @pms_defer_summaries IS NULL THEN
+            INSERT INTO SOURCE_STATS (SOURCE_ID, ITEMS_PROVIDED) VALUES (NEW.SOURCE_ID, 1)
+            ON DUPLICATE KEY UPDATE ITEMS_PROVIDED = ITEMS_PROVIDED + 1;
+        END IF
+    """,
+    "DROP TRIGGER IF EXISTS summary_food_item_insert",
+    """
+    CREATE TRIGGER summary_food_item_insert AFTER INSERT ON FOOD_ITEM FOR EACH ROW
+        IF @pms_defer_summaries IS NULL THEN
+            CALL summary_apply_stock(NEW.CATEGORY, 1, NEW.QUANTITY);
+        END IF
+    """,
+]
+
+def _unique_user_entities(cursor):
+    # A profile links to at most one account per role, so two sessions cannot
+    # link the same profile at once (identity.link). Profiles already linked
+    # to several accounts are unlinked from all of them: none of those links
+    # was proven, and each account re-links by the profile's email and contact.
+    cursor.execute(
+        "SELECT NON_UNIQUE FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'USERS' AND INDEX_NAME = 'idx_users_role_entity' LIMIT 1"
+    )
+    row = cursor.fetchone()
+    if row is not None and row[0] == 0:
+        return
+    cursor.execute("""
+        UPDATE USERS u
+        JOIN (SELECT ROLE, ENTITY_ID FROM USERS
+              WHERE ENTITY_ID IS NOT NULL
+              GROUP BY ROLE, ENTITY_ID HAVING COUNT(*) > 1) shared
+          ON shared.ROLE = u.ROLE AND shared.ENTITY_ID = u.ENTITY_ID
+        SET u.ENTITY_ID = NULL
+    """)
+    if row is not None:
+        cursor.execute("DROP INDEX idx_users_role_entity ON USERS")
+    cursor.execute("CREATE UNIQUE INDEX idx_users_role_entity ON USERS (ROLE, ENTITY_ID)")
+
+
+# Each profile is linked to at most one account; NULL (unlinked) never collides
+UNIQUE_USER_ENTITIES = [
+    _unique_user_entities,
+]
+
+MIGRATIONS = [
+    (1, 'base schema', BASE_TABLES),
+    (2, 'users table', USERS_TABLE),
+    (3, 'stored routines and triggers', ROUTINES),
+    (4, 'indexes for hot dashboard predicates', HOT_PATH_INDEXES),
+    (5, 'stock can be allocated down to zero', ALLOCATION_ENGINE),
+    (6, 'donation request queue', DONATION_REQUESTS),
+    (7, 'indexes for paginated listings', LISTING_INDEXES),
+    (8, 'bulk imports write PROVIDES per chunk', BULK_IMPORT_TRIGGER),
+    (9, 'incrementally maintained summary tables', SUMMARY_TABLES),
+    (10, 'driver dispatch and pickup runs', DISPATCH),
+    (11, 'driver slot reservations', DRIVER_SLOTS),
+    (12, 'pickup completion time', PICKUP_COMPLETION),
+    (13, 'admin metrics indexes', ADMIN_METRICS_INDEXES),
+    (14, 'accounts linked to their profile', USER_ENTITIES),
+    (15, 'per-entity dashboard indexes', ENTITY_DASHBOARD_INDEXES),
+    (16, 'bulk loads write donation links and defer summaries', BULK_LOAD_TRIGGERS),
+    (17, 'one account per linked profile', UNIQUE_USER_ENTITIES),
+]
+
+_migrated = False
+
+
+def _ensure_version_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS SCHEMA_MIGRATIONS (
+            VERSION INT PRIMARY KEY,
+            DESCRIPTION VARCHAR(255) NOT NULL,
+            APPLIED_AT DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def applied_versions(cursor):
+    _ensure_version_table(cursor)
+    cursor.execute("SELECT VERSION FROM SCHEMA_MIGRATIONS")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def _run_step(cursor, step):
+    if callable(step):
+        step(cursor)
+    else:
+        cursor.execute(step)
+
+
+def apply_migrations(verbose=False):
+    # Apply every pending migration in version order. Safe to call from several
+    # server processes at once: a named lock serialises them.
+    applied = []
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT GET_LOCK(%s, 60)", (LOCK_NAME,))
+        if cursor.fetchone()[0] != 1:
+            raise Error(msg="Timed out waiting for the schema migration lock")
+        try:
+            done = applied_versions(cursor)
+            for version, description, steps in MIGRATIONS:
+                if version in done:
+                    continue
+                if verbose:
+                    print(f"Applying {version}: {description}")
+                for step in steps:
+                    _run_step(cursor, step)
+                cursor.execute(
+                    "INSERT INTO SCHEMA_MIGRATIONS (VERSION, DESCRIPTION) VALUES (%s, %s)",
+                    (version, description)
+                )
+                conn.commit()
+                applied.append(version)
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+            cursor.fetchall()
+    return applied
+
+
+def ensure_schema():
+    # Streamlit re-executes the app script on every interaction; only check for
+    # pending migrations once per server process.
+    global _migrated
+    if not _migrated:
+        apply_migrations()
+        _migrated = True
+
+
+def dashboard_queries():
+    # Every query the dashboards run on a page view, with sample parameters
+    from ngo import NGO_HOME_QUERIES, NGO_KPI_QUERY, NGO_CHART_QUERIES
+    from pickups import DRIVER_HOME_QUERIES, DRIVER_STAT_QUERIES
+    from allocation import CANDIDATES_DATED, OPEN_REQUESTS
+    from food import MONTHLY_SOURCE_TRENDS_QUERY
+    from dispatch import PENDING_PICKUPS
+    from metrics import KPI_QUERY, DAILY_DONATIONS_QUERY
+
+    queries = [('ngo.kpis', NGO_KPI_QUERY, ())]
+    queries += [(f"ngo.{name}", sql, ()) for name, sql in NGO_CHART_QUERIES.items()]
+    queries += [(f"driver.{name}", sql, ()) for name, sql in DRIVER_STAT_QUERIES.items()]
+    queries += [(f"ngo_home.{name}", sql, (1,)) for name, sql in NGO_HOME_QUERIES.items()]
+    queries += [(f"driver_home.{name}", sql, (1,)) for name, sql in DRIVER_HOME_QUERIES.items()]
+    queries += [
+        ('donation.candidates', CANDIDATES_DATED.format(lock='FOR UPDATE'), ('Fruits', 1, '0001-01-01', '0001-01-01', 0, 20)),
+        ('donation.open_requests', OPEN_REQUESTS.format(limit=''), ()),
+        ('food.monthly_trends', MONTHLY_SOURCE_TRENDS_QUERY.format(sources=' AND d.SOURCE_ID IN (%s, %s)'),
+         ('1000-01-01', 1, 2)),
+        ('dispatch.pending', PENDING_PICKUPS.format(date_filter=' AND s.DATE = %s'), ('2024-01-01',)),
+        ('admin.kpis', KPI_QUERY, (3, 3)),
+        ('admin.daily_donations', DAILY_DONATIONS_QUERY, (13,)),
+    ]
+    return queries
+
+
+def explain_dashboard_queries():
+    # EXPLAIN each dashboard query and report the tables it reads without an
+    # index (type ALL / no key). Run against realistic volumes: on near-empty
+    # tables the optimizer may legitimately prefer a scan.
+    report = []
+    with get_connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        for name, sql, params in dashboard_queries():
+            cursor.execute("EXPLAIN " + sql, params)
+            plan = cursor.fetchall()
+            scans = [
+                row['table'] for row in plan
+                if row['table'] and not row['table'].startswith('<') and row['key'] is None
+            ]
+            keys = sorted({row['key'] for row in plan if row['key']})
+            report.append({'query': name, 'uses_index': not scans, 'keys': keys, 'scanned': scans})
+    return report
+
+
+def main(argv):
+    if '--explain' in argv:
+        report = explain_dashboard_queries()
+        for row in report:
+            status = 'ok  ' if row['uses_index'] else 'SCAN'
+            detail = ', '.join(row['keys']) if row['uses_index'] else 'full scan of ' + ', '.join(row['scanned'])
+            print(f"{status} {row['query']:<32} {detail}")
+        return 0 if all(row['uses_index'] for row in report) else 1
+
+    if '--status' in argv:
+        with get_connection() as conn:
+            done = applied_versions(conn.cursor())
+            conn.commit()
+        for version, description, _ in MIGRATIONS:
+            print(f"{'applied' if version in done else 'pending'}  {version}: {description}")
+        return 0
+
+    applied = apply_migrations(verbose=True)
+    print(f"Applied {len(applied)} migration(s)" if applied else "Schema is up to date")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
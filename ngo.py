@@ -1,37 +1,33 @@
 import streamlit as st
-import mysql.connector
 from mysql.connector import Error
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
-
-# Database connection function
-def create_connection():
-    try:
-        connection = mysql.connector.connect(
-            host='localhost',
-            user='root',    # Update with your MySQL username
-            password='thegnas58',  # Update with your MySQL password
-            database='perishable_management_system'  # Update with your MySQL database
-        )
-        return connection
-    except Error as e:
-        st.error(f"Error: {e}")
-        return None
+from dataclasses import dataclass
+from db import get_connection
+from cache import invalidate
+from snapshots import snapshot_queries
+from stats import run_queries
+from grid import Filter, GridSpec, Sort, render_grid
+from allocation import allocate_batch, allocate_donation, queue_request
+
+
+NGO_GRID = GridSpec(
+    'ngos', 'NGO', 'NGO_ID',
+    [('NGO_ID', 'NGO ID'), ('NAME', 'Name'), ('CONTACT_NAME', 'Contact Name'), ('CONTACT', 'Contact'),
+     ('EMAIL', 'Email'), ('CATEGORY_REQ', 'Category Req'), ('ADDRESS', 'Address')],
+    filters=[Filter('NAME', 'Name', 'prefix'), Filter('CATEGORY_REQ', 'Category')],
+    sorts=[Sort('Name', 'NAME')],
+)
 
 def manage_ngos(conn):
     c = conn.cursor()
     st.subheader("Manage NGOs")
 
-    # Display all NGOs with headers
+    # Display NGOs one page at a time
     st.write("### Current List of NGOs")
-    c.execute("SELECT * FROM NGO")
-    ngos = c.fetchall()
-    if ngos:
-        st.table([['NGO ID', 'Name', 'Contact Name', 'Contact', 'Email', 'Category Req', 'Address']] + ngos)
-    else:
-        st.info("No NGOs available.")
+    render_grid(NGO_GRID)
 
     # Operation options
     operation = st.radio("Select Operation", ['Update NGO', 'Delete NGO', 'View NGO Details'])
@@ -63,6 +59,7 @@ def manage_ngos(conn):
                         (updated_name, updated_contact_name, updated_contact, updated_email, updated_category_req, updated_address, ngo_id)
                     )
                     conn.commit()
+                    invalidate('NGO')
                     st.success("NGO updated successfully!")
                 except Exception as e:
                     st.error(f"Error: {e}")
@@ -78,6 +75,7 @@ def manage_ngos(conn):
             try:
                 c.execute("DELETE FROM NGO WHERE NGO_ID = %s", (ngo_id,))
                 conn.commit()
+                invalidate('NGO')
                 if c.rowcount > 0:
                     st.success("NGO deleted successfully!")
                 else:
@@ -103,13 +101,18 @@ def manage_ngos(conn):
         else:
             st.warning("NGO not found. Please enter a valid NGO ID.")
 
-def manage_impact(conn):
+def manage_impact(conn, ngo_id=None):
+    # With ngo_id (the logged-in NGO) only its own records are listed and new
+    # ones are filed under it
     c = conn.cursor()
     st.subheader("Manage Impact Records")
 
     # Display all Impact Records with headers
     st.write("### Current Review")
-    c.execute("SELECT * FROM IMPACT")
+    if ngo_id is None:
+        c.execute("SELECT * FROM IMPACT")
+    else:
+        c.execute("SELECT * FROM IMPACT WHERE NGO_ID = %s", (ngo_id,))
     impacts = c.fetchall()
     if impacts:
         st.table([['IMPACT ID', 'Source ID', 'NGO ID', 'Source', 'Destination', 'Feedback', 'Rate', 'People Helped']] + impacts)
@@ -125,7 +128,7 @@ def manage_impact(conn):
         
         # Input fields for new impact record
         source_id = st.number_input("Enter Source ID", min_value=1)
-        ngo_id = st.number_input("Enter NGO ID", min_value=1)
+        new_ngo_id = ngo_id or st.number_input("Enter NGO ID", min_value=1)
         source = st.text_input("Enter Source", max_chars=255)
         destination = st.text_input("Enter Destination", max_chars=255)
         feedback = st.text_area("Enter Feedback")
@@ -137,9 +140,10 @@ def manage_impact(conn):
                 c.execute(
                     "INSERT INTO IMPACT (SOURCE_ID, NGO_ID, SOURCE, DESTINATION, FEEDBACK, RATE, PEOPLE_HELPED) "
                     "VALUES (%s, %s, %s, %s, %s, %s, %s)",
-                    (source_id, ngo_id, source, destination, feedback, rate, people_helped)
+                    (source_id, new_ngo_id, source, destination, feedback, rate, people_helped)
                 )
                 conn.commit()
+                invalidate('IMPACT')
                 st.success("New Impact record created successfully!")
             except Exception as e:
                 st.error(f"Error: {e}")
@@ -172,6 +176,7 @@ def manage_impact(conn):
                         (updated_source_id, updated_ngo_id, updated_source, updated_destination, updated_feedback, updated_rate, updated_people_helped, impact_id)
                     )
                     conn.commit()
+                    invalidate('IMPACT')
                     st.success("Impact updated successfully!")
                 except Exception as e:
                     st.error(f"Error: {e}")
@@ -187,6 +192,7 @@ def manage_impact(conn):
             try:
                 c.execute("DELETE FROM IMPACT WHERE IMPACT_ID = %s", (impact_id,))
                 conn.commit()
+                invalidate('IMPACT')
                 if c.rowcount > 0:
                     st.success("Review deleted successfully!")
                 else:
@@ -213,175 +219,338 @@ def manage_impact(conn):
         else:
             st.warning("Review not found. Please enter a valid Review ID.")
 
+# Queries behind the NGO home tab. The scalar KPIs share one statement; the
+# chart and feed queries are independent and run concurrently.
+NGO_KPI_QUERY = """
+    SELECT
+        (SELECT COUNT(*) FROM NGO) as total_ngos,
+        (SELECT COALESCE(SUM(QUANTITY_RECEIVED), 0) FROM NGO_STATS) as total_donated,
+        (SELECT COALESCE(SUM(PEOPLE_HELPED), 0) FROM NGO_STATS) as total_helped
+"""
+
+NGO_CHART_QUERIES = {
+    'daily_trend': """
+        SELECT DAY as date, QUANTITY as total_quantity
+        FROM DAILY_DONATION_STATS
+        WHERE DONATIONS > 0
+        ORDER BY DAY
+    """,
+    'category_distribution': """
+        SELECT 
+            COALESCE(CATEGORY_REQ, 'Unspecified') as category,
+            COUNT(*) as count
+        FROM NGO
+        GROUP BY CATEGORY_REQ
+    """,
+    'ratings': """
+        SELECT RATE, COUNT(*) as count
+        FROM IMPACT
+        GROUP BY RATE
+        ORDER BY RATE
+    """,
+    'top_ngos': """
+        SELECT n.NAME, s.PEOPLE_HELPED as total_helped
+        FROM NGO_STATS s
+        JOIN NGO n ON n.NGO_ID = s.NGO_ID
+        WHERE s.RATING_COUNT > 0 OR s.PEOPLE_HELPED > 0
+        ORDER BY s.PEOPLE_HELPED DESC
+        LIMIT 5
+    """,
+    'recent_activity': """
+        SELECT 
+            n.NAME as ngo_name,
+            d.QUANTITY as quantity,
+            d.CATEGORY as category,
+            dt.DATE_TIME as date_time
+        FROM NGO n
+        JOIN DONATIONS d ON n.NGO_ID = d.NGO_ID
+        JOIN DONATES_TO dt ON d.DONATION_ID = dt.DONATION_ID
+        ORDER BY dt.DATE_TIME DESC
+        LIMIT 5
+    """,
+    'recent_feedback': """
+        SELECT 
+            n.NAME as ngo_name,
+            i.FEEDBACK as feedback,
+            i.RATE as rating
+        FROM NGO n
+        JOIN IMPACT i ON n.NGO_ID = i.NGO_ID
+        WHERE i.FEEDBACK IS NOT NULL
+        ORDER BY i.IMPACT_ID DESC
+        LIMIT 5
+    """,
+}
+
+
+@dataclass
+class NGOStatistics:
+    total_ngos: int
+    total_donated: int
+    total_people_helped: int
+    daily_trend: pd.DataFrame
+    category_distribution: pd.DataFrame
+    ratings: pd.DataFrame
+    top_ngos: pd.DataFrame
+    recent_activity: list
+    recent_feedback: list
+
+
+def fetch_ngo_statistics():
+    queries = {name: (sql, ()) for name, sql in NGO_CHART_QUERIES.items()}
+    queries['kpis'] = (NGO_KPI_QUERY, ())
+    rows = snapshot_queries(queries)
+
+    total_ngos, total_donated, total_helped = rows['kpis'][0]
+    return NGOStatistics(
+        total_ngos=int(total_ngos),
+        total_donated=int(total_donated),
+        total_people_helped=int(total_helped),
+        daily_trend=pd.DataFrame(rows['daily_trend'], columns=['date', 'total_quantity']),
+        category_distribution=pd.DataFrame(rows['category_distribution'], columns=['category', 'count']),
+        ratings=pd.DataFrame(rows['ratings'], columns=['rating', 'count']),
+        top_ngos=pd.DataFrame(rows['top_ngos'], columns=['ngo', 'people_helped']),
+        recent_activity=rows['recent_activity'],
+        recent_feedback=rows['recent_feedback'],
+    )
+
+
 #ngo dashboard 
 def display_ngo_statistics():
     st.title("NGO Impact Dashboard")
     
     try:
-        conn = create_connection()
-        
-        # Create columns for key metrics
-        col1, col2, col3 = st.columns(3)
-        
-        # Get total NGOs
-        with col1:
-            cursor = conn.cursor()
-            cursor.execute("SELECT COUNT(*) FROM NGO")
-            total_ngos = cursor.fetchone()[0]
-            
-            st.metric(
-                label="Total NGOs",
-                value=total_ngos,
-                delta=None,
-            )
-        
-        # Get total donations received
-        with col2:
-            cursor.execute("""
-                SELECT SUM(QUANTITY) 
-                FROM DONATIONS
-            """)
-            total_donations = cursor.fetchone()[0] or 0
-            
-            st.metric(
-                label="Total Food Donated (kg)",
-                value=f"{total_donations:,}",
-                delta=None,
-            )
-        
-        # Get total people helped
-        with col3:
-            cursor.execute("""
-                SELECT SUM(PEOPLE_HELPED) 
-                FROM IMPACT
-            """)
-            total_helped = cursor.fetchone()[0] or 0
-            
-            st.metric(
-                label="Total People Helped",
-                value=f"{total_helped:,}",
-                delta=None,
-            )
-        
-        # Donation Trends Over Time
-        st.subheader("Donation Trends")
-        cursor.execute("""
-            SELECT 
-                DATE(d.DATE_TIME) as date,
-                SUM(dn.QUANTITY) as total_quantity
-            FROM DONATES_TO d
-            JOIN DONATIONS dn ON d.DONATION_ID = dn.DONATION_ID
-            GROUP BY DATE(d.DATE_TIME)
-            ORDER BY DATE(d.DATE_TIME)
-        """)
-        donation_trends = pd.DataFrame(cursor.fetchall(), columns=['date', 'total_quantity'])
-        
-        if not donation_trends.empty:
-            fig = px.line(donation_trends, x='date', y='total_quantity',
-                         title='Daily Donation Quantities',
-                         labels={'date': 'Date', 'total_quantity': 'Total Quantity (kg)'})
+        stats = fetch_ngo_statistics()
+    except Error as err:
+        st.error(f"Database Error: {err}")
+        return
+
+    # Create columns for key metrics
+    col1, col2, col3 = st.columns(3)
+
+    with col1:
+        st.metric(
+            label="Total NGOs",
+            value=stats.total_ngos,
+            delta=None,
+        )
+
+    with col2:
+        st.metric(
+            label="Total Food Donated (kg)",
+            value=f"{stats.total_donated:,}",
+            delta=None,
+        )
+
+    with col3:
+        st.metric(
+            label="Total People Helped",
+            value=f"{stats.total_people_helped:,}",
+            delta=None,
+        )
+
+    # Donation Trends Over Time
+    st.subheader("Donation Trends")
+    if not stats.daily_trend.empty:
+        fig = px.line(stats.daily_trend, x='date', y='total_quantity',
+                     title='Daily Donation Quantities',
+                     labels={'date': 'Date', 'total_quantity': 'Total Quantity (kg)'})
+        st.plotly_chart(fig)
+
+    # NGO Category Distribution
+    st.subheader("NGO Category Distribution")
+    if not stats.category_distribution.empty:
+        fig = px.pie(stats.category_distribution, values='count', names='category',
+                    title='NGO Distribution by Category')
+        st.plotly_chart(fig)
+
+    # Impact Ratings
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.subheader("Impact Ratings Distribution")
+        if not stats.ratings.empty:
+            fig = px.bar(stats.ratings, x='rating', y='count',
+                        title='Distribution of Impact Ratings',
+                        labels={'rating': 'Rating', 'count': 'Number of Ratings'})
             st.plotly_chart(fig)
-        
-        # NGO Category Distribution
-        st.subheader("NGO Category Distribution")
-        cursor.execute("""
-            SELECT 
-                COALESCE(CATEGORY_REQ, 'Unspecified') as category,
-                COUNT(*) as count
-            FROM NGO
-            GROUP BY CATEGORY_REQ
-        """)
-        category_dist = pd.DataFrame(cursor.fetchall(), columns=['category', 'count'])
-        
-        if not category_dist.empty:
-            fig = px.pie(category_dist, values='count', names='category',
-                        title='NGO Distribution by Category')
+
+    with col2:
+        st.subheader("Top NGOs by People Helped")
+        if not stats.top_ngos.empty:
+            fig = px.bar(stats.top_ngos, x='ngo', y='people_helped',
+                        title='Top NGOs by Impact',
+                        labels={'ngo': 'NGO Name', 'people_helped': 'People Helped'})
+            fig.update_layout(xaxis_tickangle=-45)
             st.plotly_chart(fig)
-        
-        # Impact Ratings
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            st.subheader("Impact Ratings Distribution")
-            cursor.execute("""
-                SELECT RATE, COUNT(*) as count
-                FROM IMPACT
-                GROUP BY RATE
-                ORDER BY RATE
-            """)
-            ratings = pd.DataFrame(cursor.fetchall(), columns=['rating', 'count'])
-            
-            if not ratings.empty:
-                fig = px.bar(ratings, x='rating', y='count',
-                            title='Distribution of Impact Ratings',
-                            labels={'rating': 'Rating', 'count': 'Number of Ratings'})
-                st.plotly_chart(fig)
-        
-        with col2:
-            st.subheader("Top NGOs by People Helped")
-            cursor.execute("""
-                SELECT 
-                    n.NAME,
-                    SUM(i.PEOPLE_HELPED) as total_helped
-                FROM NGO n
-                JOIN IMPACT i ON n.NGO_ID = i.NGO_ID
-                GROUP BY n.NGO_ID, n.NAME
-                ORDER BY total_helped DESC
-                LIMIT 5
-            """)
-            top_ngos = pd.DataFrame(cursor.fetchall(), columns=['ngo', 'people_helped'])
-            
-            if not top_ngos.empty:
-                fig = px.bar(top_ngos, x='ngo', y='people_helped',
-                            title='Top NGOs by Impact',
-                            labels={'ngo': 'NGO Name', 'people_helped': 'People Helped'})
-                fig.update_layout(xaxis_tickangle=-45)
-                st.plotly_chart(fig)
-        
-        # Recent Activity Feed
-        st.subheader("Recent NGO Activity")
-        cursor.execute("""
-            SELECT 
-                n.NAME as ngo_name,
-                d.QUANTITY as quantity,
-                d.CATEGORY as category,
-                dt.DATE_TIME as date_time
-            FROM NGO n
-            JOIN DONATIONS d ON n.NGO_ID = d.NGO_ID
-            JOIN DONATES_TO dt ON d.DONATION_ID = dt.DONATION_ID
-            ORDER BY dt.DATE_TIME DESC
-            LIMIT 5
-        """)
-        recent_activities = cursor.fetchall()
-        
-        for activity in recent_activities:
-            with st.expander(f"{activity[0]} - {activity[3].strftime('%Y-%m-%d %H:%M')}"):
-                st.write(f"Received {activity[1]}kg of {activity[2]}")
-        
-        # Feedback Word Cloud (if you want to add this feature, you'll need to install wordcloud)
-        st.subheader("Recent Feedback")
-        cursor.execute("""
-            SELECT 
-                n.NAME as ngo_name,
-                i.FEEDBACK as feedback,
-                i.RATE as rating
-            FROM NGO n
-            JOIN IMPACT i ON n.NGO_ID = i.NGO_ID
-            WHERE i.FEEDBACK IS NOT NULL
-            ORDER BY i.IMPACT_ID DESC
-            LIMIT 5
-        """)
-        feedbacks = cursor.fetchall()
-        
-        for feedback in feedbacks:
-            with st.expander(f"{feedback[0]} - Rating: {'⭐' * feedback[2]}"):
-                st.write(feedback[1])
-                
-    except mysql.connector.Error as err:
+
+    # Recent Activity Feed
+    st.subheader("Recent NGO Activity")
+    for activity in stats.recent_activity:
+        with st.expander(f"{activity[0]} - {activity[3].strftime('%Y-%m-%d %H:%M')}"):
+            st.write(f"Received {activity[1]}kg of {activity[2]}")
+
+    # Feedback Word Cloud (if you want to add this feature, you'll need to install wordcloud)
+    st.subheader("Recent Feedback")
+    for feedback in stats.recent_feedback:
+        with st.expander(f"{feedback[0]} - Rating: {'⭐' * feedback[2]}"):
+            st.write(feedback[1])
+
+# Queries behind a logged-in NGO's own home tab. Every one is keyed by NGO_ID
+# and answered from NGO_STATS or a per-NGO index range (migration 15), so the
+# page costs in proportion to that NGO's own history. They go through the
+# query cache rather than the shared snapshots: there is one set per NGO and
+# only the NGOs that are looking need them.
+NGO_HOME_QUERIES = {
+    'kpis': """
+        SELECT COALESCE(s.DONATIONS, 0), COALESCE(s.QUANTITY_RECEIVED, 0), COALESCE(s.SOURCES, 0),
+               COALESCE(s.PEOPLE_HELPED, 0), s.RATING_SUM / NULLIF(s.RATING_COUNT, 0),
+               (SELECT COUNT(*) FROM DONATION_REQUESTS r
+                WHERE r.NGO_ID = n.NGO_ID AND r.STATUS IN ('OPEN', 'PARTIAL'))
+        FROM NGO n
+        LEFT JOIN NGO_STATS s ON s.NGO_ID = n.NGO_ID
+        WHERE n.NGO_ID = %s
+    """,
+    'daily_trend': """
+        SELECT DATE(dt.DATE_TIME) AS day, SUM(d.QUANTITY)
+        FROM DONATIONS d
+        JOIN DONATES_TO dt ON dt.SOURCE_ID = d.SOURCE_ID AND dt.DONATION_ID = d.DONATION_ID
+        WHERE d.NGO_ID = %s
+        GROUP BY day
+        ORDER BY day
+    """,
+    'by_category': """
+        SELECT COALESCE(CATEGORY, 'Unspecified'), SUM(QUANTITY)
+        FROM DONATIONS
+        WHERE NGO_ID = %s
+        GROUP BY CATEGORY
+    """,
+    'ratings': """
+        SELECT RATE, COUNT(*)
+        FROM IMPACT
+        WHERE NGO_ID = %s
+        GROUP BY RATE
+        ORDER BY RATE
+    """,
+    'top_sources': """
+        SELECT f.NAME, t.quantity
+        FROM (SELECT SOURCE_ID, SUM(QUANTITY) AS quantity
+              FROM DONATIONS WHERE NGO_ID = %s
+              GROUP BY SOURCE_ID ORDER BY quantity DESC LIMIT 5) t
+        JOIN FOOD_SOURCES f ON f.SOURCE_ID = t.SOURCE_ID
+        ORDER BY t.quantity DESC
+    """,
+    'recent_activity': """
+        SELECT f.NAME, d.QUANTITY, d.CATEGORY, dt.DATE_TIME
+        FROM DONATIONS d
+        JOIN DONATES_TO dt ON dt.SOURCE_ID = d.SOURCE_ID AND dt.DONATION_ID = d.DONATION_ID
+        JOIN FOOD_SOURCES f ON f.SOURCE_ID = d.SOURCE_ID
+        WHERE d.NGO_ID = %s
+        ORDER BY dt.DATE_TIME DESC
+        LIMIT 5
+    """,
+    'recent_feedback': """
+        SELECT SOURCE, FEEDBACK, RATE
+        FROM IMPACT
+        WHERE NGO_ID = %s AND FEEDBACK IS NOT NULL
+        ORDER BY IMPACT_ID DESC
+        LIMIT 5
+    """,
+}
+
+
+@dataclass
+class NGOHome:
+    donations: int
+    quantity_received: int
+    sources: int
+    people_helped: int
+    average_rating: float
+    open_requests: int
+    daily_trend: pd.DataFrame
+    by_category: pd.DataFrame
+    ratings: pd.DataFrame
+    top_sources: pd.DataFrame
+    recent_activity: list
+    recent_feedback: list
+
+
+def fetch_ngo_home(ngo_id):
+    rows = run_queries({name: (sql, (ngo_id,)) for name, sql in NGO_HOME_QUERIES.items()})
+    if not rows['kpis']:
+        return None
+    donations, quantity, sources, helped, rating, open_requests = rows['kpis'][0]
+    return NGOHome(
+        donations=int(donations),
+        quantity_received=int(quantity),
+        sources=int(sources),
+        people_helped=int(helped),
+        average_rating=float(rating) if rating is not None else None,
+        open_requests=int(open_requests),
+        daily_trend=pd.DataFrame(rows['daily_trend'], columns=['date', 'quantity']),
+        by_category=pd.DataFrame(rows['by_category'], columns=['category', 'quantity']),
+        ratings=pd.DataFrame(rows['ratings'], columns=['rating', 'count']),
+        top_sources=pd.DataFrame(rows['top_sources'], columns=['source', 'quantity']),
+        recent_activity=rows['recent_activity'],
+        recent_feedback=rows['recent_feedback'],
+    )
+
+
+def display_ngo_home(ngo_id):
+    try:
+        home = fetch_ngo_home(ngo_id)
+    except Error as err:
         st.error(f"Database Error: {err}")
-    finally:
-        if 'conn' in locals():
-            conn.close()
+        return
+    if home is None:
+        st.warning("NGO not found.")
+        return
+
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric(label="Donations Received", value=f"{home.donations:,}")
+    with col2:
+        st.metric(label="Food Received (kg)", value=f"{home.quantity_received:,}")
+    with col3:
+        st.metric(label="People Helped", value=f"{home.people_helped:,}")
+    with col4:
+        st.metric(label="Average Rating", value=f"{home.average_rating:.1f}" if home.average_rating else "N/A")
+    st.caption(f"{home.sources} food sources have donated to you; {home.open_requests} of your requests are open.")
+
+    st.subheader("Donations Received")
+    if not home.daily_trend.empty:
+        fig = px.line(home.daily_trend, x='date', y='quantity',
+                      labels={'date': 'Date', 'quantity': 'Quantity (kg)'})
+        st.plotly_chart(fig)
+    else:
+        st.info("No donations received yet.")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.subheader("By Category")
+        if not home.by_category.empty:
+            st.plotly_chart(px.pie(home.by_category, values='quantity', names='category'))
+    with col2:
+        st.subheader("Top Donors")
+        if not home.top_sources.empty:
+            fig = px.bar(home.top_sources, x='source', y='quantity',
+                         labels={'source': 'Food Source', 'quantity': 'Quantity (kg)'})
+            fig.update_layout(xaxis_tickangle=-45)
+            st.plotly_chart(fig)
+
+    st.subheader("Your Ratings")
+    if not home.ratings.empty:
+        st.plotly_chart(px.bar(home.ratings, x='rating', y='count',
+                               labels={'rating': 'Rating', 'count': 'Number of Ratings'}))
+
+    st.subheader("Recent Donations")
+    for source, quantity, category, date_time in home.recent_activity:
+        with st.expander(f"{source} - {date_time.strftime('%Y-%m-%d %H:%M')}"):
+            st.write(f"Received {quantity}kg of {category}")
+
+    st.subheader("Recent Feedback")
+    for source, feedback, rating in home.recent_feedback:
+        with st.expander(f"{source} - Rating: {'⭐' * (rating or 0)}"):
+            st.write(feedback)
 
 # Function to render NGO details card
 def display_ngo_card(ngo_data):
@@ -410,36 +579,56 @@ def display_ngo_card(ngo_data):
                 st.write(f"**Address:** {ngo_data['address']}")
 
 def handle_donation_request(ngo_id, required_category, required_quantity):
-    conn = create_connection()
-    cursor = conn.cursor()
-
     try:
-        # Call the backend function to get source
-        cursor.execute("SELECT GetDonationSource(%s, %s, %s);", (ngo_id, required_category, required_quantity))
-        source_id = cursor.fetchone()[0]  # Get the source_id from the result
+        allocation = allocate_donation(ngo_id, required_category, required_quantity)
 
-        if source_id is None:
+        if not allocation.fulfilled:
             # No source available
             st.error("No source available for the requested category and quantity.")
         else:
             # Source confirmed
-            st.success(f"Donation source confirmed. Source ID: {source_id}. Donation processed successfully.")
+            sources = ", ".join(str(source_id) for source_id in allocation.source_ids)
+            st.success(f"Donation source confirmed. Source ID: {sources}. Donation processed successfully.")
+            if len(allocation.lines) > 1:
+                st.table(pd.DataFrame(
+                    [(line.food_id, line.source_id, line.quantity, line.expiry_date) for line in allocation.lines],
+                    columns=['Food ID', 'Source ID', 'Quantity', 'Expiry Date']
+                ))
 
     except Exception as e:
         st.error(f"Error: {e}")
 
-    finally:
-        cursor.close()
-        conn.close()
+def handle_queue_request(ngo_id, required_category, required_quantity):
+    # Queue the request for the next batch run instead of allocating now
+    if required_quantity > 0 and required_category:
+        try:
+            request_id = queue_request(ngo_id, required_category, required_quantity)
+            st.success(f"Request {request_id} queued.")
+        except Error as e:
+            st.error(f"Error: {e}")
+    else:
+        st.error("Please enter a category and a quantity greater than 0.")
+
+def run_batch_allocation():
+    # End-of-day mode: allocate every queued request in one transaction
+    st.subheader("Queued Requests")
+    strategy = st.radio("Matching", ["Earliest expiry first", "Least cost (expiry + locality)"], horizontal=True)
+    if st.button("Allocate Queued Requests"):
+        try:
+            report = allocate_batch('min_cost' if strategy.startswith("Least") else 'expiry')
+            summary = report.summary()
+            if not summary['requests']:
+                st.info("No queued requests.")
+                return
+            st.success(f"{summary['fulfilled']} fulfilled, {summary['partial']} partial, "
+                       f"{summary['unfilled']} unfilled ({summary['units']} units in {summary['seconds']}s)")
+            st.dataframe(pd.DataFrame(report.rows()), hide_index=True)
+        except Error as e:
+            st.error(f"Error: {e}")
 
 def main():
-    # Establish a connection to the database
-    conn = create_connection()
-    if not conn:
-        return
-
     st.sidebar.title("Navigation")
-    app_mode = st.sidebar.radio("Choose a tab", ["Home", "Manage NGOs","Feedback","Donation "])
+    app_mode = st.sidebar.radio("Choose a tab", ["Home", "Manage NGOs","Feedback","Donation"])
 
     if app_mode == "Home":
         st.subheader("Welcome to the Perishable Management System")
@@ -447,10 +636,12 @@ def main():
         display_ngo_statistics()
 
     elif app_mode == "Manage NGOs":
-        manage_ngos(conn)
+        with get_connection() as conn:
+            manage_ngos(conn)
 
     elif app_mode == "Feedback":
-        manage_impact(conn)
+        with get_connection() as conn:
+            manage_impact(conn)
 
     elif app_mode == "Donation":
             # Input fields for the user
@@ -476,8 +667,11 @@ def main():
                 handle_donation_request(ngo_id, required_category, required_quantity)
             else:
                 st.error("Please enter a valid quantity greater than 0.")
-    # Close the database connection
-    conn.close()
+
+        if st.button("Queue Request"):
+            handle_queue_request(ngo_id, required_category, required_quantity)
+
+        run_batch_allocation()
 
 # Run the Streamlit app
 if __name__ == "__main__":
@@ -0,0 +1,213 @@
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime
+
+from mysql.connector import Error
+
+from cache import invalidate
+from db import bulk_update, get_connection
+from slots import release_pickup, sync_availability
+
+# Pickup status changes. Every change goes through transition(), which moves
+# FOOD_PICKUP.STATUS along TRANSITIONS and, in the same transaction, keeps the
+# driver counters behind the leaderboards current: a pickup reaching Completed
+# adds one to its driver's TOTAL_COMPLETED_PICKUPS and advances
+# LAST_PICKUP_DATE. Cancelling a pickup frees the driver slot it held.
+#
+# reconcile() recomputes the counters from FOOD_PICKUP in one statement, for
+# rows written around this module (seed data, manual SQL).
+#
+#   python pickup_status.py --verify      list drivers whose counters drifted
+#   python pickup_status.py --reconcile   recompute them
+
+TRANSITIONS = {
+    'Pending': ('In Transit', 'Completed', 'Cancelled'),
+    'In Transit': ('Completed', 'Cancelled'),
+    'Completed': (),
+    'Cancelled': (),
+}
+STATUSES = tuple(TRANSITIONS)
+
+MAX_RETRIES = 3
+RETRY_ERRNOS = (1205, 1213)
+
+# Completed pickups per driver, from the facts. Pickups completed before
+# COMPLETED_AT existed fall back to their scheduled time.
+COMPLETED_BY_DRIVER = """
+    SELECT p.DRIVER_ID, COUNT(*) AS completed,
+           MAX(COALESCE(p.COMPLETED_AT, TIMESTAMP(s.DATE, s.TIME))) AS last_at
+    FROM FOOD_PICKUP p
+    LEFT JOIN SCHEDULES s ON s.SOURCE_ID = p.SOURCE_ID AND s.PICKUP_ID = p.PICKUP_ID
+    WHERE p.STATUS = 'Completed' AND p.DRIVER_ID IS NOT NULL
+    GROUP BY p.DRIVER_ID
+"""
+
+# Drivers with no completion date on record keep the one they have
+DRIVER_COUNTERS = f"""
+    SELECT d.DRIVER_ID, d.NAME,
+           IFNULL(d.TOTAL_COMPLETED_PICKUPS, 0), d.LAST_PICKUP_DATE,
+           COALESCE(c.completed, 0), COALESCE(c.last_at, d.LAST_PICKUP_DATE)
+    FROM DRIVERS d
+    LEFT JOIN ({COMPLETED_BY_DRIVER}) c ON c.DRIVER_ID = d.DRIVER_ID
+"""
+
+RECONCILE = f"""
+    UPDATE DRIVERS d
+    LEFT JOIN ({COMPLETED_BY_DRIVER}) c ON c.DRIVER_ID = d.DRIVER_ID
+    SET d.TOTAL_COMPLETED_PICKUPS = COALESCE(c.completed, 0),
+        d.LAST_PICKUP_DATE = COALESCE(c.last_at, d.LAST_PICKUP_DATE)
+    WHERE NOT (d.TOTAL_COMPLETED_PICKUPS <=> COALESCE(c.completed, 0))
+       OR NOT (d.LAST_PICKUP_DATE <=> COALESCE(c.last_at, d.LAST_PICKUP_DATE))
+"""
+
+
+@dataclass
+class PickupTransition:
+    pickup_id: int
+    old_status: str
+    new_status: str
+    driver_id: int = None
+    at: object = None
+
+
+def _placeholders(values):
+    return ', '.join(['%s'] * len(values))
+
+
+def _apply(cursor, pickup_ids, status, at):
+    cursor.execute(
+        f"SELECT PICKUP_ID, STATUS, DRIVER_ID FROM FOOD_PICKUP WHERE PICKUP_ID IN ({_placeholders(pickup_ids)}) "
+        "ORDER BY PICKUP_ID FOR UPDATE",
+        pickup_ids
+    )
+    found = {row[0]: row for row in cursor.fetchall()}
+    problems = []
+    for pickup_id in pickup_ids:
+        row = found.get(pickup_id)
+        if row is None:
+            problems.append(f"pickup {pickup_id} does not exist")
+        elif status not in TRANSITIONS.get(row[1] or 'Pending', ()):
+            problems.append(f"pickup {pickup_id} cannot go from {row[1]} to {status}")
+        elif status == 'Completed' and row[2] is None:
+            problems.append(f"pickup {pickup_id} has no driver to complete it")
+    if problems:
+        raise ValueError('; '.join(problems))
+
+    cursor.execute(
+        f"UPDATE FOOD_PICKUP SET STATUS = %s, COMPLETED_AT = IF(%s = 'Completed', %s, COMPLETED_AT) "
+        f"WHERE PICKUP_ID IN ({_placeholders(pickup_ids)})",
+        (status, status, at) + tuple(pickup_ids)
+    )
+
+    if status == 'Completed':
+        per_driver = {}
+        for pickup_id in pickup_ids:
+            driver_id = found[pickup_id][2]
+            per_driver[driver_id] = per_driver.get(driver_id, 0) + 1
+        bulk_update(cursor, """
+            UPDATE DRIVERS d JOIN ({values}) t ON t.DRIVER_ID = d.DRIVER_ID
+            SET d.TOTAL_COMPLETED_PICKUPS = IFNULL(d.TOTAL_COMPLETED_PICKUPS, 0) + t.COMPLETED,
+                d.LAST_PICKUP_DATE = GREATEST(IFNULL(d.LAST_PICKUP_DATE, t.AT), t.AT)
+        """, ('DRIVER_ID', 'COMPLETED', 'AT'), [(driver_id, count, at) for driver_id, count in sorted(per_driver.items())])
+
+    released = []
+    if status == 'Cancelled':
+        for pickup_id in pickup_ids:
+            released += release_pickup(cursor, pickup_id)
+
+    transitions = [
+        PickupTransition(pickup_id, found[pickup_id][1], status, found[pickup_id][2], at)
+        for pickup_id in pickup_ids
+    ]
+    return transitions, released
+
+
+def transition_many(pickup_ids, status, at=None):
+    # Move several pickups (e.g. a whole run) to status in one transaction.
+    # All or nothing: if any of them cannot make the move, ValueError is raised
+    # and nothing changes.
+    if status not in TRANSITIONS:
+        raise ValueError(f"unknown pickup status {status!r}")
+    pickup_ids = sorted(set(pickup_ids))
+    if not pickup_ids:
+        return []
+    at = at or datetime.now().replace(microsecond=0)
+    for attempt in range(MAX_RETRIES):
+        try:
+            with get_connection() as conn:
+                conn.start_transaction(isolation_level='READ COMMITTED')
+                cursor = conn.cursor()
+                try:
+                    transitions, released = _apply(cursor, pickup_ids, status, at)
+                except (ValueError, Error):
+                    conn.rollback()
+                    raise
+                conn.commit()
+            break
+        except Error as e:
+            if e.errno not in RETRY_ERRNOS or attempt == MAX_RETRIES - 1:
+                raise
+            time.sleep(0.05 * (attempt + 1))
+
+    invalidate('FOOD_PICKUP', 'DRIVERS', *(('DRIVER_SLOTS',) if released else ()))
+    if released:
+        sync_availability(set(released))
+    return transitions
+
+
+def transition(pickup_id, status, at=None):
+    return transition_many([pickup_id], status, at)[0]
+
+
+def complete_run(run_id, at=None):
+    # Every open stop of a dispatch run, completed at once
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT PICKUP_ID FROM FOOD_PICKUP WHERE RUN_ID = %s AND STATUS IN ('Pending', 'In Transit')",
+            (run_id,)
+        )
+        pickup_ids = [row[0] for row in cursor.fetchall()]
+        conn.commit()
+    return transition_many(pickup_ids, 'Completed', at)
+
+
+def drift(cursor):
+    # (driver_id, name, stored (count, last), expected (count, last)) for every
+    # driver whose counters disagree with FOOD_PICKUP
+    cursor.execute(DRIVER_COUNTERS)
+    return [
+        (driver_id, name, (stored, stored_at), (expected, expected_at))
+        for driver_id, name, stored, stored_at, expected, expected_at in cursor.fetchall()
+        if stored != expected or stored_at != expected_at
+    ]
+
+
+def reconcile(cursor):
+    # Recompute every driver's counters; the caller commits. Returns the
+    # number of drivers corrected.
+    cursor.execute(RECONCILE)
+    return cursor.rowcount
+
+
+def main(argv):
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        if '--reconcile' in argv:
+            fixed = reconcile(cursor)
+            conn.commit()
+            invalidate('DRIVERS')
+            print(f"Corrected the counters of {fixed} driver(s)")
+            return 0
+
+        rows = drift(cursor)
+        conn.commit()
+    print(f"{'ok   ' if not rows else 'DRIFT'} DRIVERS" + (f" ({len(rows)} drivers)" if rows else ''))
+    for driver_id, name, stored, expected in rows[:10]:
+        print(f"      {driver_id} {name}: stored {stored}, expected {expected}")
+    return 0 if not rows else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
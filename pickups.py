@@ -2,38 +2,38 @@
 from mysql.connector import Error
 import streamlit as st
 import pandas as pd
-import mysql.connector
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
-
-# Database connection function
-def create_connection():
-    try:
-        connection = mysql.connector.connect(
-            host='localhost',
-            user='root',    # Update with your MySQL username
-            password='thegnas58',  # Update with your MySQL password
-            database='perishable_management_system'  # Update with your MySQL database
-        )
-        return connection
-    except Error as e:
-        st.error(f"Error: {e}")
-        return None
+from db import get_connection
+from cache import cached_query, invalidate
+from snapshots import SnapshotBatch
+from stats import QueryBatch
+from grid import Filter, GridSpec, Sort, render_grid
+from dispatch import apply_plan, plan_dispatch, request_pickup, request_pickup_with_driver
+from slots import sync_availability_if_due
+from pickup_status import TRANSITIONS, complete_run, transition
+
+
+DRIVER_GRID = GridSpec(
+    'drivers', 'DRIVERS', 'DRIVER_ID',
+    [('DRIVER_ID', 'Driver ID'), ('NAME', 'Name'), ('PHONE_NUMBER', 'Phone Number'), ('EMAIL', 'Email'),
+     ('LICENSE_NUMBER', 'License Number'), ('VEHICLE_TYPE', 'Vehicle Type'), ('VEHICLE_NUMBER', 'Vehicle Number'),
+     ('AVAILABILITY_STATUS', 'Availability Status'), ('LAST_PICKUP_DATE', 'Last Pickup Date'),
+     ('TOTAL_COMPLETED_PICKUPS', 'Total Completed Pickups')],
+    filters=[Filter('AVAILABILITY_STATUS', 'Status', 'choice', ('Available', 'Busy', 'Off-Duty')),
+             Filter('VEHICLE_TYPE', 'Vehicle Type')],
+    sorts=[Sort('Name', 'NAME'), Sort('Completed Pickups', 'COALESCE(TOTAL_COMPLETED_PICKUPS, 0)'),
+           Sort('Last Pickup', "COALESCE(LAST_PICKUP_DATE, '1000-01-01')")],
+)
 
 def manage_drivers(conn):
     c = conn.cursor()
     st.subheader("Manage Drivers")
 
-    # Display all Drivers with headers
+    # Display drivers one page at a time
     st.write("### List of Drivers")
-    c.execute("SELECT * FROM DRIVERS")
-    drivers = c.fetchall()
-    if drivers:
-        st.table([['Driver ID', 'Name', 'Phone Number', 'Email', 'License Number', 'Vehicle Type', 
-                   'Vehicle Number', 'Availability Status', 'Last Pickup Date', 'Total Completed Pickups']] + drivers)
-    else:
-        st.info("No Drivers available.")
+    render_grid(DRIVER_GRID)
 
     # Operation options
     operation = st.radio("Select Operation", ['Update Driver', 'Delete Driver', 'View Driver Details'])
@@ -70,6 +70,7 @@ def manage_drivers(conn):
                          updated_vehicle_number, updated_status, driver_id)
                     )
                     conn.commit()
+                    invalidate('DRIVERS')
                     st.success("Driver updated successfully!")
                 except Exception as e:
                     st.error(f"Error: {e}")
@@ -85,6 +86,7 @@ def manage_drivers(conn):
             try:
                 c.execute("DELETE FROM DRIVERS WHERE DRIVER_ID = %s", (driver_id,))
                 conn.commit()
+                invalidate('DRIVERS')
                 if c.rowcount > 0:
                     st.success("Driver deleted successfully!")
                 else:
@@ -113,77 +115,94 @@ def manage_drivers(conn):
         else:
             st.warning("Driver not found. Please enter a valid Driver ID.")
 
+# Queries behind the driver home tab. They are independent, so they all run
+# concurrently and each widget renders as soon as its own query is back.
+DRIVER_STAT_QUERIES = {
+    'kpis': """
+        SELECT
+            (SELECT COUNT(*) FROM DRIVERS) as total_drivers,
+            (SELECT COUNT(*) FROM DRIVERS WHERE availability_status = 'Available') as available_drivers,
+            (SELECT COUNT(*) FROM SCHEDULES WHERE DATE = CURDATE()) as today_pickups,
+            (SELECT AVG(total_completed_pickups) FROM DRIVERS) as avg_pickups
+    """,
+    'status': """
+        SELECT availability_status, COUNT(*) as count 
+        FROM DRIVERS 
+        GROUP BY availability_status
+    """,
+    'vehicles': """
+        SELECT vehicle_type, COUNT(*) as count 
+        FROM FOOD_PICKUP 
+        GROUP BY vehicle_type
+    """,
+    'top_drivers': """
+        SELECT name, total_completed_pickups 
+        FROM DRIVERS 
+        ORDER BY total_completed_pickups DESC 
+        LIMIT 5
+    """,
+    'schedule': """
+        SELECT 
+            s.DATE as pickup_date,
+            COUNT(*) as pickup_count
+        FROM SCHEDULES s
+        WHERE s.DATE >= CURDATE()
+        GROUP BY s.DATE
+        ORDER BY s.DATE
+        LIMIT 7
+    """,
+    'recent_activity': """
+        SELECT 
+            d.name as driver_name,
+            fp.status,
+            fp.destination,
+            fp.vehicle_type,
+            s.DATE,
+            TIME_FORMAT(s.TIME, '%H:%i') as formatted_time
+        FROM DRIVERS d
+        JOIN FOOD_PICKUP fp ON d.DRIVER_ID = fp.DRIVER_ID
+        JOIN SCHEDULES s ON fp.PICKUP_ID = s.PICKUP_ID
+        ORDER BY s.DATE DESC, s.TIME DESC
+        LIMIT 5
+    """,
+}
+
+
+def _query_unavailable(result):
+    if result.timed_out:
+        st.warning(f"'{result.name}' took too long and was skipped.")
+    else:
+        st.error(f"Error: {result.error}")
+
+
 def display_driver_statistics():
     st.title("🚚 Driver Analytics Dashboard")
-    
-    try:
-        conn = create_connection()
-        cursor = conn.cursor()
-        
-        # Create columns for key metrics
-        col1, col2, col3, col4 = st.columns(4)
-        
-        # Total Drivers
+
+    # Busy/Available follows the booked slots
+    sync_availability_if_due()
+    batch = SnapshotBatch({name: (sql, ()) for name, sql in DRIVER_STAT_QUERIES.items()})
+
+    # Create columns for key metrics
+    col1, col2, col3, col4 = st.columns(4)
+    kpis = batch.result('kpis')
+    if kpis.ok:
+        total_drivers, available_drivers, today_pickups, avg_pickups = kpis.rows[0]
         with col1:
-            cursor.execute("SELECT COUNT(*) FROM DRIVERS")
-            total_drivers = cursor.fetchone()[0]
-            st.metric(
-                label="Total Drivers",
-                value=total_drivers,
-                delta=None
-            )
-        
-        # Available Drivers
+            st.metric(label="Total Drivers", value=total_drivers, delta=None)
         with col2:
-            cursor.execute("""
-                SELECT COUNT(*) 
-                FROM DRIVERS 
-                WHERE availability_status = 'Available'
-            """)
-            available_drivers = cursor.fetchone()[0]
-            st.metric(
-                label="Available Drivers",
-                value=available_drivers,
-                delta=None
-            )
-        
-        # Total Pickups Today
+            st.metric(label="Available Drivers", value=available_drivers, delta=None)
         with col3:
-            cursor.execute("""
-                SELECT COUNT(*) 
-                FROM SCHEDULES 
-                WHERE DATE = CURDATE()
-            """)
-            today_pickups = cursor.fetchone()[0]
-            st.metric(
-                label="Today's Pickups",
-                value=today_pickups,
-                delta=None
-            )
-        
-        # Average Pickups per Driver
+            st.metric(label="Today's Pickups", value=today_pickups, delta=None)
         with col4:
-            cursor.execute("""
-                SELECT AVG(total_completed_pickups) 
-                FROM DRIVERS
-            """)
-            avg_pickups = cursor.fetchone()[0] or 0
-            st.metric(
-                label="Avg Pickups/Driver",
-                value=f"{avg_pickups:.1f}",
-                delta=None
-            )
+            st.metric(label="Avg Pickups/Driver", value=f"{avg_pickups or 0:.1f}", delta=None)
+    else:
+        _query_unavailable(kpis)
 
-        # Driver Status Distribution
-        st.subheader("👨‍💼 Driver Availability Status")
-        cursor.execute("""
-            SELECT availability_status, COUNT(*) as count 
-            FROM DRIVERS 
-            GROUP BY availability_status
-        """)
-        status_data = pd.DataFrame(cursor.fetchall(), 
-                                 columns=['status', 'count'])
-        
+    # Driver Status Distribution
+    st.subheader("👨‍💼 Driver Availability Status")
+    result = batch.result('status')
+    if result.ok:
+        status_data = pd.DataFrame(result.rows, columns=['status', 'count'])
         if not status_data.empty:
             fig = go.Figure(data=[go.Pie(
                 labels=status_data['status'],
@@ -192,20 +211,17 @@ def display_driver_statistics():
             )])
             fig.update_layout(height=300)
             st.plotly_chart(fig, use_container_width=True)
+    else:
+        _query_unavailable(result)
 
-        # Vehicle Type Distribution
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            st.subheader("🚗 Vehicle Type Distribution")
-            cursor.execute("""
-                SELECT vehicle_type, COUNT(*) as count 
-                FROM FOOD_PICKUP 
-                GROUP BY vehicle_type
-            """)
-            vehicle_data = pd.DataFrame(cursor.fetchall(), 
-                                      columns=['vehicle_type', 'count'])
-            
+    # Vehicle Type Distribution
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.subheader("🚗 Vehicle Type Distribution")
+        result = batch.result('vehicles')
+        if result.ok:
+            vehicle_data = pd.DataFrame(result.rows, columns=['vehicle_type', 'count'])
             if not vehicle_data.empty:
                 fig = px.bar(vehicle_data, 
                            x='vehicle_type', 
@@ -214,19 +230,15 @@ def display_driver_statistics():
                            labels={'count': 'Number of Pickups', 
                                   'vehicle_type': 'Vehicle Type'})
                 st.plotly_chart(fig)
-
-        # Top Performing Drivers
-        with col2:
-            st.subheader("🏆 Top Performing Drivers")
-            cursor.execute("""
-                SELECT name, total_completed_pickups 
-                FROM DRIVERS 
-                ORDER BY total_completed_pickups DESC 
-                LIMIT 5
-            """)
-            top_drivers = pd.DataFrame(cursor.fetchall(), 
-                                     columns=['name', 'pickups'])
-            
+        else:
+            _query_unavailable(result)
+
+    # Top Performing Drivers
+    with col2:
+        st.subheader("🏆 Top Performing Drivers")
+        result = batch.result('top_drivers')
+        if result.ok:
+            top_drivers = pd.DataFrame(result.rows, columns=['name', 'pickups'])
             if not top_drivers.empty:
                 fig = px.bar(top_drivers, 
                            x='name', 
@@ -234,22 +246,14 @@ def display_driver_statistics():
                            labels={'pickups': 'Completed Pickups', 
                                   'name': 'Driver Name'})
                 st.plotly_chart(fig)
+        else:
+            _query_unavailable(result)
 
-        # Pickup Schedule Timeline
-        st.subheader("📅 Upcoming Pickups Schedule")
-        cursor.execute("""
-            SELECT 
-                s.DATE as pickup_date,
-                COUNT(*) as pickup_count
-            FROM SCHEDULES s
-            WHERE s.DATE >= CURDATE()
-            GROUP BY s.DATE
-            ORDER BY s.DATE
-            LIMIT 7
-        """)
-        schedule_data = pd.DataFrame(cursor.fetchall(), 
-                                   columns=['date', 'pickups'])
-        
+    # Pickup Schedule Timeline
+    st.subheader("📅 Upcoming Pickups Schedule")
+    result = batch.result('schedule')
+    if result.ok:
+        schedule_data = pd.DataFrame(result.rows, columns=['date', 'pickups'])
         if not schedule_data.empty:
             fig = px.line(schedule_data, 
                          x='date', 
@@ -258,26 +262,14 @@ def display_driver_statistics():
                          labels={'pickups': 'Number of Pickups', 
                                 'date': 'Date'})
             st.plotly_chart(fig, use_container_width=True)
+    else:
+        _query_unavailable(result)
 
-         # Recent Activity Feed
-        st.subheader("📋 Recent Pickup Activities")
-        cursor.execute("""
-            SELECT 
-                d.name as driver_name,
-                fp.status,
-                fp.destination,
-                fp.vehicle_type,
-                s.DATE,
-                TIME_FORMAT(s.TIME, '%H:%i') as formatted_time
-            FROM DRIVERS d
-            JOIN FOOD_PICKUP fp ON d.DRIVER_ID = fp.DRIVER_ID
-            JOIN SCHEDULES s ON fp.PICKUP_ID = s.PICKUP_ID
-            ORDER BY s.DATE DESC, s.TIME DESC
-            LIMIT 5
-        """)
-        activities = cursor.fetchall()
-        
-        for activity in activities:
+    # Recent Activity Feed
+    st.subheader("📋 Recent Pickup Activities")
+    result = batch.result('recent_activity')
+    if result.ok:
+        for activity in result.rows:
             with st.expander(
                 f"{activity[0]} - {activity[4].strftime('%Y-%m-%d')} {activity[5]}"
             ):
@@ -286,42 +278,283 @@ def display_driver_statistics():
                     📍 Destination: {activity[2]}
                     📊 Status: {activity[1]}
                 """)
+    else:
+        _query_unavailable(result)
+
+    with st.expander("🔧 Snapshot timings"):
+        st.dataframe(pd.DataFrame(batch.timings()), use_container_width=True)
+
+
+# Queries behind a logged-in driver's own home tab, keyed by DRIVER_ID and
+# answered from the driver's row and per-driver index ranges (migration 15):
+# the page costs in proportion to the driver's own pickups. The %% escapes
+# are needed because the queries take parameters.
+DRIVER_HOME_QUERIES = {
+    'kpis': """
+        SELECT d.AVAILABILITY_STATUS, COALESCE(d.TOTAL_COMPLETED_PICKUPS, 0), d.LAST_PICKUP_DATE,
+               (SELECT COUNT(*) FROM DRIVER_SLOTS s
+                WHERE s.DRIVER_ID = d.DRIVER_ID AND s.SLOT_DATE = CURDATE()) AS today_slots,
+               (SELECT COUNT(*) FROM FOOD_PICKUP p
+                WHERE p.DRIVER_ID = d.DRIVER_ID AND p.STATUS IN ('Pending', 'In Transit')) AS open_pickups
+        FROM DRIVERS d
+        WHERE d.DRIVER_ID = %s
+    """,
+    'status': """
+        SELECT COALESCE(STATUS, 'Pending'), COUNT(*)
+        FROM FOOD_PICKUP
+        WHERE DRIVER_ID = %s
+        GROUP BY STATUS
+    """,
+    'vehicles': """
+        SELECT VEHICLE_TYPE, COUNT(*)
+        FROM FOOD_PICKUP
+        WHERE DRIVER_ID = %s
+        GROUP BY VEHICLE_TYPE
+    """,
+    'schedule': """
+        SELECT SLOT_DATE, COUNT(*)
+        FROM DRIVER_SLOTS
+        WHERE DRIVER_ID = %s AND SLOT_DATE >= CURDATE()
+        GROUP BY SLOT_DATE
+        ORDER BY SLOT_DATE
+        LIMIT 7
+    """,
+    'recent_activity': """
+        SELECT fp.PICKUP_ID, fp.STATUS, fp.DESTINATION, fp.VEHICLE_TYPE, s.DATE,
+               TIME_FORMAT(s.TIME, '%%H:%%i')
+        FROM FOOD_PICKUP fp
+        JOIN SCHEDULES s ON s.SOURCE_ID = fp.SOURCE_ID AND s.PICKUP_ID = fp.PICKUP_ID
+        WHERE fp.DRIVER_ID = %s
+        ORDER BY s.DATE DESC, s.TIME DESC
+        LIMIT 5
+    """,
+}
+
+
+def display_driver_home(driver_id):
+    st.title("🚚 My Pickups")
+
+    sync_availability_if_due()
+    batch = QueryBatch({name: (sql, (driver_id,)) for name, sql in DRIVER_HOME_QUERIES.items()})
+
+    kpis = batch.result('kpis')
+    if not kpis.ok:
+        _query_unavailable(kpis)
+    elif not kpis.rows:
+        st.warning("Driver not found.")
+        return
+    else:
+        status, completed, last_pickup, today_slots, open_pickups = kpis.rows[0]
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric(label="Status", value=status or 'Available')
+        with col2:
+            st.metric(label="Completed Pickups", value=completed)
+        with col3:
+            st.metric(label="Open Pickups", value=open_pickups)
+        with col4:
+            st.metric(label="Booked Today", value=today_slots)
+        if last_pickup:
+            st.caption(f"Last pickup: {last_pickup:%Y-%m-%d %H:%M}")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.subheader("📊 My Pickups by Status")
+        result = batch.result('status')
+        if result.ok:
+            status_data = pd.DataFrame(result.rows, columns=['status', 'count'])
+            if not status_data.empty:
+                fig = go.Figure(data=[go.Pie(labels=status_data['status'], values=status_data['count'], hole=.3)])
+                fig.update_layout(height=300)
+                st.plotly_chart(fig, use_container_width=True)
+        else:
+            _query_unavailable(result)
 
-    except Exception as e:
-        st.error(f"Error: {str(e)}")
-    finally:
-        if 'conn' in locals():
-            conn.close()
+    with col2:
+        st.subheader("🚗 My Vehicles")
+        result = batch.result('vehicles')
+        if result.ok:
+            vehicle_data = pd.DataFrame(result.rows, columns=['vehicle_type', 'count'])
+            if not vehicle_data.empty:
+                fig = px.bar(vehicle_data, x='vehicle_type', y='count', color='vehicle_type',
+                             labels={'count': 'Number of Pickups', 'vehicle_type': 'Vehicle Type'})
+                st.plotly_chart(fig)
+        else:
+            _query_unavailable(result)
+
+    st.subheader("📅 My Upcoming Bookings")
+    result = batch.result('schedule')
+    if result.ok:
+        schedule_data = pd.DataFrame(result.rows, columns=['date', 'bookings'])
+        if not schedule_data.empty:
+            fig = px.bar(schedule_data, x='date', y='bookings',
+                         labels={'bookings': 'Booked Slots', 'date': 'Date'})
+            st.plotly_chart(fig, use_container_width=True)
+        else:
+            st.info("Nothing booked from today on.")
+    else:
+        _query_unavailable(result)
+
+    st.subheader("📋 My Recent Pickups")
+    result = batch.result('recent_activity')
+    if result.ok:
+        for pickup_id, status, destination, vehicle_type, day, time in result.rows:
+            with st.expander(f"#{pickup_id} - {day.strftime('%Y-%m-%d')} {time or ''}"):
+                st.write(f"""
+                    🚚 Vehicle: {vehicle_type}
+                    📍 Destination: {destination}
+                    📊 Status: {status or 'Pending'}
+                """)
+    else:
+        _query_unavailable(result)
+
+    with st.expander("🔧 Query timings"):
+        st.dataframe(pd.DataFrame(batch.timings()), use_container_width=True)
 
 
-def schedule_pickup(source_id, destination_input, vehicle_type_input, pickup_date, pickup_time):
-    connection = create_connection()
-    if connection:
+def schedule_pickup(source_id, destination_input, vehicle_type_input, pickup_date, pickup_time, driver_id=None):
+    try:
+        if driver_id is None:
+            pickup_id = request_pickup(source_id, destination_input, vehicle_type_input, pickup_date, pickup_time)
+            st.success(f"Pickup #{pickup_id} scheduled. A driver will be assigned at the next dispatch run.")
+            return
+        booking = request_pickup_with_driver(source_id, destination_input, vehicle_type_input,
+                                             pickup_date, pickup_time, driver_id)
+        if booking.ok:
+            st.success(f"Pickup #{booking.pickup_id} scheduled with {booking.driver_name}.")
+        else:
+            st.error(booking.describe())
+    except Error as e:
+        st.error(f"Error scheduling pickup: {e}")
+
+
+def schedule_pickup_form(driver=None):
+    # driver is the logged-in driver's (id, name, vehicle type); they can take
+    # the pickup themselves or leave it to dispatch. Otherwise any active
+    # driver can be picked.
+    st.title("Pickup Scheduling")
+
+    # Streamlit form for user input
+    with st.form(key='pickup_form'):
+        source_id = st.number_input("Source ID", min_value=1, step=1)
+        destination_input = st.text_input("Destination")
+        vehicle_types = ["Bike", "Car", "Van", "Truck"]
+        default_vehicle = driver[2] if driver and driver[2] in vehicle_types else "Car"
+        vehicle_type_input = st.selectbox("Vehicle Type", vehicle_types, index=vehicle_types.index(default_vehicle))
+        pickup_date = st.date_input("Pickup Date")
+        pickup_time = st.time_input("Pickup Time")
+        if driver is not None:
+            drivers = [tuple(driver)]
+        else:
+            drivers = cached_query(
+                "SELECT DRIVER_ID, NAME, VEHICLE_TYPE FROM DRIVERS WHERE AVAILABILITY_STATUS <> 'Off-Duty' ORDER BY NAME"
+            )
+        driver_choice = st.selectbox(
+            "Driver", [None] + drivers,
+            index=1 if driver is not None else 0,
+            format_func=lambda d: "Assign at next dispatch" if d is None else f"{d[1]} ({d[2] or 'no vehicle'})"
+        )
+
+        submit_button = st.form_submit_button("Schedule Pickup")
+
+    if submit_button:
+        if source_id and destination_input and vehicle_type_input and pickup_date and pickup_time:
+            schedule_pickup(source_id, destination_input, vehicle_type_input, pickup_date, pickup_time,
+                            driver_choice[0] if driver_choice else None)
+        else:
+            st.error("Please fill in all the fields!")
+
+
+def run_dispatch():
+    st.subheader("Driver Dispatch")
+    st.write("Groups pending pickups by area into multi-stop runs and assigns each run "
+             "to the least-loaded available driver with a large enough vehicle.")
+
+    day = st.date_input("Plan for date", value=None, key='dispatch_date',
+                        help="Leave empty to plan every pending day")
+
+    if st.button("Preview Plan"):
         try:
-            cursor = connection.cursor()
+            st.session_state['dispatch_plan'] = plan_dispatch(day)
+        except Error as e:
+            st.error(f"Error: {e}")
 
-            # Call the stored procedure
-            cursor.callproc('schedulePickup', [source_id, destination_input, vehicle_type_input, pickup_date, pickup_time])
+    plan = st.session_state.get('dispatch_plan')
+    if plan is None:
+        return
+    if not plan.runs:
+        st.info("No pending pickups without a driver.")
+        return
 
-            # Commit the transaction
-            connection.commit()
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Runs", len(plan.runs))
+    with col2:
+        st.metric("Unassigned Runs", len(plan.unassigned))
+    with col3:
+        st.metric("Planned In", f"{plan.elapsed * 1000:.0f} ms")
+    st.dataframe(pd.DataFrame(plan.rows()), use_container_width=True)
 
-            st.success("Pickup scheduled successfully!")
+    if st.button("Apply Plan", disabled=not plan.assigned):
+        try:
+            assigned = apply_plan(plan)
+            del st.session_state['dispatch_plan']
+            st.success(f"Assigned {assigned} pickup(s) in {len(plan.assigned)} run(s).")
         except Error as e:
-            st.error(f"Error executing procedure: {e}")
-        finally:
-            cursor.close()
-            connection.close()
+            st.error(f"Error: {e}")
 
 
-def main():
-    # Establish a connection to the database
-    conn = create_connection()
-    if not conn:
+def update_pickup_status(driver_id=None):
+    # With driver_id only that driver's open pickups can be picked
+    st.subheader("Pickup Status")
+    st.write("Completing a pickup updates its driver's completed count and last pickup date.")
+
+    if driver_id is None:
+        pickup_id = st.number_input("Pickup ID", min_value=1, step=1)
+    else:
+        mine = cached_query(
+            "SELECT PICKUP_ID, STATUS, DESTINATION FROM FOOD_PICKUP "
+            "WHERE DRIVER_ID = %s AND STATUS IN ('Pending', 'In Transit') ORDER BY PICKUP_ID", (driver_id,)
+        )
+        if not mine:
+            st.info("You have no open pickups.")
+            return
+        labels = {row[0]: f"#{row[0]} to {row[2]} ({row[1]})" for row in mine}
+        pickup_id = st.selectbox("Pickup", list(labels), format_func=labels.get)
+    current = cached_query(
+        "SELECT STATUS, DRIVER_NAME, DESTINATION, RUN_ID, DRIVER_ID FROM FOOD_PICKUP WHERE PICKUP_ID = %s",
+        (pickup_id,)
+    )
+    if not current or (driver_id is not None and current[0][4] != driver_id):
+        st.warning("Pickup not found. Please enter a valid Pickup ID.")
         return
+    status, driver_name, destination, run_id, _ = current[0]
+    st.write(f"Status: {status or 'Pending'}, Driver: {driver_name or 'not assigned'}, "
+             f"Destination: {destination}" + (f", Run: {run_id}" if run_id else ""))
 
+    choices = TRANSITIONS.get(status or 'Pending', ())
+    if not choices:
+        st.info(f"A {status} pickup cannot change status.")
+        return
+    new_status = st.selectbox("New Status", choices)
+    if st.button("Update Status"):
+        try:
+            transition(pickup_id, new_status)
+            st.success(f"Pickup #{pickup_id} is now {new_status}.")
+        except (ValueError, Error) as e:
+            st.error(f"Error: {e}")
+    if run_id and st.button(f"Complete Whole Run #{run_id}"):
+        try:
+            done = complete_run(run_id)
+            st.success(f"Completed {len(done)} pickup(s) in run #{run_id}.")
+        except (ValueError, Error) as e:
+            st.error(f"Error: {e}")
+
+
+def main():
     st.sidebar.title("Navigation")
-    app_mode = st.sidebar.radio("Choose a tab", ["Home", "Manage Drivers","Schedule Pickups "])
+    app_mode = st.sidebar.radio("Choose a tab", ["Home", "Manage Drivers", "Schedule Pickups", "Dispatch",
+                                                 "Pickup Status"])
 
     if app_mode == "Home":
         st.subheader("Welcome to the Perishable Management System")
@@ -329,30 +562,17 @@ def main():
         display_driver_statistics()
 
     elif app_mode == "Manage Drivers":
-        manage_drivers(conn)
+        with get_connection() as conn:
+            manage_drivers(conn)
 
-    elif app_mode=="Schedule Pickups":
-        st.title("Pickup Scheduling")
-    
-    # Streamlit form for user input
-    with st.form(key='pickup_form'):
-        source_id = st.number_input("Source ID", min_value=1, step=1)
-        destination_input = st.text_input("Destination")
-        vehicle_type_input = st.selectbox("Vehicle Type", ["Car", "Van", "Truck"])
-        pickup_date = st.date_input("Pickup Date")
-        pickup_time = st.time_input("Pickup Time")
+    elif app_mode == "Schedule Pickups":
+        schedule_pickup_form()
 
-        submit_button = st.form_submit_button("Schedule Pickup")
-    
-    if submit_button:
-        if source_id and destination_input and vehicle_type_input and pickup_date and pickup_time:
-            # Execute the procedure
-            schedule_pickup(source_id, destination_input, vehicle_type_input, pickup_date, pickup_time)
-        else:
-            st.error("Please fill in all the fields!")
-    
-    # Close the database connection
-    conn.close()
+    elif app_mode == "Dispatch":
+        run_dispatch()
+
+    elif app_mode == "Pickup Status":
+        update_pickup_status()
 
 # Run the Streamlit app
 if __name__ == "__main__":
@@ -0,0 +1,411 @@
+import contextvars
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from functools import lru_cache
+
+# Statement profiler. db.get_connection() hands out connections whose cursors
+# report every execute() here: its latency (execute plus fetching the rows),
+# rows returned or changed, the line of application code that issued it and
+# the page being rendered. Statements are grouped by fingerprint (the SQL with
+# literals, parameters and IN lists collapsed), and each fingerprint keeps its
+# last PROFILE_SAMPLES latencies for percentiles.
+#
+# A Streamlit rerun is wrapped in rerun(); a statement issued
+# PROFILE_N_PLUS_ONE or more times from the same line within one rerun is
+# recorded as an N+1 finding. Work handed to a thread pool keeps the page and
+# call site of the code that submitted it (carry()).
+#
+# The admin Performance tab shows the figures; to_json() and to_prometheus()
+# dump them, and with PMS_PROFILE_DUMP set they are also written to
+# PMS_PROFILE_DUMP.json and .prom every PROFILE_DUMP_SECONDS (for a node
+# exporter textfile collector, say).
+PROFILE_ENABLED = os.environ.get('PMS_PROFILE', '1') != '0'
+PROFILE_SAMPLES = int(os.environ.get('PMS_PROFILE_SAMPLES', '500'))
+PROFILE_SLOW_MS = float(os.environ.get('PMS_PROFILE_SLOW_MS', '200'))
+PROFILE_N_PLUS_ONE = int(os.environ.get('PMS_PROFILE_N_PLUS_ONE', '10'))
+PROFILE_DUMP = os.environ.get('PMS_PROFILE_DUMP')
+PROFILE_DUMP_SECONDS = float(os.environ.get('PMS_PROFILE_DUMP_SECONDS', '60'))
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+# Plumbing that runs statements on behalf of other code; the call site is the
+# first frame outside these
+INFRA_FILES = {os.path.join(APP_DIR, name) for name in ('db.py', 'profiler.py', 'cache.py', 'stats.py',
+                                                         'snapshots.py')}
+
+_trace = contextvars.ContextVar('pms_profile_trace', default=None)
+_origin = contextvars.ContextVar('pms_profile_origin', default=None)
+
+_LITERAL_RE = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"|\b\d+(?:\.\d+)?\b|%s|%\(\w+\)s")
+_IN_LIST_RE = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.IGNORECASE)
+_VALUES_RE = re.compile(r'\bVALUES\s*(\(\s*\?(?:\s*,\s*\?)*\s*\))(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))*',
+                        re.IGNORECASE)
+_UNION_ROWS_RE = re.compile(r'(SELECT (?:\? AS \w+(?:, )?)+)(?: UNION ALL SELECT \?(?:, \?)*)+', re.IGNORECASE)
+_HINT_RE = re.compile(r'/\*\+.*?\*/')
+_COMMENT_RE = re.compile(r'/\*.*?\*/|--[^\n]*', re.DOTALL)
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(sql):
+    # SQL with the values taken out, so the same statement with different
+    # parameters, IN lists or row counts groups together
+    text = _HINT_RE.sub('', sql)
+    text = _COMMENT_RE.sub(' ', text)
+    text = _LITERAL_RE.sub('?', text)
+    text = ' '.join(text.split())
+    text = _IN_LIST_RE.sub('IN (...)', text)
+    text = _VALUES_RE.sub(r'VALUES \1, ...', text)
+    text = _UNION_ROWS_RE.sub(r'\1 UNION ALL ...', text)
+    return text
+
+
+def fingerprint_id(text):
+    return hashlib.sha1(text.encode()).hexdigest()[:12]
+
+
+def call_site():
+    # "file.py:line function" of the innermost application frame that is not
+    # query plumbing, or the site the work was carried from
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(APP_DIR) and filename not in INFRA_FILES:
+            return f"{os.path.relpath(filename, APP_DIR)}:{frame.f_lineno} {frame.f_code.co_name}"
+        frame = frame.f_back
+    return _origin.get() or 'unknown'
+
+
+def _percentile(ordered, pct):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class QueryStats:
+    def __init__(self, fingerprint):
+        self.fingerprint = fingerprint
+        self.id = fingerprint_id(fingerprint)
+        self.calls = 0
+        self.errors = 0
+        self.total = 0.0
+        self.slowest = 0.0
+        self.rows = 0
+        self.samples = deque(maxlen=PROFILE_SAMPLES)
+        self.sites = Counter()
+        self.pages = Counter()
+
+    def add(self, elapsed, rows, site, page, failed):
+        self.calls += 1
+        self.errors += failed
+        self.total += elapsed
+        self.slowest = max(self.slowest, elapsed)
+        self.rows += max(rows, 0)
+        self.samples.append(elapsed)
+        self.sites[site] += 1
+        self.pages[page] += 1
+
+    def describe(self):
+        ordered = sorted(self.samples)
+        return {
+            'id': self.id,
+            'query': self.fingerprint,
+            'calls': self.calls,
+            'errors': self.errors,
+            'total_ms': round(self.total * 1000, 1),
+            'p50_ms': round(_percentile(ordered, 50) * 1000, 2) if ordered else None,
+            'p95_ms': round(_percentile(ordered, 95) * 1000, 2) if ordered else None,
+            'p99_ms': round(_percentile(ordered, 99) * 1000, 2) if ordered else None,
+            'max_ms': round(self.slowest * 1000, 2),
+            'avg_rows': round(self.rows / self.calls, 1) if self.calls else 0,
+            'top_site': self.sites.most_common(1)[0][0] if self.sites else None,
+            'top_page': self.pages.most_common(1)[0][0] if self.pages else None,
+            'sites': dict(self.sites.most_common(5)),
+        }
+
+
+class RerunTrace:
+    # The statements of one Streamlit rerun, for N+1 detection and per-page totals
+    def __init__(self, page):
+        self.page = page
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+        self.statements = 0
+        self.elapsed = 0.0
+        self.repeats = Counter()         # (fingerprint, site) -> executions
+        self.repeat_time = Counter()
+
+    def add(self, text, site, elapsed):
+        with self.lock:
+            self.statements += 1
+            self.elapsed += elapsed
+            self.repeats[(text, site)] += 1
+            self.repeat_time[(text, site)] += elapsed
+
+
+class Profiler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queries = {}               # fingerprint -> QueryStats
+        self._pages = {}                 # page -> [reruns, statements, seconds]
+        self.findings = deque(maxlen=100)
+        self.slow = deque(maxlen=50)     # recent statements over PROFILE_SLOW_MS
+        self.started = time.time()
+        self._dumper = None
+
+    def record(self, sql, elapsed, rows, site, failed=False):
+        text = fingerprint(sql)
+        trace = _trace.get()
+        page = trace.page if trace else 'background'
+        with self._lock:
+            stats = self._queries.get(text)
+            if stats is None:
+                stats = self._queries[text] = QueryStats(text)
+            stats.add(elapsed, rows, site, page, failed)
+            if elapsed * 1000 >= PROFILE_SLOW_MS:
+                self.slow.append({'at': time.strftime('%H:%M:%S'), 'ms': round(elapsed * 1000, 1), 'id': stats.id,
+                                  'site': site, 'page': page, 'query': text})
+        if trace is not None:
+            trace.add(text, site, elapsed)
+        if PROFILE_DUMP and self._dumper is None:
+            self._start_dumper()
+
+    def finish_rerun(self, trace):
+        with self._lock:
+            totals = self._pages.setdefault(trace.page, [0, 0, 0.0])
+            totals[0] += 1
+            totals[1] += trace.statements
+            totals[2] += trace.elapsed
+            for (text, site), count in trace.repeats.items():
+                if count >= PROFILE_N_PLUS_ONE:
+                    self.findings.append({
+                        'at': time.strftime('%H:%M:%S'), 'page': trace.page, 'site': site, 'executions': count,
+                        'total_ms': round(trace.repeat_time[(text, site)] * 1000, 1),
+                        'id': fingerprint_id(text), 'query': text,
+                    })
+
+    def queries(self):
+        with self._lock:
+            stats = list(self._queries.values())
+        return sorted((s.describe() for s in stats), key=lambda row: row['total_ms'], reverse=True)
+
+    def pages(self):
+        with self._lock:
+            items = [(page, list(totals)) for page, totals in self._pages.items()]
+        return sorted((
+            {'page': page, 'reruns': reruns, 'statements_per_rerun': round(statements / reruns, 1),
+             'db_ms_per_rerun': round(seconds / reruns * 1000, 1)}
+            for page, (reruns, statements, seconds) in items
+        ), key=lambda row: row['db_ms_per_rerun'], reverse=True)
+
+    def reset(self):
+        with self._lock:
+            self._queries.clear()
+            self._pages.clear()
+            self.findings.clear()
+            self.slow.clear()
+            self.started = time.time()
+
+    def to_json(self):
+        return json.dumps({
+            'since': self.started,
+            'queries': self.queries(),
+            'pages': self.pages(),
+            'n_plus_one': list(self.findings),
+            'slow': list(self.slow),
+        }, default=str, indent=2)
+
+    def to_prometheus(self):
+        def label(value):
+            return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+        lines = [
+            '# HELP pms_query_duration_seconds Statement latency by query fingerprint.',
+            '# TYPE pms_query_duration_seconds summary',
+        ]
+        info = ['# HELP pms_query_info Query fingerprint text.', '# TYPE pms_query_info gauge']
+        rows = ['# HELP pms_query_rows_total Rows returned or changed.', '# TYPE pms_query_rows_total counter']
+        errors = ['# HELP pms_query_errors_total Statements that raised.', '# TYPE pms_query_errors_total counter']
+        with self._lock:
+            stats = list(self._queries.values())
+            for s in stats:
+                ordered = sorted(s.samples)
+                for quantile in (50, 95, 99):
+                    lines.append(f'pms_query_duration_seconds{{query_id="{s.id}",quantile="{quantile / 100}"}} '
+                                 f'{_percentile(ordered, quantile) or 0:.6f}')
+                lines.append(f'pms_query_duration_seconds_sum{{query_id="{s.id}"}} {s.total:.6f}')
+                lines.append(f'pms_query_duration_seconds_count{{query_id="{s.id}"}} {s.calls}')
+                info.append(f'pms_query_info{{query_id="{s.id}",query="{label(s.fingerprint[:200])}"}} 1')
+                rows.append(f'pms_query_rows_total{{query_id="{s.id}"}} {s.rows}')
+                errors.append(f'pms_query_errors_total{{query_id="{s.id}"}} {s.errors}')
+            findings = len(self.findings)
+        tail = ['# HELP pms_n_plus_one_findings Recent N+1 patterns detected.',
+                '# TYPE pms_n_plus_one_findings gauge', f'pms_n_plus_one_findings {findings}']
+        return '\n'.join(lines + info + rows + errors + tail) + '\n'
+
+    def dump(self, path):
+        for suffix, text in (('.json', self.to_json()), ('.prom', self.to_prometheus())):
+            # Write then rename so a collector never reads a half-written file
+            with open(path + suffix + '.tmp', 'w') as handle:
+                handle.write(text)
+            os.replace(path + suffix + '.tmp', path + suffix)
+
+    def _start_dumper(self):
+        with self._lock:
+            if self._dumper is not None:
+                return
+            self._dumper = threading.Thread(target=self._dump_forever, name='pms-profile-dump', daemon=True)
+        self._dumper.start()
+
+    def _dump_forever(self):
+        while True:
+            time.sleep(PROFILE_DUMP_SECONDS)
+            try:
+                self.dump(PROFILE_DUMP)
+            except OSError:
+                pass
+
+
+_profiler = Profiler()
+
+
+def get_profiler():
+    return _profiler
+
+
+@contextmanager
+def rerun(page):
+    # Wrap one Streamlit script run; name_page() refines the page once the
+    # script knows which tab it is rendering
+    trace = RerunTrace(page)
+    token = _trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _trace.reset(token)
+        if PROFILE_ENABLED:
+            _profiler.finish_rerun(trace)
+
+
+def name_page(page):
+    trace = _trace.get()
+    if trace is not None:
+        trace.page = page
+
+
+@contextmanager
+def background(name):
+    # Statements of background work (snapshot reloads and the like)
+    trace_token = _trace.set(None)
+    origin_token = _origin.set(name)
+    try:
+        yield
+    finally:
+        _origin.reset(origin_token)
+        _trace.reset(trace_token)
+
+
+def carry(fn):
+    # Run fn on another thread as if from here: same rerun, and this call
+    # site when the statement is issued from plumbing only
+    context = contextvars.copy_context()
+    if PROFILE_ENABLED and _origin.get() is None:
+        context.run(_origin.set, call_site())
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+
+class ProfiledCursor:
+    # Times each statement from execute() until its rows have been fetched
+    # (or the next statement, or the end of the connection's checkout)
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._pending = None             # [sql, site, elapsed, rows, failed]
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def _flush(self):
+        pending, self._pending = self._pending, None
+        if pending is not None:
+            sql, site, elapsed, rows, failed = pending
+            if rows == 0 and self._cursor.rowcount and self._cursor.rowcount > 0:
+                rows = self._cursor.rowcount
+            _profiler.record(sql, elapsed, rows, site, failed)
+
+    def _run(self, method, sql, *args):
+        self._flush()
+        site = call_site()
+        started = time.perf_counter()
+        try:
+            result = method(sql, *args)
+        except Exception:
+            self._pending = [sql, site, time.perf_counter() - started, 0, True]
+            self._flush()
+            raise
+        self._pending = [sql, site, time.perf_counter() - started, 0, False]
+        return result
+
+    def execute(self, operation, params=None, multi=False):
+        return self._run(lambda sql, p: self._cursor.execute(sql, p, multi), operation, params)
+
+    def executemany(self, operation, seq_params):
+        return self._run(self._cursor.executemany, operation, seq_params)
+
+    def callproc(self, procname, args=()):
+        return self._run(self._cursor.callproc, f"CALL {procname}", args)
+
+    def _fetch(self, method, *args):
+        started = time.perf_counter()
+        rows = method(*args)
+        if self._pending is not None:
+            self._pending[2] += time.perf_counter() - started
+            self._pending[3] += len(rows) if isinstance(rows, list) else int(rows is not None)
+        return rows
+
+    def fetchall(self):
+        rows = self._fetch(self._cursor.fetchall)
+        self._flush()
+        return rows
+
+    def fetchmany(self, size=1):
+        return self._fetch(self._cursor.fetchmany, size)
+
+    def fetchone(self):
+        return self._fetch(self._cursor.fetchone)
+
+    def close(self):
+        self._flush()
+        return self._cursor.close()
+
+
+class ProfiledConnection:
+    # A pooled connection whose cursors are ProfiledCursors
+    def __init__(self, conn):
+        self._conn = conn
+        self._cursors = []
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def cursor(self, *args, **kwargs):
+        cursor = ProfiledCursor(self._conn.cursor(*args, **kwargs))
+        self._cursors.append(cursor)
+        return cursor
+
+    def finish(self):
+        # Record statements whose rows were never fetched to the end
+        for cursor in self._cursors:
+            cursor._flush()
+        self._cursors.clear()
+
+
+def profiled(conn):
+    return ProfiledConnection(conn) if PROFILE_ENABLED else conn
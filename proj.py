@@ -1,7 +1,17 @@
 import streamlit as st
-import mysql.connector
-import bcrypt
 from mysql.connector import Error
+import pandas as pd
+from accounts import onboard, register
+from auth import AuthBusy, verify_password
+from db import get_connection, pool_stats
+from cache import cache_stats, cached_query, invalidate
+from migrate import ensure_schema
+from inventory import get_inventory
+from metrics import EXPIRING_DAYS, METRICS_REFRESH, TREND_DAYS, get_metrics, refresh as refresh_metrics
+from summary import impact_leaderboard
+from snapshots import describe_feeds, query_rows, snapshot_stats
+from identity import current_entity_id, current_identity, resolve
+from profiler import PROFILE_ENABLED, get_profiler, name_page, rerun
 
 # Initialize session state for role and authentication
 if 'authenticated' not in st.session_state:
@@ -10,16 +20,19 @@ if 'role' not in st.session_state:
     st.session_state.role = None
 if 'username' not in st.session_state:
     st.session_state.username = None
+if 'identity' not in st.session_state:
+    st.session_state.identity = None
 if 'logout' not in st.session_state:
     st.session_state.logout = False
 
 # Callback functions for state management
 def handle_login(username, password):
-    role = login_user(username, password)
-    if role:
+    identity = login_user(username, password)
+    if identity:
         st.session_state.authenticated = True
-        st.session_state.role = role
+        st.session_state.role = identity.role
         st.session_state.username = username
+        st.session_state.identity = identity
         return True
     return False
 
@@ -27,189 +40,298 @@ def handle_logout():
     st.session_state.authenticated = False
     st.session_state.role = None
     st.session_state.username = None
+    st.session_state.identity = None
     st.session_state.logout = True
 
-# Database connection and other utility functions remain the same
-def create_connection():
+def create_tables():
+    # Schema, routines and indexes are versioned in migrate.py
     try:
-        connection = mysql.connector.connect(
-            host='localhost',
-            user='root',
-            password='thegnas58',
-            database='perishable_management_system'
-        )
-        return connection
+        ensure_schema()
+        get_inventory()
     except Error as e:
-        st.error(f"Error: {e}")
-        return None
-
-def hash_password(password):
-    return bcrypt.hashpw(password.encode(), bcrypt.gensalt())
-
-def check_password(hashed_password, user_password):
-    return bcrypt.checkpw(user_password.encode(), hashed_password)
-
-def create_tables():
-    conn = create_connection()
-    if conn:
-        cursor = conn.cursor()
-        try:
-            cursor.execute("""
-            CREATE TABLE IF NOT EXISTS USERS (
-                USERNAME VARCHAR(50) UNIQUE NOT NULL PRIMARY KEY,
-                PASSWORD VARCHAR(255) NOT NULL,
-                ROLE ENUM('Admin', 'NGO', 'Driver', 'Food Source') NOT NULL
-            )
-            """)
-            conn.commit()
-        except Error as e:
-            st.error(f"Error creating tables: {e}")
-        finally:
-            cursor.close()
-            conn.close()
+        st.error(f"Error creating tables: {e}")
 
 def register_user(username, password, role, additional_info=None):
-    conn = create_connection()
-    if conn:
-        cursor = conn.cursor()
-        hashed_pwd = hash_password(password)
-        
-        try:
-            # Handle additional info for non-admin roles
-            if role == 'NGO':
-                query = """INSERT INTO NGO (NAME, CONTACT_NAME, CONTACT, EMAIL) 
-                           VALUES (%s, %s, %s, %s)"""
-                cursor.execute(query, additional_info)
-                conn.commit()
-                user_id = cursor.lastrowid
-
-            elif role == 'Driver':
-                query = """INSERT INTO DRIVERS (NAME, PHONE_NUMBER, EMAIL) 
-                           VALUES (%s, %s, %s)"""
-                cursor.execute(query, additional_info)
-                conn.commit()
-                user_id = cursor.lastrowid
-
-            elif role == 'Food Source':
-                query = """INSERT INTO FOOD_SOURCES (NAME, CONTACT_NAME, CONTACT, EMAIL) 
-                           VALUES (%s, %s, %s, %s)"""
-                cursor.execute(query, additional_info)
-                conn.commit()
-                user_id = cursor.lastrowid
-
-            # Admin role doesn't need additional info
-            if role == 'Admin':
-                user_query = """INSERT INTO USERS (USERNAME, PASSWORD, ROLE) 
-                                VALUES (%s, %s, %s)"""
-                cursor.execute(user_query, (username, hashed_pwd, role))
-                conn.commit()
-                st.success("Admin registration successful!")
-            else:
-                if user_id:
-                    user_query = """INSERT INTO USERS (USERNAME, PASSWORD, ROLE) 
-                                    VALUES (%s, %s, %s)"""
-                    cursor.execute(user_query, (username, hashed_pwd, role))
-                    conn.commit()
-                    st.success("Registration successful!")
-                else:
-                    st.error("Failed to retrieve ID for the user")
-
-        except Error as e:
-            conn.rollback()
-            st.error(f"Registration failed: {e}")
-        finally:
-            cursor.close()
-            conn.close()
+    # Profile and login are written in one transaction (accounts.py)
+    try:
+        register(username, password, role, additional_info)
+        st.success("Admin registration successful!" if role == 'Admin' else "Registration successful!")
+    except (AuthBusy, ValueError, Error) as e:
+        st.error(f"Registration failed: {e}")
 
 
 def login_user(username, password):
-    conn = create_connection()
-    if conn:
-        cursor = conn.cursor(dictionary=True)
-        try:
-            query = """SELECT * FROM USERS WHERE USERNAME = %s"""
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            query = """SELECT PASSWORD, ROLE, ENTITY_ID FROM USERS WHERE USERNAME = %s"""
             cursor.execute(query, (username,))
             user = cursor.fetchone()
-            
-            if user and check_password(user['PASSWORD'].encode(), password):
-                return user['ROLE']
-            else:
-                st.error("Invalid username or password")
-            
-        except Error as e:
-            st.error(f"Login error: {e}")
-        finally:
-            cursor.close()
-            conn.close()
+
+        check = verify_password(password, user['PASSWORD']) if user else None
+        if check and check.ok:
+            if check.needs_rehash:
+                rehash_password(username, user['PASSWORD'], check.new_hash)
+            # Resolved once here and kept in the session for every page
+            return resolve(username, user['ROLE'], user['ENTITY_ID'])
+        else:
+            st.error("Invalid username or password")
+
+    except AuthBusy as e:
+        st.error(f"Login is busy, please try again: {e}")
+    except Error as e:
+        st.error(f"Login error: {e}")
     return None
 
+def rehash_password(username, old_hash, new_hash):
+    # Store a hash at the current BCRYPT_ROUNDS; skipped if the password
+    # changed since it was read. Failing here must not fail the login.
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "UPDATE USERS SET PASSWORD = %s WHERE USERNAME = %s AND PASSWORD = %s",
+                (new_hash, username, old_hash)
+            )
+            conn.commit()
+        invalidate('USERS')
+    except Error:
+        pass
+
 # Role-specific pages
+def display_admin_overview():
+    st.subheader("System Overview")
+    metrics = get_metrics()
+    if metrics.taken_at is None:
+        st.error(f"Metrics are unavailable: {metrics.error}")
+        return
+    kpis = metrics.kpis
+
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Total NGOs", kpis['ngos'])
+    with col2:
+        st.metric("Active Drivers", kpis['active_drivers'], help=f"{kpis['busy_drivers']} on a pickup now")
+    with col3:
+        st.metric("Food Sources", kpis['sources'])
+    with col4:
+        st.metric("Open Requests", kpis['open_requests'])
+
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Stock on Hand", f"{kpis['stock_on_hand']:,} units")
+    with col2:
+        st.metric(f"Expiring in {EXPIRING_DAYS} Days", f"{kpis['expiring_units']:,} units",
+                  help=f"{kpis['expiring_items']} items")
+    with col3:
+        st.metric("Donations Today", metrics.donations_today,
+                  delta=f"{metrics.donations_today - metrics.donations_per_day:+.1f} vs {TREND_DAYS}-day avg")
+    with col4:
+        st.metric("Unassigned Pickups", kpis['unassigned_pickups'])
+
+    st.subheader(f"Donations per Day (last {TREND_DAYS} days)")
+    if metrics.daily:
+        daily = pd.DataFrame(metrics.daily, columns=['Day', 'Donations', 'Quantity']).set_index('Day')
+        st.bar_chart(daily['Donations'])
+    else:
+        st.info(f"No donations in the last {TREND_DAYS} days.")
+
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        st.caption(f"Snapshot taken {metrics.taken_at:%H:%M:%S} ({metrics.elapsed * 1000:.0f} ms to compute), "
+                   f"refreshed every {METRICS_REFRESH:.0f}s"
+                   + (f". Last refresh failed: {metrics.error}" if metrics.error else ""))
+    with col2:
+        if st.button("Refresh Now", disabled=metrics.age is not None and metrics.age < 5):
+            refresh_metrics()
+            st.rerun()
+
+
+def display_admin_reports():
+    st.subheader("System Reports")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.write("### Top Food Sources")
+        leaders = impact_leaderboard('quantity', 10)
+        st.dataframe(pd.DataFrame(
+            [(s.name, s.quantity_donated, s.ngos_supported, s.people_helped) for s in leaders],
+            columns=['Source', 'Quantity Donated', 'NGOs Supported', 'People Helped']
+        ), use_container_width=True)
+    with col2:
+        st.write("### Stock by Category")
+        categories = query_rows(
+            "SELECT CATEGORY, ITEMS, STOCK, DONATIONS, QUANTITY_DONATED FROM CATEGORY_STATS "
+            "WHERE ITEMS > 0 OR DONATIONS > 0 ORDER BY STOCK DESC", name='admin.categories'
+        )
+        st.dataframe(pd.DataFrame(
+            categories, columns=['Category', 'Items', 'Stock', 'Donations', 'Quantity Donated']
+        ), use_container_width=True)
+
+    st.write("### Top Drivers")
+    drivers = query_rows(
+        "SELECT NAME, TOTAL_COMPLETED_PICKUPS, LAST_PICKUP_DATE FROM DRIVERS "
+        "ORDER BY TOTAL_COMPLETED_PICKUPS DESC, NAME LIMIT 10", name='admin.top_drivers'
+    )
+    st.dataframe(pd.DataFrame(drivers, columns=['Driver', 'Completed Pickups', 'Last Pickup']),
+                 use_container_width=True)
+
+    with st.expander("🔧 System health"):
+        st.write("Connection pool", pool_stats())
+        st.write("Query cache", cache_stats())
+        st.write("Dashboard snapshots", snapshot_stats())
+        st.dataframe(pd.DataFrame(describe_feeds()), use_container_width=True)
+
+
+def display_admin_performance():
+    st.subheader("Query Performance")
+    if not PROFILE_ENABLED:
+        st.info("Statement profiling is off (PMS_PROFILE=0).")
+        return
+    profiler = get_profiler()
+    st.caption("Every statement the app has run since the server started or the figures were reset, grouped by "
+               "query with literals taken out. Latency includes fetching the rows.")
+
+    st.write("### Queries by total time")
+    queries = profiler.queries()
+    if queries:
+        st.dataframe(pd.DataFrame(queries).drop(columns=['sites']), hide_index=True, use_container_width=True)
+    else:
+        st.write("No statements recorded yet.")
+
+    st.write("### Pages")
+    st.dataframe(pd.DataFrame(profiler.pages()), hide_index=True, use_container_width=True)
+
+    st.write("### N+1 patterns")
+    st.caption("The same statement issued many times from one line during a single page render.")
+    if profiler.findings:
+        st.dataframe(pd.DataFrame(list(profiler.findings)[::-1]), hide_index=True, use_container_width=True)
+    else:
+        st.write("None detected.")
+
+    st.write("### Slow statements")
+    if profiler.slow:
+        st.dataframe(pd.DataFrame(list(profiler.slow)[::-1]), hide_index=True, use_container_width=True)
+    else:
+        st.write("None over the threshold.")
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.download_button("Download JSON", profiler.to_json(), file_name='pms-queries.json',
+                           mime='application/json')
+    with col2:
+        st.download_button("Download Prometheus", profiler.to_prometheus(), file_name='pms-queries.prom',
+                           mime='text/plain')
+    with col3:
+        if st.button("Reset"):
+            profiler.reset()
+            st.rerun()
+
+
+def display_onboarding():
+    st.subheader("Onboard Accounts")
+    st.caption("Columns: USERNAME, PASSWORD (or PASSWORD_HASH), ROLE (NGO, Driver or Food Source), NAME, "
+               "CONTACT_NAME, CONTACT, PHONE_NUMBER, EMAIL. Each account gets its profile and login together.")
+    upload = st.file_uploader("Upload CSV or Parquet", type=['csv', 'parquet'])
+    if upload is not None and st.button("Onboard"):
+        try:
+            report = onboard(upload)
+            created = ', '.join(f"{count} {role}" for role, count in sorted(report.created.items())) or "no"
+            st.success(f"Created {created} accounts in {report.elapsed:.2f}s "
+                       f"({report.accounts_per_second:.0f} accounts/s).")
+            if report.rejects:
+                st.warning(f"{len(report.rejects)} rows rejected.")
+                st.dataframe(pd.DataFrame(report.rejects), hide_index=True)
+        except (AuthBusy, Error, ValueError) as e:
+            st.error(f"Error: {e}")
+
 def admin_dashboard():
     st.title("Admin Dashboard")
     
     # Sidebar navigation for admin
     admin_menu = st.sidebar.selectbox(
         "Admin Menu",
-        ["Overview", "Manage NGOs", "Manage Drivers", "Manage Food Sources", "Reports"]
+        ["Overview", "Manage NGOs", "Manage Drivers", "Manage Food Sources", "Onboard Accounts",
+         "Batch Allocation", "Dispatch", "Reports", "Compare Sources", "Expiry Risk", "Performance"]
     )
+    name_page(f"Admin / {admin_menu}")
     
     if admin_menu == "Overview":
-        st.subheader("System Overview")
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            st.metric("Total NGOs", "12")
-        with col2:
-            st.metric("Active Drivers", "8")
-        with col3:
-            st.metric("Food Sources", "15")
+        display_admin_overview()
             
     elif admin_menu == "Manage NGOs":
-        st.subheader("NGO Management")
-        # Add NGO management functionality
-        st.write("Here you can view and manage NGO registrations")
+        with get_connection() as conn:
+            manage_ngos(conn)
         
     elif admin_menu == "Manage Drivers":
-        st.subheader("Driver Management")
-        # Add driver management functionality
-        st.write("Here you can view and manage drivers")
+        with get_connection() as conn:
+            manage_drivers(conn)
         
     elif admin_menu == "Manage Food Sources":
-        st.subheader("Food Source Management")
-        # Add food source management functionality
-        st.write("Here you can view and manage food sources")
+        with get_connection() as conn:
+            manage_food_sources(conn)
         
+    elif admin_menu == "Onboard Accounts":
+        display_onboarding()
+
+    elif admin_menu == "Batch Allocation":
+        run_batch_allocation()
+
+    elif admin_menu == "Dispatch":
+        run_dispatch()
+
     elif admin_menu == "Reports":
-        st.subheader("System Reports")
-        # Add reporting functionality
-        st.write("View system reports and analytics")
+        display_admin_reports()
+
+    elif admin_menu == "Compare Sources":
+        display_source_comparison(dict(cached_query("SELECT SOURCE_ID, NAME FROM FOOD_SOURCES")))
+
+    elif admin_menu == "Expiry Risk":
+        display_expiry_risk()
+
+    elif admin_menu == "Performance":
+        display_admin_performance()
  
-from ngo import manage_ngos,manage_impact,display_ngo_statistics,handle_donation_request
+from ngo import manage_ngos,manage_impact,display_ngo_statistics,display_ngo_home,handle_donation_request,handle_queue_request,run_batch_allocation
 
 def ngo_dashboard():
     st.title("NGO Dashboard")
-    
-    conn = create_connection()
-    if not conn:
-        return
+    identity = current_identity()
+    if identity and identity.linked:
+        st.caption(f"Signed in as {identity.name} (NGO ID {identity.entity_id})")
 
     st.sidebar.title("Navigation")
     app_mode = st.sidebar.radio("Choose a tab", ["Home", "Manage NGOs Info","Feedback","Donation"])
+    name_page(f"NGO / {app_mode}")
 
     if app_mode == "Home":
         st.subheader("Welcome to the Perishable Management System")
         st.write("Use the side menu to navigate to different sections.")
-        display_ngo_statistics()
+        view = st.sidebar.radio("View", ["My NGO", "All NGOs"])
+        if view == "All NGOs":
+            display_ngo_statistics()
+        else:
+            ngo_id = current_entity_id()
+            if ngo_id is not None:
+                display_ngo_home(ngo_id)
 
     elif app_mode == "Manage NGOs Info":
-        manage_ngos(conn)
+        with get_connection() as conn:
+            manage_ngos(conn)
 
     elif app_mode == "Feedback":
-        manage_impact(conn)
+        ngo_id = current_entity_id()
+        if ngo_id is None:
+            return
+        with get_connection() as conn:
+            manage_impact(conn, ngo_id)
     
     if app_mode == "Donation":
         st.title("Donation Source Management")
+        ngo_id = current_entity_id()
+        if ngo_id is None:
+            return
         # Input fields for the user
-        ngo_id = st.number_input("Enter NGO ID", min_value=1, step=1)
         required_category = st.text_input("Enter Required Category")
         required_quantity_input = st.text_input("Enter Required Quantity")
 
@@ -232,67 +354,76 @@ def ngo_dashboard():
             else:
                 st.error("Please enter a valid quantity greater than 0.")
 
-from pickups import manage_drivers,display_driver_statistics,schedule_pickup
+        # Or leave it for the next batch run, which an admin starts
+        if st.button("Queue Request"):
+            handle_queue_request(ngo_id, required_category, required_quantity)
+
+from pickups import manage_drivers,display_driver_statistics,display_driver_home,schedule_pickup_form,run_dispatch,update_pickup_status
 
 def driver_dashboard():
-    conn = create_connection()
     st.sidebar.title("Navigation")
-    app_mode = st.sidebar.radio("Choose a tab", ["Home", "Manage Drivers","Schedule Pickups"])
+    app_mode = st.sidebar.radio("Choose a tab", ["Home", "Manage Drivers","Schedule Pickups","Pickup Status"])
+    name_page(f"Driver / {app_mode}")
 
     if app_mode == "Home":
         st.subheader("Welcome to the Perishable Management System")
         st.write("Use the side menu to navigate to different sections.")
-        display_driver_statistics()
+        view = st.sidebar.radio("View", ["My Pickups", "All Drivers"])
+        if view == "All Drivers":
+            display_driver_statistics()
+        else:
+            driver_id = current_entity_id()
+            if driver_id is not None:
+                display_driver_home(driver_id)
 
     elif app_mode == "Manage Drivers":
-        manage_drivers(conn)
+        with get_connection() as conn:
+            manage_drivers(conn)
     
     elif app_mode=="Schedule Pickups":
-        st.title("Pickup Scheduling")
-    
-        # Streamlit form for user input
-        with st.form(key='pickup_form'):
-            source_id = st.number_input("Source ID", min_value=1, step=1)
-            destination_input = st.text_input("Destination")
-            vehicle_type_input = st.selectbox("Vehicle Type", ["Car", "Van", "Truck"])
-            pickup_date = st.date_input("Pickup Date")
-            pickup_time = st.time_input("Pickup Time")
-
-            submit_button = st.form_submit_button("Schedule Pickup")
-        
-        if submit_button:
-            if source_id and destination_input and vehicle_type_input and pickup_date and pickup_time:
-                # Execute the procedure
-                schedule_pickup(source_id, destination_input, vehicle_type_input, pickup_date, pickup_time)
-            else:
-                st.error("Please fill in all the fields!")
+        driver_id = current_entity_id()
+        if driver_id is None:
+            return
+        identity = current_identity()
+        schedule_pickup_form((driver_id, identity.name, identity.profile.get('VEHICLE_TYPE')))
+
+    elif app_mode == "Pickup Status":
+        driver_id = current_entity_id()
+        if driver_id is None:
+            return
+        update_pickup_status(driver_id)
     
 
-from food import  manage_food_sources,display_impact_dashboard,manage_food_items,get_top_demanded_categories
+from food import  manage_food_sources,display_impact_dashboard,manage_food_items,get_top_demanded_categories,display_expiry_risk,display_source_comparison
 
 
 def food_source_dashboard():
-    conn = mysql.connector.connect(
-        host="localhost",  # Replace with your database host
-        user="root",  # Replace with your database user
-        password="thegnas58",  # Replace with your database password
-        database="perishable_management_system"  # Replace with your database name
-    )
-    
     st.sidebar.title("Navigation")
-    app_mode = st.sidebar.radio("Choose a tab", ["Home", "Manage Info","Make Donation ","Top Categories"])
+    app_mode = st.sidebar.radio("Choose a tab", ["Home", "Manage Info","Make Donation ","Top Categories","Expiry Risk"])
+    name_page(f"Food Source / {app_mode.strip()}")
     
     if app_mode == "Home":
         st.subheader("Welcome to the Perishable Management System")
         st.write("Use the side menu to navigate to different sections.")
-        display_impact_dashboard()
+        view = st.sidebar.radio("View", ["My Impact", "Compare Sources"])
+        if view == "Compare Sources":
+            display_source_comparison(dict(cached_query("SELECT SOURCE_ID, NAME FROM FOOD_SOURCES")))
+        else:
+            source_id = current_entity_id()
+            if source_id is not None:
+                display_impact_dashboard(source_id)
         
     
     elif app_mode == "Manage Info":
-        manage_food_sources(conn)
+        with get_connection() as conn:
+            manage_food_sources(conn)
 
     elif app_mode == "Make Donation ":
-        manage_food_items(conn)
+        source_id = current_entity_id()
+        if source_id is None:
+            return
+        with get_connection() as conn:
+            manage_food_items(conn, source_id)
     
     elif app_mode == "Top Categories":
         st.title("Top Demanded Food Categories")
@@ -302,7 +433,14 @@ def food_source_dashboard():
             submit_button = st.form_submit_button(label='Get Top Demanded Categories')
         
         if submit_button:
-            get_top_demanded_categories(conn, top_n)
+            with get_connection() as conn:
+                get_top_demanded_categories(conn, top_n)
+
+    elif app_mode == "Expiry Risk":
+        source_id = current_entity_id()
+        if source_id is None:
+            return
+        display_expiry_risk(source_id)
         
 def login_page():
     st.subheader("Login to Your Account")
@@ -423,4 +561,5 @@ def main():
 
 if __name__ == '__main__':
     create_tables()
-    main()
\ No newline at end of file
+    with rerun(st.session_state.role or "Signed out"):
+        main()
\ No newline at end of file
@@ -1,164 +1,8 @@
-create database perishable_management_system;
+-- Sample data for a fresh install.
+-- Tables, routines, triggers and indexes are created by the migration runner
+-- (python migrate.py); run it before loading this file. See README.md.
 use  perishable_management_system;
 
-CREATE TABLE FOOD_SOURCES (
-    SOURCE_ID INT AUTO_INCREMENT,   -- Automatically increment the ID for new entries
-    NAME VARCHAR(255) NOT NULL,     -- Source name should not be null
-    CONTACT_NAME VARCHAR(255),      -- Contact person's name
-    CONTACT VARCHAR(255) NOT NULL,  -- Contact info (phone or other) is required
-    EMAIL VARCHAR(255) UNIQUE,      -- Email should be unique for each source
-    DETAILS TEXT,                   -- Additional details about the source
-    LOCALITY VARCHAR(255),          -- Locality information
-    PINCODE VARCHAR(10) CHECK (PINCODE REGEXP '^[0-9]{6}$'), -- Ensuring pincode format (assuming 6 digits in this case)
-    PRIMARY KEY (SOURCE_ID)         -- Set SOURCE_ID as the primary key
-);
-
-ALTER TABLE FOOD_SOURCES
-    MODIFY DETAILS TEXT DEFAULT NULL,
-    MODIFY LOCALITY VARCHAR(255) DEFAULT NULL,
-    MODIFY PINCODE VARCHAR(10) DEFAULT NULL;
-
-
--- MULTIVALUED ATTR
-CREATE TABLE TYPE_OF_SOURCE (
-    SOURCE_ID INT,
-    TYPE_SOURCE VARCHAR(255),
-    PRIMARY KEY (SOURCE_ID, TYPE_SOURCE),
-    FOREIGN KEY (SOURCE_ID) REFERENCES FOOD_SOURCES(SOURCE_ID)
-);
-
-
--- FOOD_ITEM table
-CREATE TABLE FOOD_ITEM (
-    FOOD_ID INT AUTO_INCREMENT,      -- Auto-incrementing food item ID
-    NAME VARCHAR(255) NOT NULL,      -- Name of the food item, cannot be null
-    QUANTITY INT NOT NULL CHECK (QUANTITY > 0),  -- Quantity should be a positive integer
-    CATEGORY VARCHAR(255),           -- Category of the food item (e.g., perishable/non-perishable)
-    EXPIRY_DATE DATE,                -- Expiry date of the food item
-    PRIMARY KEY (FOOD_ID)            -- FOOD_ID is the primary key
-);
-
-ALTER TABLE FOOD_ITEM
-ADD COLUMN SOURCE_ID INT,
-ADD FOREIGN KEY (SOURCE_ID) REFERENCES FOOD_SOURCES(SOURCE_ID);
-
-
--- PROVIDES RELATION (M:N RELATION)
-CREATE TABLE PROVIDES (
-    SOURCE_ID INT,
-    FOOD_ID INT,
-    PRIMARY KEY (SOURCE_ID, FOOD_ID),
-    FOREIGN KEY (SOURCE_ID) REFERENCES FOOD_SOURCES(SOURCE_ID),
-    FOREIGN KEY (FOOD_ID) REFERENCES FOOD_ITEM(FOOD_ID)
-);
-
--- NGO table
-CREATE TABLE NGO (
-    NGO_ID INT AUTO_INCREMENT,       -- Auto-incrementing NGO ID
-    NAME VARCHAR(255) NOT NULL,      -- Name of the NGO, cannot be null
-    CONTACT_NAME VARCHAR(255),       -- Contact person's name
-    CONTACT VARCHAR(255) NOT NULL,   -- Contact info (phone or other) is required
-    EMAIL VARCHAR(255) UNIQUE,       -- Email should be unique for each NGO
-    CATEGORY_REQ VARCHAR(255),       -- Required food category for the NGO
-    ADDRESS TEXT,                    -- NGO's address
-    PRIMARY KEY (NGO_ID)             -- NGO_ID is the primary key
-);
-
-ALTER TABLE NGO 
-    MODIFY CATEGORY_REQ VARCHAR(255)DEFAULT NULL,
-    MODIFY ADDRESS TEXT DEFAULT NULL;
-    
-
--- DONATIONS table - WEAK ENTITY
-
-CREATE TABLE DONATIONS (
-    DONATION_ID INT AUTO_INCREMENT,
-    SOURCE_ID INT NOT NULL,
-    NGO_ID INT NOT NULL,
-    SOURCE VARCHAR(255) NOT NULL,
-    DESTINATION VARCHAR(255) NOT NULL,
-    QUANTITY INT NOT NULL CHECK (QUANTITY > 0),
-    CATEGORY VARCHAR(255),
-    PRIMARY KEY (DONATION_ID),
-    FOREIGN KEY (SOURCE_ID) REFERENCES FOOD_SOURCES(SOURCE_ID),
-    FOREIGN KEY (NGO_ID) REFERENCES NGO(NGO_ID)
-);
-
--- DONATES TO RELATION - WEAK
-CREATE TABLE DONATES_TO(
-    SOURCE_ID INT,
-    DONATION_ID INT,
-    DATE_TIME DATETIME,
-    PRIMARY KEY (SOURCE_ID, DONATION_ID),
-    FOREIGN KEY (SOURCE_ID) REFERENCES FOOD_SOURCES(SOURCE_ID),
-    FOREIGN KEY (DONATION_ID) REFERENCES DONATIONS(DONATION_ID)
-);
-
--- RECIEVES RELATION - WEAK
-CREATE TABLE RECEIVES (
-    NGO_ID INT,
-    DONATION_ID INT,
-    PRIMARY KEY (NGO_ID, DONATION_ID),
-    FOREIGN KEY (NGO_ID) REFERENCES NGO(NGO_ID),
-    FOREIGN KEY (DONATION_ID) REFERENCES DONATIONS(DONATION_ID)
-);
-
-
--- FOOD_PICKUP table
-CREATE TABLE FOOD_PICKUP (
-    PICKUP_ID INT AUTO_INCREMENT,    -- Auto-incrementing pickup ID
-	SOURCE_ID INT NOT NULL,
-    DRIVER_ID INT NOT NULL,          -- ID of the driver responsible for the pickup
-    DRIVER_NAME VARCHAR(255),        -- Name of the driver
-    CONTACT VARCHAR(255),            -- Contact info of the driver
-    STATUS VARCHAR(50),              -- Status of the pickup (e.g., pending, completed)
-    DESTINATION VARCHAR(255),        -- Destination of the pickup
-    VEHICLE_TYPE VARCHAR(50),        -- Type of vehicle used for the pickup
-    PRIMARY KEY (PICKUP_ID),          -- PICKUP_ID is the primary key
-	FOREIGN KEY (SOURCE_ID) REFERENCES FOOD_SOURCES(SOURCE_ID)
-);
-
-
--- IMPACT table
-CREATE TABLE IMPACT (
-    IMPACT_ID INT AUTO_INCREMENT,
-    SOURCE_ID INT NOT NULL,
-    NGO_ID INT NOT NULL,
-    SOURCE VARCHAR(255) NOT NULL,
-    DESTINATION VARCHAR(255) NOT NULL,
-    FEEDBACK TEXT,
-    RATE INT CHECK (RATE BETWEEN 1 AND 5),
-    PEOPLE_HELPED INT CHECK (PEOPLE_HELPED >= 0),
-    PRIMARY KEY (IMPACT_ID),
-    FOREIGN KEY (SOURCE_ID) REFERENCES FOOD_SOURCES(SOURCE_ID),
-    FOREIGN KEY (NGO_ID) REFERENCES NGO(NGO_ID)
-);
-
--- SCHEDULES RELATION 
-CREATE TABLE SCHEDULES (
-    SOURCE_ID INT,
-    PICKUP_ID INT,
-    DATE DATE,
-    TIME TIME,
-    PRIMARY KEY (SOURCE_ID, PICKUP_ID),
-    FOREIGN KEY (SOURCE_ID) REFERENCES FOOD_SOURCES(SOURCE_ID),
-    FOREIGN KEY (PICKUP_ID) REFERENCES FOOD_PICKUP(PICKUP_ID)
-);
-
--- DRIVER ENTITY 
- CREATE TABLE DRIVERS (
-    DRIVER_ID INT AUTO_INCREMENT PRIMARY KEY,  -- Unique identifier for each driver
-    NAME VARCHAR(100) NOT NULL,               -- Driver's name
-    PHONE_NUMBER VARCHAR(15) NOT NULL,        -- Contact phone number
-    EMAIL VARCHAR(100),                       -- Email address (optional)
-    LICENSE_NUMBER VARCHAR(50) DEFAULT NULL,      -- Driver's license number
-    VEHICLE_TYPE VARCHAR(50) DEFAULT NULL,                 -- Type of vehicle (e.g., truck, van, bike)
-    VEHICLE_NUMBER VARCHAR(20) DEFAULT NULL,               -- Vehicle registration number
-    AVAILABILITY_STATUS ENUM('Available', 'Busy', 'Off-Duty') DEFAULT 'Available',  -- Current status of the driver
-    LAST_PICKUP_DATE DATETIME DEFAULT NULL,                -- Last pickup time for tracking activity
-    TOTAL_COMPLETED_PICKUPS INT DEFAULT 0     -- Total number of pickups completed
-);
-
 -- FOOD SOURCES 
 
 INSERT INTO FOOD_SOURCES (NAME, CONTACT_NAME, CONTACT, EMAIL, DETAILS, LOCALITY, PINCODE) VALUES
@@ -0,0 +1,306 @@
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from mysql.connector import Error
+
+from cache import invalidate
+from db import get_connection
+
+# Driver slot reservations. Every pickup or run a driver is given occupies a
+# [start, end) interval, in minutes after midnight, in DRIVER_SLOTS. No two
+# intervals of one driver on one day may overlap.
+#
+# Writers use optimistic concurrency rather than long-held locks: they read
+# the driver's SCHEDULE_VERSION and that day's slots without locking, check
+# the new interval against an in-memory interval index, then bump the version
+# with "... WHERE SCHEDULE_VERSION = <what was read>". If another session got
+# there first the bump matches no row, and the whole transaction is rolled
+# back and retried against the fresh schedule. A version bump is the only
+# write that serialises two sessions, and only when they book the same driver.
+#
+#   python slots.py --sync    set AVAILABILITY_STATUS from the slots running now
+
+SLOT_MINUTES = int(os.environ.get('PMS_SLOT_MINUTES', '30'))              # one pickup stop
+MAX_ATTEMPTS = int(os.environ.get('PMS_SLOT_ATTEMPTS', '8'))             # on a stale schedule
+AVAILABILITY_SYNC_SECONDS = float(os.environ.get('PMS_AVAILABILITY_SYNC', '60'))
+RETRY_ERRNOS = (1205, 1213)
+DAY_MINUTES = 24 * 60
+
+DRIVER_SCHEDULE = """
+    SELECT SCHEDULE_VERSION, AVAILABILITY_STATUS, NAME, PHONE_NUMBER
+    FROM DRIVERS
+    WHERE DRIVER_ID = %s
+"""
+
+DAY_SLOTS = """
+    SELECT DRIVER_ID, SLOT_DATE, START_MIN, END_MIN, SLOT_ID
+    FROM DRIVER_SLOTS
+    WHERE SLOT_DATE IN ({dates}){drivers}
+"""
+
+BUMP_VERSION = """
+    UPDATE DRIVERS SET SCHEDULE_VERSION = SCHEDULE_VERSION + 1
+    WHERE DRIVER_ID = %s AND SCHEDULE_VERSION = %s
+"""
+
+INSERT_SLOT = """
+    INSERT INTO DRIVER_SLOTS (DRIVER_ID, SLOT_DATE, START_MIN, END_MIN, PICKUP_ID, RUN_ID)
+    VALUES (%s, %s, %s, %s, %s, %s)
+"""
+
+# Busy while a slot is running, Available otherwise; Off-Duty is left alone
+SYNC_AVAILABILITY = """
+    UPDATE DRIVERS d
+    SET d.AVAILABILITY_STATUS = IF(EXISTS (
+            SELECT 1 FROM DRIVER_SLOTS s
+            WHERE s.DRIVER_ID = d.DRIVER_ID AND s.SLOT_DATE = CURDATE()
+              AND s.START_MIN <= HOUR(CURTIME()) * 60 + MINUTE(CURTIME())
+              AND s.END_MIN > HOUR(CURTIME()) * 60 + MINUTE(CURTIME())
+        ), 'Busy', 'Available')
+    WHERE d.AVAILABILITY_STATUS <> 'Off-Duty'{drivers}
+"""
+
+
+class StaleSchedule(Exception):
+    # The driver's schedule changed between reading it and writing to it
+    pass
+
+
+def minute_of_day(value):
+    # datetime.time, or the timedelta MySQL returns for TIME columns
+    if isinstance(value, timedelta):
+        return int(value.total_seconds() // 60)
+    return value.hour * 60 + value.minute
+
+
+def format_minute(minute):
+    return f"{minute // 60:02d}:{minute % 60:02d}"
+
+
+class DaySchedule:
+    # One driver's intervals on one day, sorted by start. reach[k] is the
+    # latest end among the first k + 1 intervals, so an overlap check is a
+    # single bisect even if older data holds overlapping rows.
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+        self.slot_ids = []
+        self.reach = []
+
+    def add(self, start, end, slot_id=None):
+        i = bisect_left(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+        self.slot_ids.insert(i, slot_id)
+        self.reach[i:] = []
+        for k in range(i, len(self.starts)):
+            self.reach.append(max(self.reach[-1], self.ends[k]) if self.reach else self.ends[k])
+
+    def clash(self, start, end):
+        # (start, end, slot_id) of an interval overlapping [start, end), or None
+        i = bisect_left(self.starts, end)
+        if i == 0 or self.reach[i - 1] <= start:
+            return None
+        for k in range(i - 1, -1, -1):
+            if self.ends[k] > start:
+                return self.starts[k], self.ends[k], self.slot_ids[k]
+
+    def __len__(self):
+        return len(self.starts)
+
+
+class SlotIndex:
+    # (driver_id, day) -> DaySchedule for a set of days, used by planners that
+    # book many drivers at once
+    def __init__(self):
+        self._days = {}
+
+    def load(self, cursor, dates, driver_ids=None):
+        dates = sorted(set(dates))
+        if not dates:
+            return self
+        sql = DAY_SLOTS.format(dates=', '.join(['%s'] * len(dates)), drivers=(
+            f" AND DRIVER_ID IN ({', '.join(['%s'] * len(driver_ids))})" if driver_ids else ''))
+        cursor.execute(sql, tuple(dates) + tuple(driver_ids or ()))
+        for driver_id, day, start, end, slot_id in cursor.fetchall():
+            self.add(driver_id, day, start, end, slot_id)
+        return self
+
+    def day(self, driver_id, day):
+        return self._days.get((driver_id, day))
+
+    def add(self, driver_id, day, start, end, slot_id=None):
+        self._days.setdefault((driver_id, day), DaySchedule()).add(start, end, slot_id)
+
+    def is_free(self, driver_id, day, start, end):
+        schedule = self._days.get((driver_id, day))
+        return schedule is None or schedule.clash(start, end) is None
+
+
+@dataclass
+class SlotBooking:
+    driver_id: int
+    day: object
+    start: int
+    end: int
+    slot_id: int = None
+    reason: str = None       # why it was refused: unknown driver | off duty | overlap
+    clash: tuple = None      # (start, end, slot_id) of the slot it overlaps
+    pickup_id: int = None
+    driver_name: str = None
+    driver_phone: str = None
+    attempts: int = 0
+
+    @property
+    def ok(self):
+        return self.slot_id is not None
+
+    def describe(self):
+        window = f"{format_minute(self.start)}–{format_minute(self.end)}"
+        if self.ok:
+            return f"Driver {self.driver_id} booked {self.day} {window}"
+        if self.reason == 'overlap':
+            return (f"Driver {self.driver_id} is already booked {self.day} "
+                    f"{format_minute(self.clash[0])}–{format_minute(self.clash[1])}")
+        return f"Driver {self.driver_id} cannot be booked {self.day} {window}: {self.reason}"
+
+
+def book(cursor, driver_id, day, start, end, pickup_id=None, run_id=None):
+    # Reserve [start, end) for the driver inside the caller's transaction.
+    # Returns a SlotBooking (not ok when refused) or raises StaleSchedule,
+    # in which case the caller must roll back and start over.
+    booking = SlotBooking(driver_id, day, start, end, pickup_id=pickup_id)
+    if not 0 <= start < end <= DAY_MINUTES:
+        raise ValueError(f"slot {start}-{end} is not within one day")
+    cursor.execute(DRIVER_SCHEDULE, (driver_id,))
+    row = cursor.fetchone()
+    if row is None:
+        booking.reason = 'unknown driver'
+        return booking
+    version, status, booking.driver_name, booking.driver_phone = row
+    if status == 'Off-Duty':
+        booking.reason = 'off duty'
+        return booking
+
+    schedule = SlotIndex().load(cursor, [day], [driver_id]).day(driver_id, day)
+    booking.clash = schedule.clash(start, end) if schedule else None
+    if booking.clash:
+        booking.reason = 'overlap'
+        return booking
+
+    cursor.execute(BUMP_VERSION, (driver_id, version))
+    if cursor.rowcount != 1:
+        raise StaleSchedule(driver_id)
+    cursor.execute(INSERT_SLOT, (driver_id, day, start, end, pickup_id, run_id))
+    booking.slot_id = cursor.lastrowid
+    return booking
+
+
+def claim_versions(cursor, versions):
+    # Bump several drivers' versions at once, given {driver_id: version read
+    # when planning}. Raises StaleSchedule if any of them has moved on.
+    for driver_id, version in sorted(versions.items()):
+        cursor.execute(BUMP_VERSION, (driver_id, version))
+        if cursor.rowcount != 1:
+            raise StaleSchedule(driver_id)
+
+
+def in_schedule_transaction(work):
+    # Run work(cursor) in a READ COMMITTED transaction and commit it if the
+    # result is ok, else roll back. A StaleSchedule, deadlock or lock wait
+    # timeout restarts the work from scratch with fresh reads.
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            with get_connection() as conn:
+                conn.start_transaction(isolation_level='READ COMMITTED')
+                cursor = conn.cursor()
+                try:
+                    result = work(cursor)
+                except (StaleSchedule, Error):
+                    conn.rollback()
+                    raise
+                if result.ok:
+                    conn.commit()
+                else:
+                    conn.rollback()
+            result.attempts = attempt + 1
+            return result
+        except StaleSchedule:
+            pass
+        except Error as e:
+            if e.errno not in RETRY_ERRNOS:
+                raise
+        time.sleep(0.005 * (attempt + 1))
+    raise Error(msg=f"driver schedule kept changing after {MAX_ATTEMPTS} attempts; try again")
+
+
+def reserve_slot(driver_id, day, start, end, pickup_id=None):
+    booking = in_schedule_transaction(lambda cursor: book(cursor, driver_id, day, start, end, pickup_id))
+    if booking.ok:
+        invalidate('DRIVER_SLOTS', 'DRIVERS')
+        sync_availability([driver_id])
+    return booking
+
+
+def release_pickup(cursor, pickup_id):
+    # Free the slots held for a pickup inside the caller's transaction.
+    # Returns the drivers whose schedules changed.
+    cursor.execute("SELECT DISTINCT DRIVER_ID FROM DRIVER_SLOTS WHERE PICKUP_ID = %s", (pickup_id,))
+    driver_ids = [row[0] for row in cursor.fetchall()]
+    for driver_id in driver_ids:
+        cursor.execute("UPDATE DRIVERS SET SCHEDULE_VERSION = SCHEDULE_VERSION + 1 WHERE DRIVER_ID = %s",
+                       (driver_id,))
+    cursor.execute("DELETE FROM DRIVER_SLOTS WHERE PICKUP_ID = %s", (pickup_id,))
+    return driver_ids
+
+
+def sync_availability(driver_ids=None):
+    # Recompute AVAILABILITY_STATUS from the slots running now
+    sql, params = SYNC_AVAILABILITY.format(drivers=''), ()
+    if driver_ids is not None:
+        driver_ids = tuple(driver_ids)
+        if not driver_ids:
+            return 0
+        sql = SYNC_AVAILABILITY.format(drivers=f" AND d.DRIVER_ID IN ({', '.join(['%s'] * len(driver_ids))})")
+        params = driver_ids
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        changed = cursor.rowcount
+        conn.commit()
+    if changed:
+        invalidate('DRIVERS')
+    return changed
+
+
+_last_sync = 0.0
+_sync_lock = threading.Lock()
+
+
+def sync_availability_if_due():
+    # For page views: at most one full sync per AVAILABILITY_SYNC_SECONDS
+    global _last_sync
+    if time.monotonic() - _last_sync < AVAILABILITY_SYNC_SECONDS or not _sync_lock.acquire(blocking=False):
+        return
+    try:
+        sync_availability()
+        _last_sync = time.monotonic()
+    finally:
+        _sync_lock.release()
+
+
+def main(argv):
+    if '--sync' in argv:
+        print(f"{sync_availability()} driver(s) changed status at {datetime.now():%H:%M}")
+        return 0
+    print("usage: python slots.py --sync")
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
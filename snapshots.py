@@ -0,0 +1,263 @@
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+
+from mysql.connector import Error
+
+from cache import on_invalidate, tables_in
+from db import get_cursor
+from profiler import background
+from stats import QueryResult, get_executor
+
+# Shared dashboard snapshots. Each dashboard aggregate is registered once per
+# server process as a feed (a loader plus the tables it reads). One background
+# thread keeps every feed's latest value current: it reloads a feed
+# SNAPSHOT_INTERVAL seconds after its last load, and soon after any
+# invalidate() of a table the feed reads, coalescing bursts of writes into one
+# reload per SNAPSHOT_DEBOUNCE seconds. Page views only read the values held
+# in memory, so the database load depends on the number of feeds and the rate
+# of writes, not on how many sessions are open.
+#
+# Writes from other processes are not notified; they show up on the next
+# scheduled reload, as with the query cache TTL.
+SNAPSHOT_INTERVAL = float(os.environ.get('PMS_SNAPSHOT_INTERVAL', '60'))
+SNAPSHOT_DEBOUNCE = float(os.environ.get('PMS_SNAPSHOT_DEBOUNCE', '1'))
+
+
+@dataclass
+class Snapshot:
+    value: object = None
+    taken_at: datetime = None
+    elapsed: float = 0.0
+    error: str = None        # last reload failure; value is then the previous one
+
+    @property
+    def ok(self):
+        return self.taken_at is not None
+
+    @property
+    def age(self):
+        return (datetime.now() - self.taken_at).total_seconds() if self.taken_at else None
+
+
+class _Feed:
+    def __init__(self, key, loader, tables, interval, name=None):
+        self.key = key
+        self.name = name or str(key)
+        self.loader = loader
+        self.tables = frozenset(table.upper() for table in tables)
+        self.interval = interval
+        self.lock = threading.Lock()     # one reload at a time
+        self.snapshot = None
+        self.due = 0.0                   # monotonic time of the next reload
+        self.generation = 0              # bumped by every write notification
+        self.loaded_generation = 0       # generation the current snapshot reflects
+
+    @property
+    def dirty(self):
+        return self.generation != self.loaded_generation
+
+
+class SnapshotWorker:
+    def __init__(self):
+        self._feeds = {}
+        self._cond = threading.Condition()
+        self._thread = None
+        self.stats = {'loads': 0, 'scheduled': 0, 'after_writes': 0, 'notifications': 0, 'errors': 0}
+
+    def register(self, key, loader, tables, interval=None, name=None):
+        with self._cond:
+            if key not in self._feeds:
+                self._feeds[key] = _Feed(key, loader, tables, interval or SNAPSHOT_INTERVAL, name)
+        return key
+
+    def registered(self, key):
+        return key in self._feeds
+
+    def get(self, key):
+        # The feed's latest snapshot; only the first read in a process waits
+        # for a load, and concurrent first readers share it.
+        feed = self._feeds[key]
+        if feed.snapshot is None:
+            with feed.lock:
+                if feed.snapshot is None:
+                    self._load(feed)
+            self._start()
+        return feed.snapshot
+
+    def prime(self, keys):
+        # Load never-loaded feeds side by side instead of one after another
+        missing = [key for key in keys if self._feeds[key].snapshot is None]
+        if len(missing) > 1:
+            for future in [get_executor().submit(self.get, key) for key in missing]:
+                future.result()
+
+    def refresh(self, key):
+        feed = self._feeds[key]
+        with feed.lock:
+            self._load(feed)
+        return feed.snapshot
+
+    def notify(self, tables):
+        # invalidate() listener: bring forward feeds that read these tables
+        tables = set(tables)
+        now = time.monotonic()
+        with self._cond:
+            hit = False
+            for feed in self._feeds.values():
+                if feed.snapshot is not None and feed.tables & tables:
+                    feed.generation += 1
+                    feed.due = min(feed.due, now + SNAPSHOT_DEBOUNCE)
+                    hit = True
+            if hit:
+                self.stats['notifications'] += 1
+                self._cond.notify()
+
+    def _load(self, feed):
+        with self._cond:
+            generation = feed.generation
+        started = time.perf_counter()
+        failed = False
+        try:
+            with background(f"snapshot {feed.name}"):
+                value = feed.loader()
+            snapshot = Snapshot(value, datetime.now(), time.perf_counter() - started)
+        except Exception as e:
+            failed = True
+            previous = feed.snapshot or Snapshot()
+            snapshot = Snapshot(previous.value, previous.taken_at, previous.elapsed, str(e))
+        with self._cond:
+            feed.snapshot = snapshot
+            self.stats['errors' if failed else 'loads'] += 1
+            if failed:
+                delay = min(feed.interval, 5.0)
+            else:
+                feed.loaded_generation = generation
+                # A write that landed during the load may not be in it
+                delay = SNAPSHOT_DEBOUNCE if feed.dirty else feed.interval
+            feed.due = time.monotonic() + delay
+
+    def _start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='pms-snapshots', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                now = time.monotonic()
+                loaded = [feed for feed in self._feeds.values() if feed.snapshot is not None]
+                due = [feed for feed in loaded if feed.due <= now]
+                if not due:
+                    next_due = min((feed.due for feed in loaded), default=now + SNAPSHOT_INTERVAL)
+                    self._cond.wait(max(0.05, next_due - now))
+                    continue
+            for feed in due:
+                with feed.lock:
+                    if feed.due > time.monotonic():
+                        continue     # reloaded on demand meanwhile
+                    self.stats['after_writes' if feed.dirty else 'scheduled'] += 1
+                    self._load(feed)
+
+    def describe(self):
+        # One row per feed for the admin health panel
+        now = time.monotonic()
+        return [
+            {
+                'feed': feed.name,
+                'age_s': round(feed.snapshot.age, 1) if feed.snapshot and feed.snapshot.ok else None,
+                'load_ms': round(feed.snapshot.elapsed * 1000, 1) if feed.snapshot else None,
+                'next_in_s': round(max(0.0, feed.due - now), 1) if feed.snapshot else None,
+                'error': feed.snapshot.error if feed.snapshot else None,
+            }
+            for feed in list(self._feeds.values())
+        ]
+
+
+_worker = SnapshotWorker()
+on_invalidate(_worker.notify)
+
+
+def register(key, loader, tables, interval=None):
+    return _worker.register(key, loader, tables, interval, key)
+
+
+def get_snapshot(key):
+    return _worker.get(key)
+
+
+def refresh(key):
+    return _worker.refresh(key)
+
+
+def snapshot_stats():
+    return dict(_worker.stats)
+
+
+def describe_feeds():
+    return _worker.describe()
+
+
+def register_query(sql, params=(), interval=None, name=None):
+    # A feed holding the rows of one read-only query
+    params = tuple(params)
+    key = ('query', sql, params)
+    if not _worker.registered(key):
+        def load():
+            with get_cursor() as cursor:
+                cursor.execute(sql, params)
+                return cursor.fetchall()
+        _worker.register(key, load, tables_in(sql), interval, name)
+    return key
+
+
+def _rows(snapshot):
+    if not snapshot.ok:
+        raise Error(msg=snapshot.error)
+    return snapshot.value
+
+
+def query_rows(sql, params=(), name=None):
+    return _rows(_worker.get(register_query(sql, params, name=name)))
+
+
+def snapshot_queries(queries):
+    # Drop-in for stats.run_queries: name -> rows, read from the snapshots
+    keys = {name: register_query(sql, params, name=name) for name, (sql, params) in queries.items()}
+    _worker.prime(keys.values())
+    return {name: _rows(_worker.get(key)) for name, key in keys.items()}
+
+
+class SnapshotBatch:
+    # Drop-in for stats.QueryBatch on pages whose queries are dashboard
+    # aggregates: results come from the shared snapshots, not the database.
+    def __init__(self, queries):
+        self._keys = {name: register_query(sql, params, name=name) for name, (sql, params) in queries.items()}
+        _worker.prime(self._keys.values())
+        self.results = {}
+
+    def result(self, name):
+        if name not in self.results:
+            snapshot = _worker.get(self._keys[name])
+            self.results[name] = QueryResult(
+                name, rows=snapshot.value if snapshot.ok else None, elapsed=snapshot.elapsed,
+                error=None if snapshot.ok else snapshot.error,
+            )
+        return self.results[name]
+
+    def timings(self):
+        rows = []
+        for name, key in self._keys.items():
+            snapshot = _worker.get(key)
+            rows.append({
+                'query': name,
+                'ms': round(snapshot.elapsed * 1000, 1),
+                'rows': len(snapshot.value) if snapshot.value is not None else None,
+                'age_s': round(snapshot.age, 1) if snapshot.ok else None,
+                'status': 'ok' if not snapshot.error else 'stale' if snapshot.ok else 'error',
+            })
+        return rows
@@ -0,0 +1,129 @@
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from dataclasses import dataclass
+
+from cache import cached_query
+from db import POOL_SIZE
+from profiler import carry
+
+# Dashboards fan their independent queries out to this pool so a page costs
+# the slowest query instead of the sum of all of them. Each worker checks out
+# its own pooled connection, so keep it no larger than the connection pool.
+STATS_WORKERS = int(os.environ.get('PMS_STATS_WORKERS', str(min(8, POOL_SIZE))))
+STATS_QUERY_TIMEOUT = float(os.environ.get('PMS_STATS_QUERY_TIMEOUT', '5'))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=STATS_WORKERS, thread_name_prefix='pms-stats')
+    return _executor
+
+
+def submit_queries(queries):
+    # queries maps a name to (sql, params); returns name -> Future of the rows
+    executor = get_executor()
+    return {
+        name: executor.submit(carry(cached_query), sql, params)
+        for name, (sql, params) in queries.items()
+    }
+
+
+def run_queries(queries):
+    futures = submit_queries(queries)
+    return {name: future.result() for name, future in futures.items()}
+
+
+@dataclass
+class QueryResult:
+    name: str
+    rows: list = None
+    elapsed: float = 0.0
+    error: str = None
+    timed_out: bool = False
+
+    @property
+    def ok(self):
+        return self.error is None and not self.timed_out
+
+    @property
+    def status(self):
+        if self.timed_out:
+            return 'timeout'
+        return 'error' if self.error else 'ok'
+
+
+def _limit_execution(sql, timeout):
+    # Optimizer hint so MySQL abandons the statement itself instead of leaving
+    # a worker (and its pooled connection) tied up after the page gave up.
+    hint = 'SELECT /*+ MAX_EXECUTION_TIME(%d) */' % int(timeout * 1000)
+    return re.sub(r'^\s*SELECT\b', hint, sql, count=1, flags=re.IGNORECASE)
+
+
+def _run_timed(sql, params):
+    started = time.perf_counter()
+    rows = cached_query(sql, params)
+    return rows, time.perf_counter() - started
+
+
+class QueryBatch:
+    # Submits every query up front and lets the page collect them one at a time
+    # in render order. Each query gets its own deadline measured from submission,
+    # so a slow chart only ever costs its own timeout and never delays widgets
+    # rendered before it.
+
+    def __init__(self, queries, timeout=STATS_QUERY_TIMEOUT):
+        self.timeout = timeout
+        self.started = time.monotonic()
+        self.results = {}
+        executor = get_executor()
+        self._futures = {}
+        for name, (sql, params) in queries.items():
+            if timeout:
+                sql = _limit_execution(sql, timeout)
+            self._futures[name] = executor.submit(carry(_run_timed), sql, params)
+
+    def result(self, name):
+        if name in self.results:
+            return self.results[name]
+        future = self._futures[name]
+        remaining = None
+        if self.timeout:
+            remaining = max(0.0, self.started + self.timeout - time.monotonic())
+        try:
+            rows, elapsed = future.result(timeout=remaining)
+            result = QueryResult(name, rows=rows, elapsed=elapsed)
+        except FutureTimeout:
+            result = QueryResult(name, elapsed=time.monotonic() - self.started, timed_out=True)
+        except Exception as e:
+            result = QueryResult(name, elapsed=time.monotonic() - self.started, error=str(e))
+        self.results[name] = result
+        return result
+
+    def timings(self):
+        # One row per query for the debug panel; queries the page never waited
+        # on are reported as they stand now without blocking.
+        rows = []
+        for name, future in self._futures.items():
+            if name not in self.results and future.done():
+                self.result(name)
+            result = self.results.get(name)
+            if result is None:
+                rows.append({'query': name, 'ms': None, 'rows': None, 'status': 'pending'})
+            else:
+                rows.append({
+                    'query': name,
+                    'ms': round(result.elapsed * 1000, 1),
+                    'rows': len(result.rows) if result.rows is not None else None,
+                    'status': result.status,
+                })
+        return rows
@@ -0,0 +1,195 @@
+import sys
+from dataclasses import dataclass
+
+from cache import cached_query, invalidate
+from db import get_connection
+
+# Summary tables behind the impact and donation dashboards. They are kept
+# current by the triggers installed in migration 9; this module holds the
+# from-scratch definition of each one, used to backfill them and to check that
+# the incremental counters have not drifted.
+#
+#   python summary.py --verify    compare every summary table with the facts
+#   python summary.py --rebuild   recompute them (run while writes are quiet)
+
+SUMMARY_DEFINITIONS = {
+    'SOURCE_STATS': ("""
+        SELECT fs.SOURCE_ID,
+               COALESCE(p.items, 0), COALESCE(d.donations, 0), COALESCE(d.quantity, 0), COALESCE(d.ngos, 0),
+               COALESCE(i.rate_sum, 0), COALESCE(i.rate_count, 0), COALESCE(i.people, 0)
+        FROM FOOD_SOURCES fs
+        LEFT JOIN (SELECT SOURCE_ID, COUNT(*) AS items FROM PROVIDES GROUP BY SOURCE_ID) p
+               ON p.SOURCE_ID = fs.SOURCE_ID
+        LEFT JOIN (SELECT SOURCE_ID, COUNT(*) AS donations, SUM(QUANTITY) AS quantity, COUNT(DISTINCT NGO_ID) AS ngos
+                   FROM DONATIONS GROUP BY SOURCE_ID) d
+               ON d.SOURCE_ID = fs.SOURCE_ID
+        LEFT JOIN (SELECT SOURCE_ID, SUM(RATE) AS rate_sum, COUNT(RATE) AS rate_count, SUM(PEOPLE_HELPED) AS people
+                   FROM IMPACT GROUP BY SOURCE_ID) i
+               ON i.SOURCE_ID = fs.SOURCE_ID
+    """, ('SOURCE_ID', 'ITEMS_PROVIDED', 'DONATIONS', 'QUANTITY_DONATED', 'NGOS_SUPPORTED',
+          'RATING_SUM', 'RATING_COUNT', 'PEOPLE_HELPED')),
+    'NGO_STATS': ("""
+        SELECT n.NGO_ID,
+               COALESCE(d.donations, 0), COALESCE(d.quantity, 0), COALESCE(d.sources, 0),
+               COALESCE(i.rate_sum, 0), COALESCE(i.rate_count, 0), COALESCE(i.people, 0)
+        FROM NGO n
+        LEFT JOIN (SELECT NGO_ID, COUNT(*) AS donations, SUM(QUANTITY) AS quantity, COUNT(DISTINCT SOURCE_ID) AS sources
+                   FROM DONATIONS GROUP BY NGO_ID) d
+               ON d.NGO_ID = n.NGO_ID
+        LEFT JOIN (SELECT NGO_ID, SUM(RATE) AS rate_sum, COUNT(RATE) AS rate_count, SUM(PEOPLE_HELPED) AS people
+                   FROM IMPACT GROUP BY NGO_ID) i
+               ON i.NGO_ID = n.NGO_ID
+    """, ('NGO_ID', 'DONATIONS', 'QUANTITY_RECEIVED', 'SOURCES', 'RATING_SUM', 'RATING_COUNT', 'PEOPLE_HELPED')),
+    'SOURCE_NGO_STATS': ("""
+        SELECT SOURCE_ID, NGO_ID, COUNT(*), SUM(QUANTITY)
+        FROM DONATIONS
+        GROUP BY SOURCE_ID, NGO_ID
+    """, ('SOURCE_ID', 'NGO_ID', 'DONATIONS', 'QUANTITY')),
+    'DAILY_DONATION_STATS': ("""
+        SELECT DATE(dt.DATE_TIME), COUNT(*), SUM(d.QUANTITY)
+        FROM DONATES_TO dt
+        JOIN DONATIONS d ON d.DONATION_ID = dt.DONATION_ID
+        WHERE dt.DATE_TIME IS NOT NULL
+        GROUP BY DATE(dt.DATE_TIME)
+    """, ('DAY', 'DONATIONS', 'QUANTITY')),
+    'CATEGORY_STATS': ("""
+        SELECT c.CATEGORY,
+               COALESCE(f.items, 0), COALESCE(f.stock, 0), COALESCE(d.donations, 0), COALESCE(d.quantity, 0)
+        FROM (SELECT IFNULL(CATEGORY, '') AS CATEGORY FROM FOOD_ITEM
+              UNION SELECT IFNULL(CATEGORY, '') FROM DONATIONS) c
+        LEFT JOIN (SELECT IFNULL(CATEGORY, '') AS CATEGORY, COUNT(*) AS items, SUM(QUANTITY) AS stock
+                   FROM FOOD_ITEM GROUP BY IFNULL(CATEGORY, '')) f
+               ON f.CATEGORY = c.CATEGORY
+        LEFT JOIN (SELECT IFNULL(CATEGORY, '') AS CATEGORY, COUNT(*) AS donations, SUM(QUANTITY) AS quantity
+                   FROM DONATIONS GROUP BY IFNULL(CATEGORY, '')) d
+               ON d.CATEGORY = c.CATEGORY
+    """, ('CATEGORY', 'ITEMS', 'STOCK', 'DONATIONS', 'QUANTITY_DONATED')),
+}
+
+# Read by the dashboards instead of scanning DONATIONS / DONATES_TO / IMPACT
+GENERAL_TOTALS_QUERY = """
+    SELECT
+        (SELECT COALESCE(SUM(QUANTITY_DONATED), 0) FROM SOURCE_STATS) AS total_quantity,
+        (SELECT COUNT(*) FROM SOURCE_STATS WHERE DONATIONS > 0) AS total_sources,
+        (SELECT COUNT(*) FROM NGO_STATS WHERE DONATIONS > 0) AS total_ngos
+"""
+
+SUMMARY_TABLES = tuple(SUMMARY_DEFINITIONS)
+
+# Typed replacement for the GetFoodSourceImpact string: one row per source,
+# for any number of sources, in a single statement.
+SOURCE_IMPACT_QUERY = """
+    SELECT fs.SOURCE_ID, fs.NAME,
+           IFNULL(s.ITEMS_PROVIDED, 0), IFNULL(s.NGOS_SUPPORTED, 0), IFNULL(s.QUANTITY_DONATED, 0),
+           IF(IFNULL(s.RATING_COUNT, 0) = 0, 0, s.RATING_SUM / s.RATING_COUNT),
+           IFNULL(s.PEOPLE_HELPED, 0)
+    FROM FOOD_SOURCES fs
+    LEFT JOIN SOURCE_STATS s ON s.SOURCE_ID = fs.SOURCE_ID
+"""
+
+LEADERBOARD_ORDER = {
+    'quantity': 's.QUANTITY_DONATED',
+    'people': 's.PEOPLE_HELPED',
+    'ngos': 's.NGOS_SUPPORTED',
+    'items': 's.ITEMS_PROVIDED',
+}
+
+
+@dataclass
+class SourceImpact:
+    source_id: int
+    name: str
+    items_provided: int
+    ngos_supported: int
+    quantity_donated: int
+    average_rating: float
+    people_helped: int
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(row[0], row[1], int(row[2]), int(row[3]), int(row[4]), round(float(row[5]), 2), int(row[6]))
+
+
+def source_impacts(source_ids=None):
+    # source_id -> SourceImpact for the given sources (all when None)
+    sql, params = SOURCE_IMPACT_QUERY, ()
+    if source_ids is not None:
+        source_ids = tuple(source_ids)
+        if not source_ids:
+            return {}
+        sql += f" WHERE fs.SOURCE_ID IN ({', '.join(['%s'] * len(source_ids))})"
+        params = source_ids
+    return {row[0]: SourceImpact.from_row(row) for row in cached_query(sql, params)}
+
+
+def source_impact(source_id):
+    return source_impacts((source_id,)).get(source_id)
+
+
+def impact_leaderboard(by='quantity', limit=10):
+    # Top sources by one of LEADERBOARD_ORDER, read off the summary index
+    order = LEADERBOARD_ORDER[by]
+    rows = cached_query(f"{SOURCE_IMPACT_QUERY} ORDER BY {order} DESC, fs.SOURCE_ID LIMIT %s", (limit,))
+    return [SourceImpact.from_row(row) for row in rows]
+
+
+def rebuild(cursor, tables=SUMMARY_TABLES):
+    # Replace the contents of each summary table with a fresh aggregate. The
+    # caller commits. Writes made concurrently by other sessions can land on
+    # either side of the swap, so run it while the app is quiet (or verify
+    # afterwards).
+    for table in tables:
+        sql, columns = SUMMARY_DEFINITIONS[table]
+        cursor.execute(f"DELETE FROM {table}")
+        cursor.execute(f"INSERT INTO {table} ({', '.join(columns)}) {sql}")
+
+
+def _nonzero(rows, key_width):
+    # Triggers leave rows whose counters are back at zero; the definitions
+    # omit or zero them. Neither is a difference.
+    return {
+        tuple(row[:key_width]): tuple(int(value) for value in row[key_width:])
+        for row in rows
+        if any(row[key_width:])
+    }
+
+
+def verify(cursor, tables=SUMMARY_TABLES):
+    # table -> list of (key, stored counters, expected counters) that differ
+    drift = {}
+    for table in tables:
+        sql, columns = SUMMARY_DEFINITIONS[table]
+        key_width = 2 if table == 'SOURCE_NGO_STATS' else 1
+        cursor.execute(sql)
+        expected = _nonzero(cursor.fetchall(), key_width)
+        cursor.execute(f"SELECT {', '.join(columns)} FROM {table}")
+        stored = _nonzero(cursor.fetchall(), key_width)
+        drift[table] = [
+            (key, stored.get(key), expected.get(key))
+            for key in sorted(set(stored) | set(expected), key=str)
+            if stored.get(key) != expected.get(key)
+        ]
+    return drift
+
+
+def main(argv):
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        if '--rebuild' in argv:
+            rebuild(cursor)
+            conn.commit()
+            invalidate(*SUMMARY_TABLES)
+            print(f"Rebuilt {', '.join(SUMMARY_TABLES)}")
+            return 0
+
+        drift = verify(cursor)
+        conn.commit()
+    for table, rows in drift.items():
+        print(f"{'ok   ' if not rows else 'DRIFT'} {table}" + (f" ({len(rows)} rows)" if rows else ''))
+        for key, stored, expected in rows[:10]:
+            print(f"      {key}: stored {stored}, expected {expected}")
+    return 0 if not any(drift.values()) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,412 @@
+import argparse
+import os
+import sys
+import time
+import zlib
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from cache import invalidate
+from db import get_connection
+from inventory import mark_stale
+from pickup_status import reconcile
+from summary import SUMMARY_TABLES, rebuild
+
+# Deterministic synthetic data for load tests. load() appends FOOD_SOURCES,
+# NGO, DRIVERS, FOOD_ITEM, DONATIONS, IMPACT, FOOD_PICKUP and SCHEDULES at a
+# multiple of BASE_VOLUME, with the rows the triggers would have added
+# (PROVIDES, DONATES_TO, RECEIVES) and the summary tables and driver counters
+# rebuilt once at the end. The same seed, scale and day always produce the
+# same rows; into an empty database they also get the same ids.
+#
+# Rows are generated with numpy in blocks of BLOCK and written as multi-row
+# INSERTs of SYNTHETIC_CHUNK rows with explicit ids, one transaction per
+# chunk, with the per-row triggers switched off for the session
+# (@pms_bulk_import, @pms_defer_summaries, migration 16). Load into a scratch
+# database (PMS_DB_NAME): the rebuild at the end assumes the app is quiet.
+#
+#   python synthetic.py --scale 10 [--seed 1] [--days 365] [--today YYYY-MM-DD]
+
+SYNTHETIC_CHUNK = int(os.environ.get('PMS_SYNTHETIC_CHUNK', '5000'))
+BLOCK = 100_000   # rows per random stream, so the data does not depend on the chunk size
+
+# Rows per table at scale 1, about the production volume
+BASE_VOLUME = {
+    'FOOD_SOURCES': 2_000,
+    'NGO': 800,
+    'DRIVERS': 400,
+    'FOOD_ITEM': 100_000,
+    'DONATIONS': 250_000,
+    'FOOD_PICKUP': 60_000,
+}
+IMPACT_SHARE = 0.2           # donations the NGO leaves feedback on
+ZERO_STOCK_SHARE = 0.08      # items already allocated down to zero
+UPCOMING_DAYS = 7            # pickups are scheduled this far ahead
+
+# category -> (share of items and donations, typical shelf life in days, item names)
+CATEGORIES = {
+    'Vegetables': (0.22, 7, ('Tomatoes', 'Onions', 'Potatoes', 'Spinach', 'Carrots', 'Cabbage')),
+    'Fruits': (0.18, 9, ('Apples', 'Bananas', 'Oranges', 'Mangoes', 'Grapes', 'Papaya')),
+    'Dairy': (0.14, 6, ('Milk', 'Curd', 'Paneer', 'Butter', 'Cheese')),
+    'Bakery': (0.12, 3, ('Bread', 'Buns', 'Cakes', 'Cookies')),
+    'Grains': (0.12, 180, ('Rice', 'Wheat Flour', 'Lentils', 'Oats')),
+    'Prepared Meals': (0.10, 1, ('Cooked Rice', 'Curry', 'Sandwiches', 'Meal Boxes')),
+    'Poultry': (0.07, 3, ('Chicken', 'Eggs')),
+    'Seafood': (0.05, 2, ('Fish', 'Prawns')),
+}
+CATEGORY_SHARE = {category: share for category, (share, _, _) in CATEGORIES.items()}
+SOURCE_TYPES = ('Restaurant', 'Grocery', 'Farm', 'Bakery', 'Caterer', 'Hotel')
+VEHICLES = {'Bike': 0.35, 'Car': 0.30, 'Van': 0.25, 'Truck': 0.10}
+DRIVER_STATUS = {'Available': 0.6, 'Busy': 0.25, 'Off-Duty': 0.15}
+RATES = {5: 0.45, 4: 0.30, 3: 0.15, 2: 0.06, 1: 0.04}
+FEEDBACK = ('Fresh and well packed', 'Arrived on time', 'Helped us feed many families',
+            'Some items close to expiry', 'Great quality', 'Delivery was late')
+WEEKDAY_WEIGHT = (1.0, 1.0, 1.0, 1.0, 1.1, 0.8, 0.6)    # Monday first
+
+FIRST_NAMES = ('Asha', 'Ravi', 'Meera', 'Arjun', 'Priya', 'Karan', 'Divya', 'Vikram', 'Anita', 'Rahul',
+               'Sneha', 'Imran', 'Lakshmi', 'Joseph', 'Fatima', 'Suresh')
+LAST_NAMES = ('Rao', 'Sharma', 'Iyer', 'Khan', 'Patel', 'Reddy', 'Nair', 'Das', 'Menon', 'Singh')
+PLACES = ('Green Valley', 'Sunny Side', 'Riverside', 'Lakeview', 'Hillcrest', 'Old Town', 'Market Square',
+          'Park Lane', 'Harbour', 'Station Road', 'Temple Street', 'Garden City')
+
+
+@dataclass
+class LoadReport:
+    rows: dict = field(default_factory=dict)    # table -> rows written
+    elapsed: float = 0.0
+
+    @property
+    def total(self):
+        return sum(self.rows.values())
+
+    @property
+    def rows_per_second(self):
+        return self.total / self.elapsed if self.elapsed else 0.0
+
+
+def volumes(scale):
+    counts = {table: max(1, round(rows * scale)) for table, rows in BASE_VOLUME.items()}
+    counts['IMPACT'] = round(counts['DONATIONS'] * IMPACT_SHARE)
+    return counts
+
+
+def _rng(seed, table, block):
+    return np.random.default_rng([seed, zlib.crc32(table.encode()), block])
+
+
+def _skewed(rng, count):
+    # Popularity weights: a few sources, NGOs and drivers carry most of the traffic
+    weights = np.arange(1, count + 1, dtype=float) ** -0.8
+    weights = rng.permutation(weights)
+    return weights / weights.sum()
+
+
+def _pick(rng, choices, size):
+    # Draw from a {value: share} mapping
+    values = list(choices)
+    shares = np.array([choices[value] for value in values], dtype=float)
+    return np.array(values, dtype=object)[rng.choice(len(values), size, p=shares / shares.sum())]
+
+
+def _day_curve(days, today):
+    # Cumulative share of the history by day: volume grows over the period and
+    # dips at weekends. Rows take days in id order, so later ids are newer.
+    offsets = np.arange(-days, 0)
+    weekday = np.array([WEEKDAY_WEIGHT[(today + timedelta(days=int(d))).weekday()] for d in offsets])
+    weights = (0.5 + np.arange(days) / days) * weekday
+    return offsets, np.cumsum(weights) / weights.sum()
+
+
+def _days_for(rng, first, count, total, curve):
+    offsets, cumulative = curve
+    position = (np.arange(first, first + count) + rng.random(count)) / total
+    return offsets[np.minimum(np.searchsorted(cumulative, position), len(offsets) - 1)]
+
+
+def _phone(rng, size):
+    return [f"9{number:09d}" for number in rng.integers(0, 10 ** 9, size).tolist()]
+
+
+def _person(rng, size):
+    first = rng.integers(0, len(FIRST_NAMES), size).tolist()
+    last = rng.integers(0, len(LAST_NAMES), size).tolist()
+    return [f"{FIRST_NAMES[a]} {LAST_NAMES[b]}" for a, b in zip(first, last)]
+
+
+def _insert(cursor, table, columns, rows):
+    # executemany folds this into one multi-row INSERT
+    if rows:
+        cursor.executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})",
+            rows
+        )
+
+
+class Loader:
+    def __init__(self, conn, seed, scale, days, today, chunk):
+        self.conn = conn
+        self.cursor = conn.cursor()
+        self.seed = seed
+        self.counts = volumes(scale)
+        self.days = days
+        self.today = today
+        self.chunk = chunk
+        self.report = LoadReport()
+        self.first = {}
+        self.curve = _day_curve(days, today)
+
+    def next_id(self, table, id_column):
+        self.cursor.execute(f"SELECT IFNULL(MAX({id_column}), 0) FROM {table}")
+        return self.cursor.fetchone()[0] + 1
+
+    def write(self, batches):
+        # batches: {table: (columns, rows)} generated together; written chunk
+        # by chunk, one transaction each
+        longest = max(len(rows) for _, rows in batches.values())
+        for start in range(0, longest, self.chunk):
+            for table, (columns, rows) in batches.items():
+                _insert(self.cursor, table, columns, rows[start:start + self.chunk])
+            self.conn.commit()
+            for table, (_, rows) in batches.items():
+                written = len(rows[start:start + self.chunk])
+                self.report.rows[table] = self.report.rows.get(table, 0) + written
+
+    def blocks(self, table):
+        total = self.counts[table]
+        for block, start in enumerate(range(0, total, BLOCK)):
+            yield _rng(self.seed, table, block), start, min(BLOCK, total - start)
+
+    def sources(self):
+        first = self.first['FOOD_SOURCES'] = self.next_id('FOOD_SOURCES', 'SOURCE_ID')
+        total = self.counts['FOOD_SOURCES']
+        rng = _rng(self.seed, 'FOOD_SOURCES', 0)
+        # Sources cluster in areas of one 4-digit pincode prefix, as dispatch groups them
+        areas = max(4, total // 50)
+        prefixes = rng.choice(np.arange(1100, 8600), areas, replace=False)
+        area = rng.choice(areas, total, p=_skewed(rng, areas))
+        pincodes = [f"{prefix * 100 + suffix:06d}" for prefix, suffix in
+                    zip(prefixes[area].tolist(), rng.integers(0, 100, total).tolist())]
+        kinds = rng.integers(0, len(SOURCE_TYPES), total).tolist()
+        main_category = _pick(rng, CATEGORY_SHARE, total)
+        ids = list(range(first, first + total))
+        self.source_names = [f"{PLACES[a % len(PLACES)]} {SOURCE_TYPES[kind]} {i + 1}"
+                             for i, (a, kind) in enumerate(zip(area.tolist(), kinds))]
+        self.source_weights = _skewed(rng, total)
+        self.write({
+            'FOOD_SOURCES': (
+                ('SOURCE_ID', 'NAME', 'CONTACT_NAME', 'CONTACT', 'EMAIL', 'DETAILS', 'LOCALITY', 'PINCODE'),
+                [(source_id, name, contact, phone, f"source{source_id}@synthetic.invalid",
+                  f"{SOURCE_TYPES[kind]} donating surplus {category.lower()}",
+                  f"{PLACES[a % len(PLACES)]} {a + 1}", pincode)
+                 for source_id, name, contact, phone, kind, category, a, pincode in zip(
+                     ids, self.source_names, _person(rng, total), _phone(rng, total), kinds, main_category,
+                     area.tolist(), pincodes)]
+            ),
+            'TYPE_OF_SOURCE': (('SOURCE_ID', 'TYPE_SOURCE'), list(zip(ids, main_category.tolist()))),
+        })
+
+    def ngos(self):
+        first = self.first['NGO'] = self.next_id('NGO', 'NGO_ID')
+        total = self.counts['NGO']
+        rng = _rng(self.seed, 'NGO', 0)
+        self.ngo_names = [f"{PLACES[i % len(PLACES)]} Food Bank {i + 1}" for i in range(total)]
+        self.ngo_categories = _pick(rng, CATEGORY_SHARE, total)
+        self.ngo_weights = _skewed(rng, total)
+        self.write({'NGO': (
+            ('NGO_ID', 'NAME', 'CONTACT_NAME', 'CONTACT', 'EMAIL', 'CATEGORY_REQ', 'ADDRESS'),
+            [(first + i, name, contact, phone, f"ngo{first + i}@synthetic.invalid", category,
+              f"{number} {PLACES[(i * 7) % len(PLACES)]}")
+             for i, (name, contact, phone, category, number) in enumerate(zip(
+                 self.ngo_names, _person(rng, total), _phone(rng, total), self.ngo_categories.tolist(),
+                 rng.integers(1, 999, total).tolist()))]
+        )})
+
+    def drivers(self):
+        first = self.first['DRIVERS'] = self.next_id('DRIVERS', 'DRIVER_ID')
+        total = self.counts['DRIVERS']
+        rng = _rng(self.seed, 'DRIVERS', 0)
+        self.driver_names = _person(rng, total)
+        self.driver_phones = _phone(rng, total)
+        self.driver_vehicles = _pick(rng, VEHICLES, total).tolist()
+        self.driver_weights = _skewed(rng, total)
+        # Completed pickups and the last pickup date are set from FOOD_PICKUP at the end
+        self.write({'DRIVERS': (
+            ('DRIVER_ID', 'NAME', 'PHONE_NUMBER', 'EMAIL', 'LICENSE_NUMBER', 'VEHICLE_TYPE', 'VEHICLE_NUMBER',
+             'AVAILABILITY_STATUS'),
+            [(first + i, name, phone, f"driver{first + i}@synthetic.invalid", f"DL{first + i:08d}", vehicle,
+              f"KA-{i % 99 + 1:02d}-{plate:04d}", status)
+             for i, (name, phone, vehicle, plate, status) in enumerate(zip(
+                 self.driver_names, self.driver_phones, self.driver_vehicles,
+                 rng.integers(0, 10000, total).tolist(), _pick(rng, DRIVER_STATUS, total).tolist()))]
+        )})
+
+    def food_items(self):
+        first = self.first['FOOD_ITEM'] = self.next_id('FOOD_ITEM', 'FOOD_ID')
+        first_source = self.first['FOOD_SOURCES']
+        for rng, start, count in self.blocks('FOOD_ITEM'):
+            category = _pick(rng, CATEGORY_SHARE, count)
+            shelf = np.array([CATEGORIES[c][1] for c in category], dtype=float)
+            # Days left: most stock is fresh, a tail is near or past expiry
+            left = np.floor(rng.gamma(2.0, shelf / 2) - shelf * 0.25).astype(int)
+            quantity = np.clip(rng.lognormal(3.2, 0.9, count), 1, 2000).astype(int)
+            quantity[rng.random(count) < ZERO_STOCK_SHARE] = 0
+            names = [CATEGORIES[c][2][k % len(CATEGORIES[c][2])]
+                     for c, k in zip(category, rng.integers(0, 60, count).tolist())]
+            source = first_source + rng.choice(len(self.source_names), count, p=self.source_weights)
+            ids = list(range(first + start, first + start + count))
+            sources = source.tolist()
+            self.write({
+                'FOOD_ITEM': (
+                    ('FOOD_ID', 'NAME', 'QUANTITY', 'CATEGORY', 'EXPIRY_DATE', 'SOURCE_ID'),
+                    list(zip(ids, names, quantity.tolist(), category.tolist(),
+                             [self.today + timedelta(days=d) for d in left.tolist()], sources))
+                ),
+                'PROVIDES': (('SOURCE_ID', 'FOOD_ID'), list(zip(sources, ids))),
+            })
+
+    def donations(self):
+        first = self.first['DONATIONS'] = self.next_id('DONATIONS', 'DONATION_ID')
+        impact_id = self.first['IMPACT'] = self.next_id('IMPACT', 'IMPACT_ID')
+        first_source, first_ngo = self.first['FOOD_SOURCES'], self.first['NGO']
+        total = self.counts['DONATIONS']
+        for rng, start, count in self.blocks('DONATIONS'):
+            source = rng.choice(len(self.source_names), count, p=self.source_weights)
+            ngo = rng.choice(len(self.ngo_names), count, p=self.ngo_weights)
+            # Most donations are in the category the NGO asked for
+            category = np.where(rng.random(count) < 0.6, self.ngo_categories[ngo], _pick(rng, CATEGORY_SHARE, count))
+            quantity = np.clip(rng.lognormal(3.0, 0.8, count), 1, 1000).astype(int)
+            day = _days_for(rng, start, count, total, self.curve)
+            seconds = np.sort(rng.integers(8 * 3600, 20 * 3600, count))
+            at = [datetime.combine(self.today + timedelta(days=d), datetime.min.time()) + timedelta(seconds=s)
+                  for d, s in zip(day.tolist(), seconds.tolist())]
+            ids = list(range(first + start, first + start + count))
+            sources = (first_source + source).tolist()
+            ngos = (first_ngo + ngo).tolist()
+            source_names = [self.source_names[i] for i in source.tolist()]
+            ngo_names = [self.ngo_names[i] for i in ngo.tolist()]
+
+            rated = np.flatnonzero(rng.random(count) < IMPACT_SHARE).tolist()
+            rates = _pick(rng, RATES, len(rated)).tolist()
+            people = (quantity[rated] * rng.uniform(1.5, 4.0, len(rated))).astype(int).tolist()
+            feedback = [FEEDBACK[k] for k in rng.integers(0, len(FEEDBACK), len(rated)).tolist()]
+            impacts = [
+                (impact_id + n, sources[i], ngos[i], source_names[i], ngo_names[i], text, rate, helped)
+                for n, (i, text, rate, helped) in enumerate(zip(rated, feedback, rates, people))
+            ]
+            impact_id += len(impacts)
+
+            self.write({
+                'DONATIONS': (
+                    ('DONATION_ID', 'SOURCE_ID', 'NGO_ID', 'SOURCE', 'DESTINATION', 'QUANTITY', 'CATEGORY'),
+                    list(zip(ids, sources, ngos, source_names, ngo_names, quantity.tolist(), category.tolist()))
+                ),
+                'DONATES_TO': (('SOURCE_ID', 'DONATION_ID', 'DATE_TIME'), list(zip(sources, ids, at))),
+                'RECEIVES': (('NGO_ID', 'DONATION_ID'), list(zip(ngos, ids))),
+                'IMPACT': (
+                    ('IMPACT_ID', 'SOURCE_ID', 'NGO_ID', 'SOURCE', 'DESTINATION', 'FEEDBACK', 'RATE',
+                     'PEOPLE_HELPED'),
+                    impacts
+                ),
+            })
+
+    def pickups(self):
+        first = self.first['FOOD_PICKUP'] = self.next_id('FOOD_PICKUP', 'PICKUP_ID')
+        first_source, first_driver = self.first['FOOD_SOURCES'], self.first['DRIVERS']
+        total = self.counts['FOOD_PICKUP']
+        # History plus a week of upcoming pickups, at the recent daily rate
+        offsets, cumulative = self.curve
+        daily = np.diff(cumulative, prepend=0.0)
+        upcoming = np.full(UPCOMING_DAYS + 1, daily[-7:].mean())
+        weights = np.concatenate([daily, upcoming])
+        curve = (np.concatenate([offsets, np.arange(0, UPCOMING_DAYS + 1)]), np.cumsum(weights) / weights.sum())
+        for rng, start, count in self.blocks('FOOD_PICKUP'):
+            day = _days_for(rng, start, count, total, curve)
+            minute = rng.integers(7 * 4, 20 * 4, count) * 15
+            source = first_source + rng.choice(len(self.source_names), count, p=self.source_weights)
+            ngo = rng.choice(len(self.ngo_names), count, p=self.ngo_weights)
+            driver = rng.choice(len(self.driver_names), count, p=self.driver_weights)
+            cancelled = rng.random(count) < 0.1
+            took = rng.integers(20, 120, count)
+            needed = _pick(rng, VEHICLES, count).tolist()
+
+            pickups, schedules = [], []
+            for i, (d, m, s, n, k, c, t) in enumerate(zip(
+                    day.tolist(), minute.tolist(), source.tolist(), ngo.tolist(), driver.tolist(),
+                    cancelled.tolist(), took.tolist())):
+                pickup_id = first + start + i
+                when = datetime.combine(self.today + timedelta(days=d), datetime.min.time()) + timedelta(minutes=m)
+                if d < 0:
+                    # Past pickups were taken by a driver and completed or cancelled
+                    status = 'Cancelled' if c else 'Completed'
+                    pickups.append((pickup_id, s, first_driver + k, self.driver_names[k], self.driver_phones[k],
+                                    status, self.ngo_names[n], self.driver_vehicles[k],
+                                    when + timedelta(minutes=t) if status == 'Completed' else None))
+                else:
+                    # Upcoming ones wait for dispatch
+                    pickups.append((pickup_id, s, None, None, None, 'Pending', self.ngo_names[n], needed[i], None))
+                schedules.append((s, pickup_id, when.date(), when.time()))
+            self.write({
+                'FOOD_PICKUP': (
+                    ('PICKUP_ID', 'SOURCE_ID', 'DRIVER_ID', 'DRIVER_NAME', 'CONTACT', 'STATUS', 'DESTINATION',
+                     'VEHICLE_TYPE', 'COMPLETED_AT'),
+                    pickups
+                ),
+                'SCHEDULES': (('SOURCE_ID', 'PICKUP_ID', 'DATE', 'TIME'), schedules),
+            })
+
+
+def load(scale=1.0, seed=1, days=365, today=None, chunk=SYNTHETIC_CHUNK):
+    # Append a synthetic data set; returns a LoadReport
+    loader = None
+    started = time.perf_counter()
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SET @pms_bulk_import = 1, @pms_defer_summaries = 1")
+        cursor.execute("SET SESSION unique_checks = 0, foreign_key_checks = 0")
+        try:
+            loader = Loader(conn, seed, scale, days, today or date.today(), chunk)
+            loader.sources()
+            loader.ngos()
+            loader.drivers()
+            loader.food_items()
+            loader.donations()
+            loader.pickups()
+        finally:
+            cursor.execute("SET @pms_bulk_import = NULL, @pms_defer_summaries = NULL")
+            cursor.execute("SET SESSION unique_checks = 1, foreign_key_checks = 1")
+            conn.rollback()
+            if loader is not None and loader.report.rows:
+                # Also after a failed load, for the chunks already committed
+                rebuild(cursor)
+                reconcile(cursor)
+                conn.commit()
+                invalidate(*loader.report.rows, *SUMMARY_TABLES)
+                mark_stale()
+    loader.report.elapsed = time.perf_counter() - started
+    return loader.report
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Load a deterministic synthetic data set")
+    parser.add_argument('--scale', type=float, default=1.0, help="multiple of BASE_VOLUME (1, 10, 100)")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--days', type=int, default=365, help="days of donation and pickup history")
+    parser.add_argument('--today', type=date.fromisoformat, default=None, help="date the history ends on")
+    parser.add_argument('--dry-run', action='store_true', help="print the row counts and exit")
+    args = parser.parse_args(argv)
+
+    if args.dry_run:
+        for table, rows in volumes(args.scale).items():
+            print(f"{table:<14} {rows:>12,}")
+        return 0
+    report = load(args.scale, args.seed, args.days, args.today)
+    for table, rows in report.rows.items():
+        print(f"{table:<14} {rows:>12,}")
+    print(f"{report.total:,} rows in {report.elapsed:.1f}s ({report.rows_per_second:,.0f} rows/s)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))